@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, TypeVar
+
+DEFAULT_IN_FLIGHT = 64
+
+T = TypeVar('T')
+
+
+class AsyncScanner:
+    ''' Runs the blocking file system calls of a scan concurrently.
+
+    Each call (directory listing, stat, header read) goes through an asyncio event loop
+    to a thread pool, with at most in_flight calls submitted at a time. On network mounts
+    every call is a round trip, so overlapping them hides the latency. Results are returned
+    in the order of a serial scan; callers keep processing them one after another.
+    '''
+
+    def __init__(self, in_flight: int = DEFAULT_IN_FLIGHT) -> None:
+        if in_flight < 1:
+            raise ValueError(f'in_flight must be at least 1, got {in_flight}')
+        self.in_flight = in_flight
+        self._executor = ThreadPoolExecutor(max_workers=in_flight, thread_name_prefix='scan')
+
+    def walk(self, root: str, list_dir: Callable[[str], tuple[list[str], T]]) -> dict[str, T]:
+        ''' {folder: listing} of root and its descendants.
+
+        list_dir(folder) returns (child folders to list next, listing of folder); sibling
+        folders are listed concurrently.
+        '''
+        return asyncio.run(self._walk(str(root), list_dir))
+
+    def map(self, func: Callable[..., T], *iterables: Iterable[Any]) -> list[T]:
+        ''' [func(*args)] for the zipped iterables, like map() but concurrent '''
+        return asyncio.run(self._map(func, *iterables))
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    async def _walk(self, root: str, list_dir: Callable[[str], tuple[list[str], T]]) -> dict[str, T]:
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.in_flight)
+        listings: dict[str, T] = {}
+
+        async def visit(folder: str) -> None:
+            async with semaphore:
+                children, listing = await loop.run_in_executor(self._executor, list_dir, folder)
+            listings[folder] = listing
+            await asyncio.gather(*(visit(child) for child in children))
+
+        await visit(root)
+        return listings
+
+    async def _map(self, func: Callable[..., T], *iterables: Iterable[Any]) -> list[T]:
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.in_flight)
+
+        async def call(args: tuple) -> T:
+            async with semaphore:
+                return await loop.run_in_executor(self._executor, func, *args)
+
+        return await asyncio.gather(*(call(args) for args in zip(*iterables)))
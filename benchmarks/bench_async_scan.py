@@ -0,0 +1,130 @@
+#!/usr/bin/python
+''' Serial vs --async-scan planning with simulated network mount latency.
+
+Usage: python benchmarks/bench_async_scan.py [LATENCY_MS] [SOURCE_FILES] [DESTINATION_FILES]
+Defaults: 2 ms per call, 2,000 source videos and 5,000 destination files in folders of 100 files.
+Every directory listing, stat (os.stat and DirEntry.stat) and metadata extraction sleeps
+LATENCY_MS before running, as a round trip to an NFS/SMB server would. The plans of both modes
+are compared to check that the results are the same.
+'''
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import metadata
+from picture_handler import PicturesHandler
+
+FILES_PER_FOLDER = 100
+
+
+class _SlowEntry:
+    ''' DirEntry proxy whose first stat() is a round trip '''
+
+    def __init__(self, entry: os.DirEntry, latency: float) -> None:
+        self._entry = entry
+        self._latency = latency
+        self._stat = None
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+        if self._stat is None:
+            time.sleep(self._latency)
+            self._stat = self._entry.stat(follow_symlinks=follow_symlinks)
+        return self._stat
+
+    def __fspath__(self) -> str:
+        return self.path
+
+
+class _SlowScandir:
+
+    def __init__(self, path, latency: float) -> None:
+        time.sleep(latency)
+        self._it = _scandir(path)
+        self._latency = latency
+
+    def __enter__(self) -> _SlowScandir:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._it.close()
+
+    def __iter__(self):
+        return (_SlowEntry(entry, self._latency) for entry in self._it)
+
+
+_scandir = os.scandir
+_stat = os.stat
+_extract_metadata = metadata.extract_metadata
+
+
+def _plan(src: Path, dst: Path, latency: float, **kwargs) -> tuple[float, PicturesHandler]:
+    def stat(*args, **kw):
+        time.sleep(latency)
+        return _stat(*args, **kw)
+
+    def extract_metadata(*args):
+        time.sleep(latency)
+        return _extract_metadata(*args)
+
+    handler = PicturesHandler(str(src), str(dst), dry_run=True, recursive=True, full_scan=True, **kwargs)
+    with patch('os.scandir', lambda path='.': _SlowScandir(path, latency)), patch('os.stat', stat), \
+            patch('metadata.extract_metadata', extract_metadata), patch('picture_handler.logger'):
+        start = time.perf_counter()
+        handler.handle()
+        return time.perf_counter() - start, handler
+
+
+def _generate(src: Path, dst: Path, source_files: int, destination_files: int) -> None:
+    for i in range(source_files):
+        folder = src / f'{i // FILES_PER_FOLDER:03d}'
+        if i % FILES_PER_FOLDER == 0:
+            folder.mkdir(parents=True)
+        video = folder / f'VID_{i:06d}.mp4'
+        video.write_bytes(b'\x00' * 32)
+        # Dates come from the file times; pin them so reading the file (atime) doesn't change the plan
+        os.utime(video, (1_000_000_000 + i, 1_000_000_000 + i))
+    for i in range(destination_files):
+        folder = dst / f'{2000 + i // (FILES_PER_FOLDER * 12)}' / f'{i // FILES_PER_FOLDER % 12 + 1:02d}'
+        if i % FILES_PER_FOLDER == 0:
+            folder.mkdir(parents=True)
+        (folder / f'{folder.parent.name}{folder.name}01_000000_{i % FILES_PER_FOLDER:03d}.jpg').touch()
+
+
+def main() -> None:
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 2.0) / 1000
+    source_files = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    destination_files = int(sys.argv[3]) if len(sys.argv) > 3 else 5_000
+    print(f'{latency * 1000:.1f} ms per call, {source_files} source files, {destination_files} destination files')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / 'src'
+        dst = Path(tmp) / 'dst'
+        _generate(src, dst, source_files, destination_files)
+        plans = []
+        for label, kwargs in (('serial', {}), ('async, 16 in flight', {'async_scan': True, 'in_flight': 16}),
+                              ('async, 64 in flight', {'async_scan': True, 'in_flight': 64}),
+                              ('async, 256 in flight', {'async_scan': True, 'in_flight': 256})):
+            elapsed, handler = _plan(src, dst, latency, **kwargs)
+            plans.append(sorted((f.fullpath, f.new_file_name) for files in handler.ready_to_add.values()
+                                for f in files))
+            print(f'{label:22s} {elapsed:8.2f} s')
+        print('same plan' if all(plan == plans[0] for plan in plans) else 'PLANS DIFFER')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+''' Header-only EXIF reader vs the Pillow path on TIFF based RAW files (NEF/DNG).
+
+Usage: python benchmarks/bench_exif_reader.py [FOLDER_WITH_RAW_FILES]
+Without a folder, synthetic NEF-like files (8 MB uncompressed TIFF) are generated.
+'''
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import Image
+
+import exif_reader
+import media_probe
+import metadata
+
+SYNTHETIC_FILES = 50
+SYNTHETIC_SIZE = (2048, 1366)
+
+
+def _write_synthetic_raw(path: Path) -> None:
+    ''' Uncompressed RGB TIFF of SYNTHETIC_SIZE with DateTimeOriginal in IFD0, as in many NEF files '''
+    img = Image.frombytes('RGB', SYNTHETIC_SIZE, os.urandom(SYNTHETIC_SIZE[0] * SYNTHETIC_SIZE[1] * 3))
+    img.save(str(path), format='TIFF', tiffinfo={metadata.DATE_TIME_ORIGINAL_KEY: '2021:07:08 09:10:11'})
+
+
+def _pillow_date(path: str) -> str | None:
+    ''' The previous path: verify open, second open, _getexif, then the raw tag data '''
+    if not metadata.is_image(path):
+        return None
+    with Image.open(path) as img:
+        date_taken = None
+        if hasattr(img, '_getexif'):
+            _getexif = img._getexif()
+            if _getexif:
+                date_taken = _getexif.get(metadata.DATE_TIME_ORIGINAL_KEY)
+        if not date_taken and hasattr(img, 'tag'):
+            date_taken = img.tag._tagdata.get(metadata.DATE_TIME_ORIGINAL_KEY)
+        return date_taken
+
+
+def _header_date(path: str) -> str | None:
+    header = media_probe.read_header(path)
+    return exif_reader.read_tiff_date(header, path)
+
+
+def _time(func, paths: list[str]) -> tuple[float, int]:
+    start = time.perf_counter()
+    found = sum(1 for p in paths if func(p))
+    return time.perf_counter() - start, found
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        folder = Path(sys.argv[1])
+        paths = [str(p) for p in folder.rglob('*') if p.suffix.lower() in ('.nef', '.dng', '.tif', '.tiff')]
+        tmp = None
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        paths = []
+        for i in range(SYNTHETIC_FILES):
+            path = Path(tmp.name) / f'DSC_{i:04d}.nef'
+            _write_synthetic_raw(path)
+            paths.append(str(path))
+
+    print(f'{len(paths)} files')
+    for label, func in (('pillow', _pillow_date), ('header-only', _header_date)):
+        elapsed, found = _time(func, paths)
+        print(f'{label:12s} {elapsed * 1000:8.1f} ms total, {elapsed * 1e6 / max(1, len(paths)):8.1f} us/file, '
+              f'{found} dates found')
+
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
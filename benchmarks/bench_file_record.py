@@ -0,0 +1,98 @@
+#!/usr/bin/python
+''' Memory held by the destination index: FileRecord objects vs the previous property dicts.
+
+Usage: python benchmarks/bench_file_record.py [FILES]
+Indexes FILES destination names (default 1,000,000, YYYY/MM folders of 500 files) through
+PicturesHandler._handle_destination_folder with the folder listing served from memory, and
+reports the memory allocated by the index (destination_formats, sizes_files, suffixes and the
+hash index, sizes) as measured by tracemalloc. The listing itself is allocated before measuring.
+'''
+from __future__ import annotations
+
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import regex_patterns
+from picture_handler import PicturesHandler
+
+FILES_PER_FOLDER = 500
+
+
+def _name(index: int) -> str:
+    ''' Distinct second of 2000-2019 for each index '''
+    seconds = index * 7
+    return (f'{2000 + seconds // 31_536_000 % 20}{seconds // 2_628_000 % 12 + 1:02d}{seconds // 86_400 % 28 + 1:02d}_'
+            f'{seconds // 3600 % 24:02d}{seconds // 60 % 60:02d}{seconds % 60:02d}_000.jpg')
+
+
+def _listing(root: Path, files: int) -> list[tuple[Path, list[tuple[str, int]]]]:
+    folders = []
+    for i in range(0, files, FILES_PER_FOLDER):
+        names = [_name(j) for j in range(i, min(i + FILES_PER_FOLDER, files))]
+        folder = root / names[0][:4] / names[0][4:6]
+        folders.append((folder, [(name, 100_000 + i + j) for j, name in enumerate(names)]))
+    return folders
+
+
+def _index_old(handler: PicturesHandler, folder: Path, files: list[tuple[str, int]]) -> None:
+    ''' The previous loop of _handle_destination_folder: a property dict per file, paths by size '''
+    sizes_files = handler.__dict__.setdefault('sizes_files', defaultdict(list))
+    for f, size in files:
+        match = re.match(regex_patterns.DESTINATION_REGEX, f)
+        full_path = folder / f
+        properties = {
+            'fullpath': str(full_path),
+            'folder': str(folder),
+            'size': size,
+            'file': f,
+            'extension': full_path.suffix.lstrip('.').lower(),
+        }
+        properties.update(match.groupdict())
+        key = regex_patterns.DESTINATION_FORMAT_NO_SUFFIX.format(**properties)
+        handler.destination_formats[key].append(properties)
+        handler.suffixes.seed(key, properties['suffix'])
+        sizes_files[properties['size']].append(properties['fullpath'])
+        handler.hash_index.register(properties['fullpath'], properties['size'], f)
+
+
+def _index_new(handler: PicturesHandler, folder: Path, files: list[tuple[str, int]]) -> None:
+    with patch.object(handler.dir_snapshot, 'scan', return_value=([], files)):
+        handler._handle_destination_folder(folder)
+
+
+def _measure(tmp: str, listing: list, index, comparers: list[str] | None = None) -> tuple[int, float]:
+    handler = PicturesHandler(tmp, tmp, dry_run=True, comparers=comparers)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for folder, files in listing:
+        index(handler, folder, files)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, elapsed
+
+
+def main() -> None:
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        listing = _listing(Path(tmp), files)
+        print(f'{files} destination files')
+        old, old_elapsed = _measure(tmp, listing, _index_old)
+        for label, comparers in (('FileRecord', None), ('FileRecord, binary', ['binary'])):
+            new, elapsed = _measure(tmp, listing, _index_new, comparers)
+            print(f'{label:20s} {new / 2 ** 20:8.1f} MiB {new / files:7.0f} B/file {elapsed:6.2f} s '
+                  f'({old / new:.1f}x less)')
+        print(f'{"property dicts":20s} {old / 2 ** 20:8.1f} MiB {old / files:7.0f} B/file {old_elapsed:6.2f} s')
+
+
+if __name__ == '__main__':
+    main()
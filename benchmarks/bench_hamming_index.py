@@ -0,0 +1,85 @@
+#!/usr/bin/python
+''' "All hashes within distance d" queries with HammingIndex vs scanning every hash.
+
+Usage: python benchmarks/bench_hamming_index.py [HASHES] [MAX_DISTANCE] [QUERIES] [--no-numpy]
+Defaults: 10k, 100k and 1M random 64-bit hashes, a quarter of them near copies of others, distance 10,
+1,000 queries per size. Grouping a whole library (one query per hash) is extrapolated from the sample.
+The scan is vectorised with NumPy; the pairwise Python loop is what group_near_duplicates did before.
+'''
+from __future__ import annotations
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import hamming_index
+from hamming_index import HammingIndex, chunks_for
+from perceptual_hash import NEAR_DUPLICATE_DISTANCE
+
+SCAN_QUERIES = 20
+
+
+def _hashes(count: int) -> list[int]:
+    rng = random.Random(0)
+    hashes: list[int] = []
+    for i in range(count):
+        if i % 4 == 3:
+            flipped = sum(1 << bit for bit in rng.sample(range(64), rng.randrange(NEAR_DUPLICATE_DISTANCE + 1)))
+            hashes.append(hashes[rng.randrange(i)] ^ flipped)
+        else:
+            hashes.append(rng.getrandbits(64))
+    return hashes
+
+
+def _bench(count: int, max_distance: int, queries: int) -> None:
+    hashes = _hashes(count)
+    sample = hashes[:queries]
+    start = time.perf_counter()
+    index = HammingIndex(chunks_for(count, max_distance))
+    for value in hashes:
+        index.add(value)
+    # The tables are built by the first query
+    index.query(sample[0], max_distance)
+    build = time.perf_counter() - start
+
+    index.scored = 0
+    start = time.perf_counter()
+    found = sum(len(index.query(value, max_distance)) for value in sample)
+    per_query = (time.perf_counter() - start) / len(sample)
+    print(f'{count:>9d} hashes, {index.chunks} chunks: build {build:5.2f} s, '
+          f'{index.scored / len(sample):7.0f} scored/query, {found / len(sample):.2f} found/query')
+    print(f'{"":10s} index     {per_query * 1e6:10.1f} us/query, {per_query * count:9.1f} s for all')
+
+    numpy = hamming_index.numpy
+    if numpy is not None:
+        array = numpy.array(hashes, dtype=numpy.uint64)
+        start = time.perf_counter()
+        for value in sample[:SCAN_QUERIES]:
+            (hamming_index._popcount(array ^ numpy.uint64(value)) <= max_distance).nonzero()
+        per_scan = (time.perf_counter() - start) / len(sample[:SCAN_QUERIES])
+        print(f'{"":10s} scan      {per_scan * 1e6:10.1f} us/query, {per_scan * count:9.1f} s for all')
+
+    start = time.perf_counter()
+    for value in sample[:SCAN_QUERIES]:
+        [other for other in hashes if (value ^ other).bit_count() <= max_distance]
+    per_pair = (time.perf_counter() - start) / len(sample[:SCAN_QUERIES])
+    print(f'{"":10s} pairwise  {per_pair * 1e6:10.1f} us/query, {per_pair * count / 2:9.1f} s for all')
+
+
+def main() -> None:
+    args = [arg for arg in sys.argv[1:] if arg != '--no-numpy']
+    if '--no-numpy' in sys.argv:
+        hamming_index.numpy = None
+    sizes = [int(args[0])] if args else [10_000, 100_000, 1_000_000]
+    max_distance = int(args[1]) if len(args) > 1 else NEAR_DUPLICATE_DISTANCE
+    queries = int(args[2]) if len(args) > 2 else 1_000
+    print(f'distance {max_distance}, NumPy {"on" if hamming_index.numpy is not None else "off"}')
+    for count in sizes:
+        _bench(count, max_distance, queries)
+
+
+if __name__ == '__main__':
+    main()
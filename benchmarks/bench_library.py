@@ -0,0 +1,201 @@
+#!/usr/bin/python
+''' Time and memory of the main operations on a synthetic library, written as JSON.
+
+Usage: python benchmarks/bench_library.py [--scale 10k|100k|1M|N] [--library DIR] [--out RESULTS.json]
+                                          [--ops OP ...] [--repeat N] [--tracemalloc]
+       python benchmarks/bench_library.py --compare OLD.json NEW.json [--threshold 0.1]
+The library (see library_generator.py) has SCALE destination files and a tenth of them as source files.
+It is generated in a temporary folder, or kept in --library DIR and reused by later runs of the same
+scale. Every operation runs in a fresh process in its dry run mode, so the library is never changed and
+the peak RSS of one operation doesn't include the others. Results keep the best wall time of --repeat runs
+with the commit they were measured on; --compare lists the operations that got slower or bigger.
+--tracemalloc adds the peak of Python allocations but slows operations down several times.
+'''
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import library_generator
+
+RESULTS_VERSION = 1
+LIBRARY_STATS_NAME = 'library.json'
+SCALES = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+OPS = ['handle', 'find_duplicates', 'generate_duplicate_report', 'merge_dbs', 'sync_folder_and_db',
+       'organize_by_year', 'compare_folders']
+REGRESSION_THRESHOLD = 0.1
+
+
+def _quiet(*args, **kwargs) -> None:
+    pass
+
+
+def _run_op(op: str, root: str) -> None:
+    import utils
+    from picture_handler import PicturesHandler
+
+    src = os.path.join(root, 'src')
+    dst = os.path.join(root, 'dst')
+    if op == 'handle':
+        PicturesHandler(src, dst, dry_run=True, recursive=True, full_scan=True).handle()
+    elif op == 'find_duplicates':
+        utils.find_duplicates(dst, logger_func=_quiet)
+    elif op == 'generate_duplicate_report':
+        utils.generate_duplicate_report(dst, os.path.join(root, 'duplicate_report.html'), logger_func=_quiet)
+    elif op == 'merge_dbs':
+        utils.merge_dbs(dst, os.path.join(root, 'db_b.json'), dry_run=True, logger_func=_quiet)
+    elif op == 'sync_folder_and_db':
+        utils.sync_folder_and_db(dst, dry_run=True, logger_func=_quiet)
+    elif op == 'organize_by_year':
+        utils.organize_by_year(os.path.join(root, 'flat'), dry_run=True, logger_func=_quiet)
+    elif op == 'compare_folders':
+        utils.compare_folders(src, dst, logger_func=_quiet)
+    else:
+        raise ValueError(f'Unknown operation {op}, available: {", ".join(OPS)}')
+
+
+def _max_rss_mib() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def _measure(op: str, root: str, trace: bool, results) -> None:
+    ''' Child process: run op once and send its measures back '''
+    logging.disable(logging.CRITICAL)
+    sys.stderr = open(os.devnull, 'w')  # progress bars
+    import picture_handler  # noqa: F401  imports are not part of the measure
+    import utils  # noqa: F401
+
+    baseline_rss = _max_rss_mib()
+    if trace:
+        tracemalloc.start()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    _run_op(op, root)
+    measure = {'seconds': time.perf_counter() - start, 'cpu_seconds': time.process_time() - cpu,
+               'peak_rss_mib': _max_rss_mib(), 'rss_growth_mib': _max_rss_mib() - baseline_rss}
+    if trace:
+        measure['traced_peak_mib'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    results.put(measure)
+
+
+def run_op(op: str, root: str, trace: bool = False) -> dict:
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(op, root, trace, results))
+    process.start()
+    measure = results.get()
+    process.join()
+    return measure
+
+
+def _parse_scale(scale: str) -> int:
+    return SCALES[scale] if scale in SCALES else int(scale)
+
+
+def _library(folder: Path, files: int) -> dict:
+    ''' Statistics of the library in folder, generated first unless it is there for this scale '''
+    stats_path = folder / LIBRARY_STATS_NAME
+    if stats_path.exists():
+        stats = json.loads(stats_path.read_text())
+        if stats['destination_files'] == files:
+            return stats
+        for name in library_generator.TREES:
+            shutil.rmtree(folder / name, ignore_errors=True)
+    start = time.perf_counter()
+    stats = library_generator.generate(folder, files)
+    stats['generate_seconds'] = time.perf_counter() - start
+    stats_path.write_text(json.dumps(stats, indent=4))
+    return stats
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(__file__),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(folder: Path, files: int, ops: list[str], repeat: int, trace: bool) -> dict:
+    library = _library(folder, files)
+    print(f'{files} destination files, {library["source_files"]} source files, '
+          f'{library["bytes"] / 1024 / 1024:.0f} MiB')
+    results = {}
+    for op in ops:
+        runs = [run_op(op, str(folder), trace) for _ in range(repeat)]
+        results[op] = min(runs, key=lambda measure: measure['seconds'])
+        print(f'{op:26s} {results[op]["seconds"]:8.2f} s {results[op]["peak_rss_mib"]:8.0f} MiB peak RSS')
+    return {'version': RESULTS_VERSION, 'commit': _commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(), 'platform': platform.platform(), 'scale': files,
+            'repeat': repeat, 'tracemalloc': trace, 'library': library, 'results': results}
+
+
+def compare(old: dict, new: dict, threshold: float = REGRESSION_THRESHOLD) -> list[str]:
+    ''' Print both results side by side, return the regressed operations '''
+    if old['scale'] != new['scale']:
+        print(f'Different scales: {old["scale"]} and {new["scale"]}')
+    if old['tracemalloc'] != new['tracemalloc']:
+        print('Only one of the results was measured with --tracemalloc, which slows every operation down')
+    print(f'{"":26s} {old["commit"] or "old":>20s} {new["commit"] or "new":>20s}')
+    regressions = []
+    for op in [op for op in OPS if op in old['results'] and op in new['results']]:
+        before = old['results'][op]
+        after = new['results'][op]
+        slower = after['seconds'] > before['seconds'] * (1 + threshold)
+        bigger = after['rss_growth_mib'] > max(before['rss_growth_mib'], 1) * (1 + threshold)
+        if slower or bigger:
+            regressions.append(op)
+        print(f'{op:26s} {before["seconds"]:8.2f} s {before["peak_rss_mib"]:6.0f} MiB '
+              f'{after["seconds"]:8.2f} s {after["peak_rss_mib"]:6.0f} MiB '
+              f'{after["seconds"] / max(before["seconds"], 1e-9):5.2f}x'
+              f'{"  SLOWER" if slower else ""}{"  BIGGER" if bigger else ""}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the main operations on a synthetic library')
+    parser.add_argument('--scale', default='10k', help=f'Destination files: {", ".join(SCALES)} or a number')
+    parser.add_argument('--library', help='Folder to keep the generated library in and reuse it from')
+    parser.add_argument('--out', help='JSON file to write the results to')
+    parser.add_argument('--ops', nargs='+', choices=OPS, default=OPS, help='Operations to run')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs of each operation, the fastest is kept')
+    parser.add_argument('--tracemalloc', action='store_true', help='Also measure the peak of Python allocations')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two results files')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Relative slowdown or memory growth reported as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        old, new = (json.loads(Path(path).read_text()) for path in args.compare)
+        sys.exit(1 if compare(old, new, args.threshold) else 0)
+
+    files = _parse_scale(args.scale)
+    if args.library:
+        Path(args.library).mkdir(parents=True, exist_ok=True)
+        result = benchmark(Path(args.library), files, args.ops, args.repeat, args.tracemalloc)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = benchmark(Path(tmp), files, args.ops, args.repeat, args.tracemalloc)
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=4))
+        print(f'Results written to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
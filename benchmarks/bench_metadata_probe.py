@@ -0,0 +1,161 @@
+#!/usr/bin/python
+''' File system calls of metadata.extract_metadata vs the previous double Pillow open, per file kind.
+
+Usage: python benchmarks/bench_metadata_probe.py [FILES] [FOLDER]
+Without a folder, FILES (default 10) synthetic files of each kind are generated: JPEGs with an APP1
+segment the size of a camera's (30 KB MakerNote), NEF-like 8 MB uncompressed TIFFs, PNG screenshots
+and MP4s with moov before 4 MB of mdat. Opens and stats are counted at the builtins/os module level.
+Read system calls and bytes read come from /proc/self/io, so they are only shown on Linux.
+Both paths get the same earliest file time from the directory scan; the previous path stat'ed again.
+'''
+from __future__ import annotations
+
+import builtins
+import os
+import struct
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import ExifTags, Image
+
+import bmff
+import metadata
+import regex_patterns
+
+SIZE = (2048, 1366)
+MAKER_NOTE_TAG = 0x927C
+MAKER_NOTE_SIZE = 30_000
+MDAT_SIZE = 4 * 1024 * 1024
+DATE = '2021:07:08 09:10:11'
+_PROC_IO = '/proc/self/io'
+
+_open = builtins.open
+_stat = os.stat
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def _generate(folder: Path, files: int) -> dict[str, list[str]]:
+    noise = Image.frombytes('RGB', SIZE, os.urandom(SIZE[0] * SIZE[1] * 3))
+    exif = Image.Exif()
+    exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+    exif_ifd[metadata.DATE_TIME_ORIGINAL_KEY] = DATE
+    exif_ifd[MAKER_NOTE_TAG] = os.urandom(MAKER_NOTE_SIZE)
+    mac_time = 1_500_000_000 + bmff.MAC_EPOCH_OFFSET
+    mvhd = _box(b'mvhd', struct.pack('>B3xIIII', 0, mac_time, mac_time, 1000, 0) + b'\x00' * 80)
+    mp4 = _box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2mp41') + _box(b'moov', mvhd) + _box(b'mdat', bytes(MDAT_SIZE))
+    paths: dict[str, list[str]] = {}
+    for i in range(files):
+        jpg, nef, png, video = (folder / f'{prefix}_{i:04d}.{extension}' for prefix, extension in
+                                (('IMG', 'jpg'), ('DSC', 'nef'), ('Screenshot', 'png'), ('VID', 'mp4')))
+        noise.save(jpg, 'JPEG', quality=85, exif=exif.tobytes())
+        noise.save(nef, 'TIFF', tiffinfo={metadata.DATE_TIME_ORIGINAL_KEY: DATE})
+        noise.resize((1280, 720)).save(png, 'PNG')
+        video.write_bytes(mp4)
+        for path in (jpg, nef, png, video):
+            paths.setdefault(path.suffix.lstrip('.'), []).append(str(path))
+    return paths
+
+
+def _previous_extract(file_name: str, full_path: str, min_time: float) -> dict[str, str] | str | None:
+    ''' The previous path: Pillow open and verify, a second Pillow open for the EXIF date, a stat for the min date '''
+    if metadata.is_image(full_path):
+        date_taken = None
+        with Image.open(full_path) as img:
+            try:
+                if hasattr(img, '_getexif'):
+                    _getexif = img._getexif()
+                    if _getexif and metadata.DATE_TIME_ORIGINAL_KEY in _getexif:
+                        date_taken = _getexif[metadata.DATE_TIME_ORIGINAL_KEY]
+                if not date_taken and hasattr(img, 'tag'):
+                    date_taken = img.tag._tagdata[metadata.DATE_TIME_ORIGINAL_KEY]
+            except Exception:
+                pass
+        if date_taken:
+            return date_taken
+        return metadata.retrieve_min_date(file_name, full_path)
+    if Path(full_path).suffix.lstrip('.').lower() in regex_patterns.VIDEO_EXTENSION_SET:
+        return metadata.retrieve_min_date(file_name, full_path)
+    return None
+
+
+def _proc_io() -> tuple[int, int] | None:
+    ''' (read system calls, bytes read) of this process '''
+    try:
+        with _open(_PROC_IO) as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+    except OSError:
+        return None
+    return int(fields['syscr']), int(fields['rchar'])
+
+
+def _counted(func, paths: list[str], min_times: list[float]) -> Counter:
+    counter: Counter = Counter()
+
+    def counting_open(*args, **kwargs):
+        counter['open'] += 1
+        return _open(*args, **kwargs)
+
+    def counting_stat(*args, **kwargs):
+        counter['stat'] += 1
+        return _stat(*args, **kwargs)
+
+    # Reading /proc/self/io costs reads too, measured without any work in between
+    empty_before, empty_after = _proc_io(), _proc_io()
+    before = _proc_io()
+    with patch('builtins.open', counting_open), patch('os.stat', counting_stat):
+        for path, min_time in zip(paths, min_times):
+            func(os.path.basename(path), path, min_time)
+    after = _proc_io()
+    if before and after:
+        counter['read calls'] = after[0] - before[0] - (empty_after[0] - empty_before[0])
+        counter['bytes read'] = after[1] - before[1] - (empty_after[1] - empty_before[1])
+    return counter
+
+
+def main() -> None:
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    tmp = None
+    if len(sys.argv) > 2:
+        folder = Path(sys.argv[2])
+        paths: dict[str, list[str]] = {}
+        for path in sorted(folder.rglob('*')):
+            paths.setdefault(path.suffix.lstrip('.').lower(), []).append(str(path))
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        print(f'Generating {files} files of each kind...')
+        paths = _generate(Path(tmp.name), files)
+
+    totals = {'previous': Counter(), 'probe': Counter()}
+    print(f'{"kind":6s} {"path":9s} {"opens":>7s} {"stats":>7s} {"reads":>8s} {"KiB read":>10s}  (per file)')
+    for extension, kind_paths in paths.items():
+        min_times = [min(s.st_atime, s.st_mtime, s.st_ctime) for s in map(os.stat, kind_paths)]
+        for label, func in (('previous', _previous_extract), ('probe', metadata.extract_metadata)):
+            # Plugins of Pillow are imported on first use
+            func(os.path.basename(kind_paths[0]), kind_paths[0], min_times[0])
+            counter = _counted(func, kind_paths, min_times)
+            totals[label].update(counter)
+            reads = f'{counter["read calls"] / len(kind_paths):8.1f}' if 'read calls' in counter else '     n/a'
+            kib = f'{counter["bytes read"] / len(kind_paths) / 1024:10.1f}' if 'bytes read' in counter else '       n/a'
+            print(f'{extension:6s} {label:9s} {counter["open"] / len(kind_paths):7.1f} '
+                  f'{counter["stat"] / len(kind_paths):7.1f} {reads} {kib}')
+
+    previous, probe = totals['previous'], totals['probe']
+    for key in ('open', 'stat', 'read calls', 'bytes read'):
+        if key in previous:
+            ratio = f'{previous[key] / probe[key]:.1f}x fewer' if probe[key] else 'none left'
+            print(f'{key:10s} {previous[key]:>12,d} previous {probe[key]:>12,d} probe  {ratio}')
+
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
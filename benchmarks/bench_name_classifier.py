@@ -0,0 +1,92 @@
+#!/usr/bin/python
+''' Source name classification with NameClassifier vs the previous per-file regex loops.
+
+Usage: python benchmarks/bench_name_classifier.py [NAMES]
+Defaults: 1,000,000 names, a mix of camera, screenshot, renamed and non media names, with two ignore patterns
+and the preset accept patterns. Destination names are matched with match_destination vs re.match on
+the previous DESTINATION_REGEX string.
+'''
+from __future__ import annotations
+
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import regex_patterns
+from name_classifier import ACCEPTED, IGNORED, UNMATCHED, NameClassifier
+
+IGNORE_REGEXS = [r'.*\.thumbnails.*', r'Thumbs\.db']
+_OLD_EXTENSION = '\\.(?P<extension>{})'.format('|'.join(regex_patterns.EXTENSIONS +
+                                                       [ext.upper() for ext in regex_patterns.EXTENSIONS]))
+# The previous patterns, with the case duplicated extension alternation
+OLD_PARTS = {**regex_patterns.REGEX_PARTS, 'extension': _OLD_EXTENSION}
+OLD_ACCEPTABLE_REGEXS = [regex.replace(regex_patterns.REGEX_PARTS['extension'], _OLD_EXTENSION)
+                         for regex in regex_patterns.ACCEPTABLE_REGEXS]
+OLD_DESTINATION_REGEX = '^{date}_{time_no_milli}_{suffix}{extension}'.format(**OLD_PARTS)
+
+
+def _names(count: int) -> list[str]:
+    rng = random.Random(0)
+    names = []
+    for i in range(count):
+        kind = rng.random()
+        stamp = f'2{rng.randrange(10):03d}{rng.randrange(1, 13):02d}{rng.randrange(1, 29):02d}_{i % 240000:06d}'
+        if kind < 0.5:
+            names.append(f'IMG_{stamp}.{rng.choice(["jpg", "JPG", "heic", "mp4"])}')
+        elif kind < 0.7:
+            names.append(f'DSC_{i:05d}.{rng.choice(["NEF", "jpg", "ARW"])}')
+        elif kind < 0.8:
+            names.append(f'Screenshot_{stamp}.png')
+        elif kind < 0.9:
+            names.append(f'holiday {i}.{rng.choice(["txt", "pdf", "xmp", "json"])}')
+        else:
+            names.append('Thumbs.db' if kind < 0.95 else f'{stamp}.{rng.choice(["jpg", "mov"])}')
+    return names
+
+
+def _classify_old(names: list[str]) -> list[str]:
+    ''' The previous loops: every ignore regex, then every accept regex, through re.match on strings '''
+    decisions = []
+    for name in names:
+        if any(re.match(regex, name) for regex in IGNORE_REGEXS):
+            decisions.append(IGNORED)
+        elif any(re.match(regex, name) for regex in OLD_ACCEPTABLE_REGEXS):
+            decisions.append(ACCEPTED)
+        else:
+            decisions.append(UNMATCHED)
+    return decisions
+
+
+def _time(label: str, func, names: list[str]) -> list:
+    start = time.perf_counter()
+    result = func(names)
+    elapsed = time.perf_counter() - start
+    print(f'{label:28s} {elapsed:8.2f} s total, {elapsed * 1e6 / len(names):8.2f} us/name')
+    return result
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    names = _names(count)
+    print(f'{count} names')
+
+    classifier = NameClassifier(IGNORE_REGEXS, regex_patterns.ACCEPTABLE_REGEXS)
+    new = _time('classifier', lambda names: [classifier.classify(name) for name in names], names)
+    old = _time('regex loops', _classify_old, names)
+    # Only mixed case extensions like .Jpg, which are not generated here, are decided differently
+    differences = sum(a != b for a, b in zip(new, old))
+    print(f'{differences} different decisions, {new.count(ACCEPTED)} accepted, {new.count(IGNORED)} ignored')
+
+    destination_names = [f'{name[4:19]}_000.{name.rpartition(".")[2]}' for name in names if name.startswith('IMG_')]
+    _time('match_destination', lambda names: [regex_patterns.match_destination(name) for name in names],
+          destination_names)
+    _time('re.match(DESTINATION_REGEX)', lambda names: [re.match(OLD_DESTINATION_REGEX, name) for name in names],
+          destination_names)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+''' Perceptual hashing of camera sized JPEGs: full decode vs reduced decode (draft) vs EXIF thumbnail vs cache.
+
+Usage: python benchmarks/bench_perceptual_hash.py [FILES] [FOLDER]
+Defaults: 100 JPEGs of 4032x3024 in a temporary folder, half of them with a 160x120 EXIF thumbnail.
+'''
+from __future__ import annotations
+
+import io
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import perceptual_hash
+
+IMAGE_SIZE = (4032, 3024)
+THUMBNAIL_SIZE = (160, 120)
+
+
+def _exif_with_thumbnail(thumbnail: bytes) -> bytes:
+    ''' Little endian TIFF with an empty IFD0 and the thumbnail in IFD1 '''
+    tiff = b'II' + struct.pack('<HI', 42, 8) + struct.pack('<HI', 0, 14)
+    tiff += struct.pack('<H', 2) + struct.pack('<HHII', 0x0201, 4, 1, 44)
+    tiff += struct.pack('<HHII', 0x0202, 4, 1, len(thumbnail)) + struct.pack('<I', 0)
+    return b'Exif\x00\x00' + tiff + thumbnail
+
+
+def _generate(folder: Path, files: int) -> list[Path]:
+    rng = random.Random(0)
+    paths = []
+    for i in range(files):
+        img = Image.new('RGB', IMAGE_SIZE, tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(20):
+            x, y = rng.randrange(IMAGE_SIZE[0]), rng.randrange(IMAGE_SIZE[1])
+            draw.ellipse([x, y, x + rng.randrange(200, 2000), y + rng.randrange(200, 2000)],
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        img = img.filter(ImageFilter.GaussianBlur(8))
+        kwargs = {}
+        if i % 2:
+            thumbnail = io.BytesIO()
+            img.resize(THUMBNAIL_SIZE).save(thumbnail, 'JPEG')
+            kwargs['exif'] = _exif_with_thumbnail(thumbnail.getvalue())
+        path = folder / f'IMG_{i:04d}.jpg'
+        img.save(path, 'JPEG', quality=90, **kwargs)
+        paths.append(path)
+    return paths
+
+
+def _full_decode(path: Path) -> tuple[int, int]:
+    with Image.open(path) as img:
+        small = img.convert('L')
+    return perceptual_hash.dhash(small), perceptual_hash.phash(small)
+
+
+def _draft_only(path: Path) -> tuple[int, int]:
+    with Image.open(path) as img:
+        img.draft('L', (perceptual_hash.PHASH_SIZE, perceptual_hash.PHASH_SIZE))
+        small = img.convert('L')
+    return perceptual_hash.dhash(small), perceptual_hash.phash(small)
+
+
+def _time(label: str, func, paths: list[Path]) -> None:
+    start = time.perf_counter()
+    for path in paths:
+        func(path)
+    elapsed = time.perf_counter() - start
+    print(f'{label:30s} {elapsed:8.2f} s total, {elapsed * 1000 / len(paths):8.2f} ms/file')
+
+
+def main() -> None:
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(sys.argv[2]) if len(sys.argv) > 2 else Path(tmp)
+        paths = sorted(folder.glob('*.jpg'))[:files] or _generate(folder, files)
+        print(f'{len(paths)} JPEGs of {IMAGE_SIZE[0]}x{IMAGE_SIZE[1]}')
+        with_thumbnail = paths[1::2]
+        _time('full decode', _full_decode, paths)
+        _time('reduced decode (draft)', _draft_only, paths)
+        _time('EXIF thumbnail', perceptual_hash.hash_image, with_thumbnail)
+        _time('hash_image', perceptual_hash.hash_image, paths)
+
+        cache = perceptual_hash.PerceptualHashCache(folder, index_name='bench_phashes.txt')
+        _time('cache, first run', cache.get, paths)
+        cache.save()
+        cache = perceptual_hash.PerceptualHashCache(folder, index_name='bench_phashes.txt')
+        cache.load()
+        _time('cache, re-run', cache.get, paths)
+        os.remove(cache.index_path)
+
+
+if __name__ == '__main__':
+    main()
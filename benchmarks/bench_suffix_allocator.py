@@ -0,0 +1,103 @@
+#!/usr/bin/python
+''' Destination name planning (_prepare_new_files_for_copy) with the suffix allocator vs the list scan.
+
+Usage: python benchmarks/bench_suffix_allocator.py [DESTINATION_FILES] [NEW_FILES]
+Defaults: 1,000,000 destination files and 100,000 new files, 10% of them burst shots sharing a second.
+The previous algorithm is quadratic, it is timed on a sample of the new files and extrapolated.
+'''
+from __future__ import annotations
+
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import regex_patterns
+from file_record import FileRecord
+from picture_handler import PicturesHandler
+
+OLD_ALGORITHM_SAMPLE = 200
+BURST_RATIO = 0.1
+
+
+def _date(index: int) -> dict:
+    ''' Distinct second of 2000-2019 for each index '''
+    seconds = index * 7
+    return {
+        'year': str(2000 + seconds // 31_536_000 % 20), 'month': f'{seconds // 2_628_000 % 12 + 1:02d}',
+        'day': f'{seconds // 86_400 % 28 + 1:02d}', 'hour': f'{seconds // 3600 % 24:02d}',
+        'minute': f'{seconds // 60 % 60:02d}', 'second': f'{seconds % 60:02d}',
+    }
+
+
+def _new_matched(new_files: int, destination_files: int) -> defaultdict[str, list[FileRecord]]:
+    matched: defaultdict[str, list[FileRecord]] = defaultdict(list)
+    rng = random.Random(1)
+    for i in range(new_files):
+        if rng.random() < BURST_RATIO:
+            # Burst shot colliding with an existing destination second
+            date = _date(rng.randrange(destination_files))
+        else:
+            date = _date(destination_files + i)
+        name = f'IMG_{i:06d}.jpg'
+        matched[name].append(FileRecord('', name, 0, **date))
+    return matched
+
+
+def _prepare_old(handler: PicturesHandler) -> None:
+    ''' The previous list scan and max() over all suffixes of the key '''
+    def get_new_suffix(records: list[FileRecord]) -> str:
+        return regex_patterns.NEW_SUFFIX_FORMAT.format(max(int(record.suffix) for record in records) + 1)
+
+    for key, matched in handler.matched.items():
+        for match in matched:
+            file_format = match.key()
+            if file_format not in list(handler.destination_formats) + list(handler.ready_to_add):
+                suffix = '000'
+            elif file_format in handler.ready_to_add:
+                suffix = get_new_suffix(handler.ready_to_add[file_format])
+            else:
+                suffix = get_new_suffix(handler.destination_formats[file_format])
+            match.suffix = suffix
+            handler.ready_to_add[file_format].append(match)
+
+
+def _handler(tmp: str, destination_files: int, matched: defaultdict[str, list[FileRecord]]) -> PicturesHandler:
+    handler = PicturesHandler(tmp, tmp, dry_run=True)
+    for i in range(destination_files):
+        record = FileRecord(tmp, f'{i}.jpg', 0, suffix='000', **_date(i))
+        key = record.key()
+        handler.destination_formats[key].append(record)
+        handler.suffixes.seed(key, '000')
+    handler.matched = matched
+    return handler
+
+
+def main() -> None:
+    destination_files = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    new_files = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    print(f'{destination_files} destination files, {new_files} new files')
+
+    with tempfile.TemporaryDirectory() as tmp, patch('picture_handler.logger'):
+        handler = _handler(tmp, destination_files, _new_matched(new_files, destination_files))
+        start = time.perf_counter()
+        handler._prepare_new_files_for_copy()
+        elapsed = time.perf_counter() - start
+        print(f'allocator    {elapsed:10.2f} s total, {elapsed * 1e6 / new_files:10.1f} us/file')
+
+        sample = min(OLD_ALGORITHM_SAMPLE, new_files)
+        handler = _handler(tmp, destination_files, _new_matched(sample, destination_files))
+        start = time.perf_counter()
+        _prepare_old(handler)
+        elapsed = time.perf_counter() - start
+        print(f'list scan    {elapsed * new_files / sample:10.2f} s total (extrapolated from {sample} files), '
+              f'{elapsed * 1e6 / sample:10.1f} us/file')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/python
+''' File system calls of the scandir walker vs the previous pathlib traversals.
+
+Usage: python benchmarks/bench_walker.py [FILES] [FOLDER]
+Without a folder, a destination-like tree (YYYY/MM folders) with FILES empty files (default 500,000) is
+generated. Calls are counted at the os module level: directory listings (scandir/listdir), stat/lstat
+calls, and the first stat() of each DirEntry (later calls are served from its cache). Type checks of
+DirEntry objects come from the directory listing and are free on Linux file systems reporting d_type.
+'''
+from __future__ import annotations
+
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import walker
+
+FILES_PER_FOLDER = 500
+
+
+class _CountingEntry:
+    ''' DirEntry proxy counting the first, uncached, stat() '''
+
+    def __init__(self, entry: os.DirEntry, counter: Counter) -> None:
+        self._entry = entry
+        self._counter = counter
+        self._stat = None
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self) -> bool:
+        return self._entry.is_symlink()
+
+    def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+        if self._stat is None:
+            self._counter['stat'] += 1
+            self._stat = self._entry.stat(follow_symlinks=follow_symlinks)
+        return self._stat
+
+    def __fspath__(self) -> str:
+        return self.path
+
+
+class _CountingScandir:
+
+    def __init__(self, path, counter: Counter) -> None:
+        self._it = _scandir(path)
+        self._counter = counter
+
+    def __enter__(self) -> _CountingScandir:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._it.close()
+
+    def __iter__(self):
+        return (_CountingEntry(entry, self._counter) for entry in self._it)
+
+    def close(self) -> None:
+        self._it.close()
+
+
+_scandir = os.scandir
+_listdir = os.listdir
+_stat = os.stat
+_lstat = os.lstat
+
+
+def _counted(func, counter: Counter) -> tuple[float, Counter]:
+    def scandir(path='.'):
+        counter['listing'] += 1
+        return _CountingScandir(path, counter)
+
+    def listdir(path='.'):
+        counter['listing'] += 1
+        return _listdir(path)
+
+    def stat(*args, **kwargs):
+        counter['stat'] += 1
+        return _stat(*args, **kwargs)
+
+    def lstat(*args, **kwargs):
+        counter['stat'] += 1
+        return _lstat(*args, **kwargs)
+
+    with patch('os.scandir', scandir), patch('os.listdir', listdir), patch('os.stat', stat), \
+            patch('os.lstat', lstat):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start, counter
+
+
+def _old_rglob(root: Path) -> int:
+    ''' find_duplicates, generate_duplicate_report, compare_folders, merge_dbs, move_files '''
+    files = [f for f in root.rglob('*') if f.is_file()]
+    return sum(f.stat().st_size for f in files)
+
+
+def _new_walk(root: Path) -> int:
+    return sum(entry.stat().st_size for entry in walker.walk(root))
+
+
+def _old_destination_scan(folder: Path) -> None:
+    ''' PicturesHandler._handle_destination_folder: three iterdir() and a stat per check '''
+    for d in [d for d in folder.iterdir() if d.is_dir() and re.match(r'^\d{2,4}$', d.name)]:
+        _old_destination_scan(d)
+    [d for d in folder.iterdir() if d.is_dir() and not re.match(r'^\d{4}$', d.name)]
+    for f in [f.name for f in folder.iterdir() if f.is_file()]:
+        (folder / f).stat()
+
+
+def _new_destination_scan(folder: str) -> None:
+    subdirs, entries = walker.scan_dir(folder)
+    for d in subdirs:
+        if re.match(r'^\d{2,4}$', d.name):
+            _new_destination_scan(d.path)
+    for entry in entries:
+        entry.stat()
+
+
+def _generate(root: Path, files: int) -> None:
+    for i in range(files):
+        folder = root / f'{2000 + i // (FILES_PER_FOLDER * 12) % 25}' / f'{i // FILES_PER_FOLDER % 12 + 1:02d}'
+        if i % FILES_PER_FOLDER == 0:
+            folder.mkdir(parents=True, exist_ok=True)
+        (folder / f'20000101_000000_{i:07d}.jpg').touch()
+
+
+def main() -> None:
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    tmp = None
+    if len(sys.argv) > 2:
+        root = Path(sys.argv[2])
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        root = Path(tmp.name)
+        print(f'Generating {files} files...')
+        _generate(root, files)
+
+    for label, func in (('rglob + is_file + stat', lambda: _old_rglob(root)),
+                        ('walker.walk', lambda: _new_walk(root)),
+                        ('destination iterdir x3', lambda: _old_destination_scan(root)),
+                        ('destination scan_dir', lambda: _new_destination_scan(str(root)))):
+        elapsed, counter = _counted(func, Counter())
+        print(f'{label:24s} {counter["listing"]:>9d} listings {counter["stat"]:>10d} stats {elapsed:8.2f} s')
+
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
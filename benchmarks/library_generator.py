@@ -0,0 +1,233 @@
+#!/usr/bin/python
+''' Synthetic photo library for benchmarks.
+
+Usage: python benchmarks/library_generator.py ROOT [DESTINATION_FILES] [SOURCE_FILES] [DUPLICATE_RATIO]
+Defaults: 10,000 destination files, a tenth of them as source files, 10% duplicates.
+ROOT gets:
+- src/ — camera style DCIM folders of IMG_*.jpg (EXIF DateTimeOriginal), DSC_*.nef (TIFF based RAW
+  with DateTimeOriginal), VID_*.mp4 (mvhd creation time) and Screenshot_*.png (dated by file times)
+- dst/ — a YYYY/MM tree of YYYYMMDD_HHMMSS_NNN.ext files with its files.txt DB
+- flat/ — the dst files (hard links) in a single folder, as before organize_by_year
+- db_b.json — a second DB for merge_dbs, half of it overlapping with dst names
+Every file is a small valid header followed by random padding with a lognormal size, so contents are
+unique and sizes are skewed towards small files with a long tail. DUPLICATE_RATIO of the source files
+are copies of destination files and the same ratio of destination files are copies of other ones.
+'''
+from __future__ import annotations
+
+import io
+import json
+import os
+import random
+import shutil
+import struct
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bmff
+import metadata
+import utils
+
+# Folders generated in ROOT
+TREES = ['src', 'dst', 'flat']
+FILES_PER_FOLDER = 500
+MEDIAN_SIZE = 4 * 1024
+MAX_SIZE = 1024 * 1024
+SIZE_SIGMA = 1.0
+# Share of each kind in the generated files: (extension, source name prefix, weight)
+KINDS = [('jpg', 'IMG_', 70), ('nef', 'DSC_', 15), ('mp4', 'VID_', 10), ('png', 'Screenshot_', 5)]
+_PLACEHOLDER_DATE = '2000:01:01 00:00:00'
+_FIRST_DATE = 946684800  # 2000-01-01
+_LAST_DATE = 1735689600  # 2025-01-01
+
+
+def _jpeg_template() -> bytes:
+    from PIL import ExifTags, Image
+
+    exif = Image.Exif()
+    exif.get_ifd(ExifTags.IFD.Exif)[metadata.DATE_TIME_ORIGINAL_KEY] = _PLACEHOLDER_DATE
+    data = io.BytesIO()
+    Image.new('RGB', (16, 16), 'gray').save(data, 'JPEG', exif=exif.tobytes())
+    return data.getvalue()
+
+
+def _nef_template() -> bytes:
+    from PIL import Image
+
+    data = io.BytesIO()
+    tags = {metadata.DATE_TIME_ORIGINAL_KEY: _PLACEHOLDER_DATE}
+    Image.new('RGB', (16, 16), 'gray').save(data, 'TIFF', tiffinfo=tags)
+    return data.getvalue()
+
+
+def _png_template() -> bytes:
+    from PIL import Image
+
+    data = io.BytesIO()
+    Image.new('RGB', (16, 16), 'gray').save(data, 'PNG')
+    return data.getvalue()
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def _mp4_header(timestamp: int) -> bytes:
+    mac_time = timestamp + bmff.MAC_EPOCH_OFFSET
+    mvhd = _box(b'mvhd', struct.pack('>B3xIIII', 0, mac_time, mac_time, 1000, 0) + b'\x00' * 80)
+    return _box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2mp41') + _box(b'moov', mvhd)
+
+
+class LibraryGenerator:
+    ''' Writes files of the KINDS mix dated at timestamp, with padding up to a lognormal size '''
+
+    def __init__(self, seed: int = 0, median_size: int = MEDIAN_SIZE) -> None:
+        self.random = random.Random(seed)
+        self.median_size = median_size
+        self.templates = {'jpg': _jpeg_template(), 'nef': _nef_template(), 'png': _png_template()}
+        self.kinds = [kind for kind in KINDS for _ in range(kind[2])]
+        self.bytes_written = 0
+
+    def kind(self) -> tuple[str, str, int]:
+        return self.random.choice(self.kinds)
+
+    def timestamp(self) -> int:
+        return self.random.randrange(_FIRST_DATE, _LAST_DATE)
+
+    def size(self) -> int:
+        return min(int(self.random.lognormvariate(0, SIZE_SIGMA) * self.median_size), MAX_SIZE)
+
+    def header(self, extension: str, timestamp: int) -> bytes:
+        if extension == 'mp4':
+            return _mp4_header(timestamp)
+        template = self.templates[extension]
+        if extension == 'png':
+            return template
+        date = time.strftime('%Y:%m:%d %H:%M:%S', time.gmtime(timestamp)).encode()
+        return template.replace(_PLACEHOLDER_DATE.encode(), date, 1)
+
+    def write(self, path: Path, extension: str, timestamp: int) -> int:
+        header = self.header(extension, timestamp)
+        data = header + self.random.randbytes(max(self.size() - len(header), 16))
+        path.write_bytes(data)
+        # Pinned times: PNG dates come from them and reading a file must not change its date (atime)
+        os.utime(path, (timestamp, timestamp))
+        self.bytes_written += len(data)
+        return len(data)
+
+
+def _copy(source: Path, target: Path) -> int:
+    data = source.read_bytes()
+    target.write_bytes(data)
+    stat = source.stat()
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return len(data)
+
+
+def _destination_name(timestamp: int, extension: str, taken: set[str]) -> str:
+    base = time.strftime('%Y%m%d_%H%M%S', time.gmtime(timestamp))
+    suffix = 0
+    while f'{base}_{suffix:03d}.{extension}' in taken:
+        suffix += 1
+    name = f'{base}_{suffix:03d}.{extension}'
+    taken.add(name)
+    return name
+
+
+def generate(root: str | Path, destination_files: int = 10_000, source_files: int | None = None,
+             duplicate_ratio: float = 0.1, seed: int = 0, median_size: int = MEDIAN_SIZE) -> dict:
+    ''' Build the library in root and return its statistics '''
+    root = Path(root)
+    src = root / 'src'
+    dst = root / 'dst'
+    if source_files is None:
+        source_files = destination_files // 10
+    generator = LibraryGenerator(seed, median_size)
+    rand = generator.random
+
+    taken: set[str] = set()
+    db: dict[str, dict] = {}
+    destination: list[Path] = []
+    folders: set[Path] = set()
+    for i in range(destination_files):
+        if destination and rand.random() < duplicate_ratio:
+            original = rand.choice(destination)
+            extension = original.suffix[1:]
+            timestamp = int(original.stat().st_mtime)
+        else:
+            original = None
+            extension, _, _ = generator.kind()
+            timestamp = generator.timestamp()
+        date = time.gmtime(timestamp)
+        folder = dst / f'{date.tm_year}' / f'{date.tm_mon:02d}'
+        if folder not in folders:
+            folder.mkdir(parents=True, exist_ok=True)
+            folders.add(folder)
+        name = _destination_name(timestamp, extension, taken)
+        path = folder / name
+        if original is None:
+            size = generator.write(path, extension, timestamp)
+        else:
+            size = _copy(original, path)
+            generator.bytes_written += size
+        destination.append(path)
+        db[name] = {'source_name': f'{KINDS[0][1]}{i:07d}.{extension}', 'size': size}
+    utils.save_db_files(db, str(dst))
+
+    flat = root / 'flat'
+    flat.mkdir()
+    for path in destination:
+        try:
+            os.link(path, flat / path.name)
+        except OSError:
+            shutil.copy2(path, flat / path.name)
+
+    for i in range(source_files):
+        folder = src / 'DCIM' / f'{100 + i // FILES_PER_FOLDER}CAMERA'
+        if i % FILES_PER_FOLDER == 0:
+            folder.mkdir(parents=True)
+        if destination and rand.random() < duplicate_ratio:
+            original = rand.choice(destination)
+            prefix = next(prefix for extension, prefix, _ in KINDS if extension == original.suffix[1:])
+            generator.bytes_written += _copy(original, folder / f'{prefix}{i:07d}{original.suffix}')
+            continue
+        extension, prefix, _ = generator.kind()
+        generator.write(folder / f'{prefix}{i:07d}.{extension}', extension, generator.timestamp())
+
+    db_b: dict[str, dict] = {}
+    names = list(db)
+    for i in range(len(db) // 10):
+        if names and i % 2 == 0:
+            name = rand.choice(names)
+            db_b[name] = dict(db[name])
+            if rand.random() < 0.5:
+                db_b[name]['size'] += 1
+        else:
+            name = _destination_name(generator.timestamp(), 'jpg', taken)
+            db_b[name] = {'source_name': f'{KINDS[0][1]}B{i:07d}.jpg', 'size': generator.size()}
+    with open(root / 'db_b.json', 'w') as f:
+        json.dump(db_b, f)
+
+    return {'destination_files': destination_files, 'source_files': source_files,
+            'duplicate_ratio': duplicate_ratio, 'seed': seed, 'median_size': median_size,
+            'db_b_entries': len(db_b), 'bytes': generator.bytes_written}
+
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    destination_files = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    source_files = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    duplicate_ratio = float(sys.argv[4]) if len(sys.argv) > 4 else 0.1
+    start = time.perf_counter()
+    stats = generate(sys.argv[1], destination_files, source_files, duplicate_ratio)
+    print(json.dumps(stats, indent=4))
+    print(f'{time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+from typing import Iterator
+
+import exif_reader
+from media_probe import HeaderSource, ProbeError
+
+# Seconds between the ISO-BMFF epoch (1904-01-01) and the Unix epoch
+MAC_EPOCH_OFFSET = 2082844800
+
+
+class BoxError(ProbeError):
+    ''' Malformed ISO-BMFF box structure '''
+
+
+def iter_boxes(source: HeaderSource, start: int, end: int | None) -> Iterator[tuple[bytes, int, int]]:
+    ''' (type, payload offset, box end) of the boxes in [start, end), reading only box headers '''
+    offset = start
+    while end is None or offset + 8 <= end:
+        try:
+            header = source.read(offset, 8)
+        except ProbeError:
+            if end is None:
+                return
+            raise
+        size, box_type = struct.unpack('>I4s', header)
+        payload = offset + 8
+        if size == 1:
+            size, = struct.unpack('>Q', source.read(offset + 8, 8))
+            payload = offset + 16
+        elif size == 0:
+            size = (end if end is not None else source.size()) - offset
+        if size < payload - offset:
+            raise BoxError(f'Invalid box size {size} for {box_type!r} at {offset}')
+        box_end = offset + size
+        yield box_type, payload, box_end
+        offset = box_end
+
+
+def find_box(source: HeaderSource, path: list[bytes], start: int = 0, end: int | None = None) -> tuple[int, int] | None:
+    ''' (payload offset, box end) of the first box found by following the type path '''
+    for box_type, payload, box_end in iter_boxes(source, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            return find_box(source, path[1:], payload, box_end)
+    return None
+
+
+def read_creation_time(source: HeaderSource) -> int | None:
+    ''' moov/mvhd creation_time as a Unix timestamp, None when missing or unset '''
+    mvhd = find_box(source, [b'moov', b'mvhd'])
+    if mvhd is None:
+        return None
+    payload, _ = mvhd
+    version = source.read(payload, 1)[0]
+    if version == 1:
+        creation_time, = struct.unpack('>Q', source.read(payload + 4, 8))
+    else:
+        creation_time, = struct.unpack('>I', source.read(payload + 4, 4))
+    if creation_time <= MAC_EPOCH_OFFSET:
+        # Zero (unset) or before 1970
+        return None
+    return creation_time - MAC_EPOCH_OFFSET
+
+
+def _read_uint(source: HeaderSource, offset: int, size: int) -> int:
+    if size == 0:
+        return 0
+    if size not in (2, 4, 8):
+        raise BoxError(f'Unsupported field size {size}')
+    return int.from_bytes(source.read(offset, size), 'big')
+
+
+def _find_exif_item_id(source: HeaderSource, payload: int, end: int) -> int | None:
+    ''' item_ID of the Exif item listed in an iinf box '''
+    version = source.read(payload, 1)[0]
+    offset = payload + 4 + (2 if version == 0 else 4)
+    for box_type, infe_payload, _ in iter_boxes(source, offset, end):
+        if box_type != b'infe':
+            continue
+        infe_version = source.read(infe_payload, 1)[0]
+        if infe_version < 2:
+            continue
+        id_size = 2 if infe_version == 2 else 4
+        item_id = _read_uint(source, infe_payload + 4, id_size)
+        item_type = source.read(infe_payload + 4 + id_size + 2, 4)
+        if item_type == b'Exif':
+            return item_id
+    return None
+
+
+def _find_item_location(source: HeaderSource, payload: int, item_id: int) -> tuple[int, int, int] | None:
+    ''' (construction method, offset, length) of the first extent of an item listed in an iloc box '''
+    version = source.read(payload, 1)[0]
+    sizes = source.read(payload + 4, 2)
+    offset_size, length_size = sizes[0] >> 4, sizes[0] & 0x0F
+    base_offset_size = sizes[1] >> 4
+    index_size = sizes[1] & 0x0F if version in (1, 2) else 0
+    offset = payload + 6
+    item_count = _read_uint(source, offset, 2 if version < 2 else 4)
+    offset += 2 if version < 2 else 4
+    for _ in range(item_count):
+        current_id = _read_uint(source, offset, 2 if version < 2 else 4)
+        offset += 2 if version < 2 else 4
+        construction_method = 0
+        if version in (1, 2):
+            construction_method = _read_uint(source, offset, 2) & 0x0F
+            offset += 2
+        offset += 2  # data_reference_index
+        base_offset = _read_uint(source, offset, base_offset_size)
+        offset += base_offset_size
+        extent_count = _read_uint(source, offset, 2)
+        offset += 2
+        extents = []
+        for _ in range(extent_count):
+            offset += index_size
+            extent_offset = _read_uint(source, offset, offset_size)
+            offset += offset_size
+            extent_length = _read_uint(source, offset, length_size)
+            offset += length_size
+            extents.append((base_offset + extent_offset, extent_length))
+        if current_id == item_id and extents:
+            return construction_method, extents[0][0], extents[0][1]
+    return None
+
+
+def read_heif_date(source: HeaderSource) -> str | None:
+    ''' DateTimeOriginal of the Exif item of a HEIF/AVIF file, reading only the meta box and the item '''
+    meta = find_box(source, [b'meta'])
+    if meta is None:
+        return None
+    meta_payload, meta_end = meta
+    # meta is a full box: skip version and flags
+    children = {box_type: (payload, box_end)
+                for box_type, payload, box_end in iter_boxes(source, meta_payload + 4, meta_end)}
+    if b'iinf' not in children or b'iloc' not in children:
+        return None
+    item_id = _find_exif_item_id(source, *children[b'iinf'])
+    if item_id is None:
+        return None
+    location = _find_item_location(source, children[b'iloc'][0], item_id)
+    if location is None:
+        return None
+    construction_method, item_offset, item_length = location
+    if construction_method == 1:
+        if b'idat' not in children:
+            raise BoxError('Exif item stored in a missing idat box')
+        item_offset += children[b'idat'][0]
+    elif construction_method != 0:
+        raise BoxError(f'Unsupported iloc construction method {construction_method}')
+    if item_length < 4:
+        return None
+    # The Exif item starts with the offset of the TIFF header within the item payload
+    tiff_header_offset = _read_uint(source, item_offset, 4)
+    return exif_reader.read_tiff_date_at(source, item_offset + 4 + tiff_header_offset)
+
+
+def read_heif_exif_date(header: bytes, file_path: str | Path | None = None) -> str | None:
+    source = HeaderSource(file_path, header)
+    try:
+        return read_heif_date(source)
+    finally:
+        source.close()
+
+
+def read_video_creation_time(header: bytes, file_path: str | Path | None = None) -> int | None:
+    source = HeaderSource(file_path, header)
+    try:
+        return read_creation_time(source)
+    finally:
+        source.close()
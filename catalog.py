@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import sqlite3
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Iterator
+
+import utils
+from utils import CATALOG_DB_NAME
+
+JSON_BACKEND = 'json'
+SQLITE_BACKEND = 'sqlite'
+BACKENDS = [JSON_BACKEND, SQLITE_BACKEND]
+
+
+class Catalog(ABC):
+    ''' Destination DB: {destination name: {'source_name': str, 'size': int}} '''
+
+    backend: str = ''
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ''' Number of destination names '''
+
+    @abstractmethod
+    def __contains__(self, name: str) -> bool:
+        ''' Whether name is a destination name '''
+
+    @abstractmethod
+    def get(self, name: str) -> dict | None:
+        ''' Entry of a destination name, None when unknown '''
+
+    @abstractmethod
+    def items(self) -> Iterator[tuple[str, dict]]:
+        ''' (destination name, entry) of every entry '''
+
+    def names(self) -> set[str]:
+        return {name for name, _ in self.items()}
+
+    @abstractmethod
+    def is_handled_name(self, name: str) -> bool:
+        ''' Whether name is a destination name or the source name of any entry '''
+
+    @abstractmethod
+    def add(self, name: str, entry: dict) -> None:
+        ''' Add or replace the entry of a destination name, stored on commit '''
+
+    def update(self, entries: dict[str, dict]) -> None:
+        for name, entry in entries.items():
+            self.add(name, entry)
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        ''' Remove a destination name, stored on commit '''
+
+    @abstractmethod
+    def commit(self) -> None:
+        ''' Store the changes since the last commit '''
+
+    def compact(self) -> None:
+        ''' Commit, leaving the storage in its most compact form '''
+        self.commit()
+
+    def close(self) -> None:
+        pass
+
+    def to_dict(self) -> dict[str, dict]:
+        return dict(self.items())
+
+
+class JsonCatalog(Catalog):
+    ''' files.txt, fully loaded in memory. Changes are appended to its journal on commit '''
+
+    backend = JSON_BACKEND
+
+    def __init__(self, folder: str | Path, db_name: str = utils.DB_NAME) -> None:
+        self.folder = str(folder)
+        self.db_name = db_name
+        self.files = utils.load_db_files(self.folder, db_name)
+        self._handled_names: set[str] | None = None
+        self._journal: list[dict] = []
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.files
+
+    def get(self, name: str) -> dict | None:
+        return self.files.get(name)
+
+    def items(self) -> Iterator[tuple[str, dict]]:
+        return iter(self.files.items())
+
+    def names(self) -> set[str]:
+        return set(self.files)
+
+    def is_handled_name(self, name: str) -> bool:
+        if self._handled_names is None:
+            self._handled_names = set(self.files)
+            self._handled_names.update(entry['source_name'] for entry in self.files.values())
+        return name in self._handled_names
+
+    def add(self, name: str, entry: dict) -> None:
+        self.files[name] = entry
+        if self._handled_names is not None:
+            self._handled_names.update((name, entry['source_name']))
+        self._journal.append({'op': 'add', 'name': name, 'entry': entry})
+
+    def delete(self, name: str) -> None:
+        del self.files[name]
+        self._handled_names = None
+        self._journal.append({'op': 'delete', 'name': name})
+
+    def commit(self) -> None:
+        utils.append_db_journal(self._journal, self.folder, self.db_name)
+        self._journal = []
+        utils.compact_db_journal(self.folder, self.db_name)
+
+    def compact(self) -> None:
+        self.commit()
+        utils.compact_db_journal(self.folder, self.db_name, force=True)
+
+    def to_dict(self) -> dict[str, dict]:
+        return self.files
+
+
+class SqliteCatalog(Catalog):
+    ''' files.db with indexes on destination name, source name and size '''
+
+    backend = SQLITE_BACKEND
+
+    def __init__(self, db_path: str | Path) -> None:
+        self.db_path = Path(db_path)
+        self.connection = sqlite3.connect(str(self.db_path))
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                name TEXT PRIMARY KEY,
+                source_name TEXT NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS files_source_name ON files (source_name);
+            CREATE INDEX IF NOT EXISTS files_size ON files (size);
+            DROP INDEX IF EXISTS files_hash;
+        ''')
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def __contains__(self, name: str) -> bool:
+        return self.connection.execute('SELECT 1 FROM files WHERE name = ?', (name,)).fetchone() is not None
+
+    def get(self, name: str) -> dict | None:
+        row = self.connection.execute('SELECT source_name, size FROM files WHERE name = ?', (name,)).fetchone()
+        return {'source_name': row[0], 'size': row[1]} if row else None
+
+    def items(self) -> Iterator[tuple[str, dict]]:
+        for name, source_name, size in self.connection.execute('SELECT name, source_name, size FROM files'):
+            yield name, {'source_name': source_name, 'size': size}
+
+    def names(self) -> set[str]:
+        return {row[0] for row in self.connection.execute('SELECT name FROM files')}
+
+    def is_handled_name(self, name: str) -> bool:
+        return self.connection.execute(
+            'SELECT 1 FROM files WHERE name = ? UNION ALL SELECT 1 FROM files WHERE source_name = ? LIMIT 1',
+            (name, name)).fetchone() is not None
+
+    def add(self, name: str, entry: dict) -> None:
+        self.connection.execute(
+            'INSERT OR REPLACE INTO files (name, source_name, size) VALUES (?, ?, ?)',
+            (name, entry['source_name'], entry['size']))
+
+    def update(self, entries: dict[str, dict]) -> None:
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO files (name, source_name, size) VALUES (?, ?, ?)',
+            ((name, entry['source_name'], entry['size']) for name, entry in entries.items()))
+
+    def delete(self, name: str) -> None:
+        self.connection.execute('DELETE FROM files WHERE name = ?', (name,))
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def open_catalog(folder: str | Path, backend: str | None = None) -> Catalog:
+    ''' Catalog of a destination folder; without a backend, files.db is used when it exists '''
+    db_path = Path(folder) / CATALOG_DB_NAME
+    if backend is None:
+        backend = SQLITE_BACKEND if db_path.exists() else JSON_BACKEND
+    if backend == SQLITE_BACKEND:
+        return SqliteCatalog(db_path)
+    if backend == JSON_BACKEND:
+        return JsonCatalog(folder)
+    raise ValueError(f'Unknown catalog backend {backend}. Available: {", ".join(BACKENDS)}')
+
+
+def import_json_catalog(folder: str, dry_run: bool = True,
+                        logger_func: Callable[..., None] | None = None) -> int:
+    ''' One-time import of files.txt into files.db '''
+    if not logger_func:
+        logger_func = print
+    files = utils.load_db_files(folder)
+    if utils.is_old_db_format(files):
+        logger_func('DB is in old format, run --convert-db first')
+        return 0
+    logger_func(f'{len(files)} entries to import into {CATALOG_DB_NAME}')
+    if dry_run:
+        logger_func(f'[DRY RUN] {CATALOG_DB_NAME} would be created')
+        return len(files)
+    sqlite_catalog = SqliteCatalog(Path(folder) / CATALOG_DB_NAME)
+    try:
+        sqlite_catalog.update(files)
+        sqlite_catalog.commit()
+    finally:
+        sqlite_catalog.close()
+    logger_func(f'Imported {len(files)} entries into {CATALOG_DB_NAME}, {utils.DB_NAME} is no longer used')
+    return len(files)
+
+
+def export_json_catalog(folder: str, dry_run: bool = True,
+                        logger_func: Callable[..., None] | None = None) -> int:
+    ''' Write the files.db content back to files.txt '''
+    if not logger_func:
+        logger_func = print
+    db_path = Path(folder) / CATALOG_DB_NAME
+    if not db_path.exists():
+        logger_func(f'{CATALOG_DB_NAME} does not exist in {folder}')
+        return 0
+    sqlite_catalog = SqliteCatalog(db_path)
+    try:
+        files = sqlite_catalog.to_dict()
+    finally:
+        sqlite_catalog.close()
+    if dry_run:
+        logger_func(f'[DRY RUN] {len(files)} entries would be exported to {utils.DB_NAME}')
+        return len(files)
+    utils.save_db_files(files, folder)
+    logger_func(f'Exported {len(files)} entries to {utils.DB_NAME}. '
+                f'Remove {CATALOG_DB_NAME} to switch back to the JSON DB')
+    return len(files)
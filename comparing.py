@@ -5,6 +5,8 @@ from pathlib import Path
 import sys
 import inspect
 
+import profiling
+
 
 class Comparer:
 
@@ -18,6 +20,7 @@ class Comparer:
 class BinaryComparer(Comparer):
 
     def pass_compare(self, file_path1: str, file_path2: str) -> bool:
+        profiling.count(profiling.FILECMP_CALLS)
         return not filecmp.cmp(file_path1, file_path2, shallow=False)
 
 
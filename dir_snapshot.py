@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import profiling
+import walker
+
+DIR_SNAPSHOT_NAME = 'dirs.txt'
+# Directories modified this close to the scan may still change within the same mtime tick
+RACY_MTIME_NS = 2 * 10 ** 9
+
+
+class DirectorySnapshot:
+    ''' Listing cache of the destination folder tree.
+
+    Persisted next to the DB as {relative dir: {'mtime_ns': int, 'count': int,
+    'dirs': [names], 'files': [[name, size], ...]}}. A directory is only listed again
+    when its mtime differs from the snapshot or its record is inconsistent. Adding, removing
+    or renaming entries changes the mtime of their directory; files rewritten in place keep
+    the old size until a full scan. scan() may be called from several threads.
+    '''
+
+    def __init__(self, folder: str | Path, snapshot_name: str = DIR_SNAPSHOT_NAME) -> None:
+        self.folder = Path(folder)
+        self.snapshot_path = self.folder / snapshot_name
+        self.dirs: dict[str, dict] = {}
+        self.listed_dirs: int = 0
+        self.cached_dirs: int = 0
+        self._scanned: dict[str, dict] = {}
+        self._changed = False
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        if not self.snapshot_path.exists():
+            return
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                self.dirs = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            self.dirs = {}
+
+    def save(self) -> None:
+        ''' Persist the directories scanned in this run, dropping the ones that no longer exist '''
+        if not self._scanned or (not self._changed and self._scanned.keys() == self.dirs.keys()):
+            # Nothing scanned (e.g. --trust-db) or nothing changed
+            return
+        with open(self.snapshot_path, 'w') as f:
+            json.dump(self._scanned, f)
+        self.dirs = self._scanned
+        self._changed = False
+
+    def scan(self, folder: str | Path) -> tuple[list[str], list[tuple[str, int]]]:
+        ''' (subdirectory names, [(file name, size)]) of folder, from the snapshot when it is unchanged '''
+        key = os.path.relpath(folder, self.folder)
+        dir_stat = os.stat(folder)
+        profiling.count(profiling.STAT_CALLS)
+        cached = self.dirs.get(key)
+        if (cached and cached['mtime_ns'] == dir_stat.st_mtime_ns
+                and cached['count'] == len(cached['dirs']) + len(cached['files'])):
+            with self._lock:
+                self.cached_dirs += 1
+                self._scanned[key] = cached
+            return cached['dirs'], [(name, size) for name, size in cached['files']]
+
+        subdirs, entries = walker.scan_dir(folder)
+        dirs = [d.name for d in subdirs]
+        files = [(entry.name, entry.stat().st_size) for entry in entries]
+        profiling.count(profiling.STAT_CALLS, len(entries))
+        mtime_ns = dir_stat.st_mtime_ns
+        if time.time_ns() - mtime_ns < RACY_MTIME_NS:
+            # Don't trust this listing next time, a change in the same tick would keep the mtime
+            mtime_ns = -1
+        with self._lock:
+            self.listed_dirs += 1
+            self._scanned[key] = {'mtime_ns': mtime_ns, 'count': len(dirs) + len(files), 'dirs': dirs,
+                                  'files': [[name, size] for name, size in files]}
+            self._changed = True
+        return dirs, files
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+
+from media_probe import HeaderSource, ProbeError
+
+DATE_TIME_ORIGINAL_TAG = 0x9003
+EXIF_IFD_POINTER_TAG = 0x8769
+ASCII_TYPE = 2
+
+_JPEG_SOS = 0xDA
+_JPEG_EOI = 0xD9
+_EXIF_SIGNATURE = b'Exif\x00\x00'
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_MAX_IFD_ENTRIES = 1024
+# DateTimeOriginal is 20 bytes, a longer count is a corrupt entry, not a date worth reading
+_MAX_ASCII_COUNT = 64
+
+
+class ExifError(ProbeError):
+    ''' The file structure can't be parsed by the header-only reader '''
+
+
+def read_tiff_date_at(source: HeaderSource, base: int) -> str | None:
+    ''' DateTimeOriginal from the Exif IFD, falling back to IFD0, of a TIFF structure at base '''
+    byte_order = source.read(base, 2)
+    if byte_order == b'II':
+        endian = '<'
+    elif byte_order == b'MM':
+        endian = '>'
+    else:
+        raise ExifError(f'Invalid TIFF byte order {byte_order!r}')
+    magic, ifd0_offset = struct.unpack(endian + 'HI', source.read(base + 2, 6))
+    if magic != 42:
+        raise ExifError(f'Invalid TIFF magic {magic}')
+
+    def read_ifd(ifd_offset: int) -> dict[int, tuple[int, int, bytes]]:
+        count, = struct.unpack(endian + 'H', source.read(base + ifd_offset, 2))
+        if count > _MAX_IFD_ENTRIES:
+            raise ExifError(f'Implausible IFD entry count {count}')
+        data = source.read(base + ifd_offset + 2, count * 12)
+        entries = {}
+        for i in range(count):
+            tag, value_type, value_count = struct.unpack_from(endian + 'HHI', data, i * 12)
+            entries[tag] = (value_type, value_count, data[i * 12 + 8:i * 12 + 12])
+        return entries
+
+    def ascii_value(entry: tuple[int, int, bytes]) -> str | None:
+        value_type, value_count, value = entry
+        if value_type != ASCII_TYPE:
+            return None
+        if value_count > _MAX_ASCII_COUNT:
+            raise ExifError(f'Implausible ASCII value count {value_count}')
+        if value_count > 4:
+            offset, = struct.unpack(endian + 'I', value)
+            value = source.read(base + offset, value_count)
+        return value[:value_count].rstrip(b'\x00 ').decode('latin-1') or None
+
+    ifd0 = read_ifd(ifd0_offset)
+    if EXIF_IFD_POINTER_TAG in ifd0:
+        exif_offset, = struct.unpack(endian + 'I', ifd0[EXIF_IFD_POINTER_TAG][2])
+        exif_ifd = read_ifd(exif_offset)
+        if DATE_TIME_ORIGINAL_TAG in exif_ifd:
+            return ascii_value(exif_ifd[DATE_TIME_ORIGINAL_TAG])
+    if DATE_TIME_ORIGINAL_TAG in ifd0:
+        return ascii_value(ifd0[DATE_TIME_ORIGINAL_TAG])
+    return None
+
+
+def _find_jpeg_exif(source: HeaderSource) -> int | None:
+    ''' Offset of the TIFF structure inside the APP1 Exif segment, None when there is none '''
+    if source.read(0, 2) != b'\xff\xd8':
+        raise ExifError('Missing JPEG SOI marker')
+    offset = 2
+    while True:
+        marker = source.read(offset, 2)
+        if marker[0] != 0xFF:
+            raise ExifError(f'Invalid JPEG marker at {offset}')
+        if marker[1] == 0xFF:
+            # Fill byte
+            offset += 1
+            continue
+        if marker[1] in (_JPEG_SOS, _JPEG_EOI):
+            return None
+        length, = struct.unpack('>H', source.read(offset + 2, 2))
+        if marker[1] == 0xE1 and length >= 8 and source.read(offset + 4, 6) == _EXIF_SIGNATURE:
+            return offset + 10
+        offset += 2 + length
+
+
+def _find_png_exif(source: HeaderSource) -> int | None:
+    ''' Offset of the TIFF structure in the eXIf chunk, None when the image data comes first.
+
+    PNG requires eXIf before IDAT, so the chunks of the image data are never read.
+    '''
+    if source.read(0, 8) != _PNG_SIGNATURE:
+        raise ExifError('Missing PNG signature')
+    offset = 8
+    while True:
+        length, chunk_type = struct.unpack('>I4s', source.read(offset, 8))
+        if chunk_type == b'eXIf':
+            # Some writers keep the APP1 signature
+            if source.read(offset + 8, 6) == _EXIF_SIGNATURE:
+                return offset + 14
+            return offset + 8
+        if chunk_type in (b'IDAT', b'IEND'):
+            return None
+        offset += 12 + length
+
+
+def read_png_date(header: bytes, file_path: str | Path | None = None) -> str | None:
+    source = HeaderSource(file_path, header)
+    try:
+        tiff_offset = _find_png_exif(source)
+        if tiff_offset is None:
+            return None
+        return read_tiff_date_at(source, tiff_offset)
+    finally:
+        source.close()
+
+
+def read_jpeg_date(header: bytes, file_path: str | Path | None = None) -> str | None:
+    source = HeaderSource(file_path, header)
+    try:
+        tiff_offset = _find_jpeg_exif(source)
+        if tiff_offset is None:
+            return None
+        return read_tiff_date_at(source, tiff_offset)
+    finally:
+        source.close()
+
+
+def read_tiff_date(header: bytes, file_path: str | Path | None = None, base: int = 0) -> str | None:
+    ''' DateTimeOriginal of TIFF based files (TIFF, NEF, DNG) or of an Exif blob at base '''
+    source = HeaderSource(file_path, header)
+    try:
+        return read_tiff_date_at(source, base)
+    finally:
+        source.close()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import os
+import sys
+
+DATE_FIELDS = ('year', 'month', 'day', 'hour', 'minute', 'second')
+
+# Date values repeat across files; ints above 256 aren't cached by CPython, so share them here
+_ints: dict[int, int] = {}
+
+
+def _date_int(value: str | int | None) -> int | None:
+    if value is None:
+        return None
+    value = int(value)
+    return _ints.setdefault(value, value)
+
+
+def _two_digits(value: int | None) -> str:
+    return '00' if value is None else f'{value:02d}'
+
+
+class FileRecord:
+    ''' A scanned source or destination file.
+
+    Slotted instead of a property dict per file: date fields are ints (None when unknown),
+    folder, extension and suffix strings are interned so they are shared between files,
+    and the full path is only built when asked for. mtime_ns is kept for source files, a
+    plan records it to detect files changed before the plan is run.
+    '''
+
+    __slots__ = ('folder', 'file', 'size', 'extension') + DATE_FIELDS + ('suffix', 'new_file_name', 'mtime_ns')
+
+    def __init__(self, folder: str | os.PathLike, file: str, size: int, extension: str | None = None,
+                 suffix: str | None = None, **date: str | int | None) -> None:
+        self.folder = sys.intern(str(folder))
+        self.file = file
+        self.size = size
+        if extension is None:
+            extension = os.path.splitext(file)[1][1:].lower()
+        self.extension = sys.intern(extension)
+        self.year = self.month = self.day = self.hour = self.minute = self.second = None
+        self.set_date(date)
+        self.suffix = sys.intern(suffix) if suffix is not None else None
+        self.new_file_name: str | None = None
+        self.mtime_ns: int | None = None
+
+    @classmethod
+    def from_match(cls, folder: str | os.PathLike, file: str, size: int, match: dict[str, str | None]
+                   ) -> FileRecord:
+        ''' Record of a destination file from its DESTINATION_REGEX groupdict, extension case kept '''
+        return cls(folder, file, size, match['extension'], match['suffix'],
+                   **{field: match[field] for field in DATE_FIELDS})
+
+    def set_date(self, date: dict[str, str | int | None]) -> None:
+        for field in DATE_FIELDS:
+            if field in date:
+                setattr(self, field, _date_int(date[field]))
+
+    @property
+    def fullpath(self) -> str:
+        return os.path.join(self.folder, self.file)
+
+    def date_name(self) -> str:
+        ''' YYYYMMDD_HHMMSS, unknown fields as 00 '''
+        return ''.join(_two_digits(getattr(self, field)) for field in DATE_FIELDS[:3]) + '_' + \
+            ''.join(_two_digits(getattr(self, field)) for field in DATE_FIELDS[3:])
+
+    def key(self) -> str:
+        ''' YYYYMMDD_HHMMSS.ext, the destination name without its suffix '''
+        return f'{self.date_name()}.{self.extension}'
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FileRecord):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{slot}={getattr(self, slot)!r}' for slot in self.__slots__
+                           if getattr(self, slot) is not None)
+        return f'FileRecord({fields})'
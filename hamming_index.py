@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import functools
+import itertools
+from collections import defaultdict
+from typing import Sequence
+
+try:
+    import numpy
+except ImportError:
+    # Candidates are scored one by one
+    numpy = None
+
+HASH_BITS = 64
+CHUNKS = 4
+# Range of chunks_for(): 32 bit fragments down to 8 bit ones
+MIN_CHUNKS = 2
+MAX_CHUNKS = 8
+# Above this radius per chunk, enumerating the neighbour keys of a chunk costs more than a scan
+MAX_CHUNK_RADIUS = 3
+# Fewer candidates are scored in Python, the NumPy call overhead is larger than the loop
+BATCH_MIN_CANDIDATES = 64
+# Cost of looking up one fragment key, relative to scoring one candidate
+LOOKUP_COST = 2
+# Fragments of at most this many keys get a table of bucket offsets, wider ones are binary searched
+DENSE_MAX_KEYS = 2 ** 20
+# With NumPy, scoring every hash of an index this small is faster than the lookups
+SCAN_MAX_SIZE = 50_000
+
+
+@functools.lru_cache(maxsize=None)
+def _flip_masks(bits: int, radius: int) -> tuple[int, ...]:
+    ''' Every mask of bits bits with at most radius bits set '''
+    return tuple(sum(1 << bit for bit in flipped)
+                 for r in range(radius + 1) for flipped in itertools.combinations(range(bits), r))
+
+
+@functools.lru_cache(maxsize=None)
+def _flip_array(bits: int, radius: int) -> numpy.ndarray:
+    return numpy.array(_flip_masks(bits, radius), dtype=numpy.intp)
+
+
+@functools.lru_cache(maxsize=None)
+def _byte_bit_counts() -> numpy.ndarray:
+    return numpy.array([i.bit_count() for i in range(256)], dtype=numpy.uint8)
+
+
+def _popcount(values: numpy.ndarray) -> numpy.ndarray:
+    if hasattr(numpy, 'bitwise_count'):
+        return numpy.bitwise_count(values)
+    # NumPy < 2.0: count the bits of every byte
+    return _byte_bit_counts()[values.view(numpy.uint8)].reshape(-1, 8).sum(axis=1, dtype=numpy.uint8)
+
+
+def distances(value: int, candidates: Sequence[int] | numpy.ndarray) -> list[int]:
+    ''' Hamming distances of value to each candidate, in one vectorised call when NumPy is installed '''
+    if numpy is None or len(candidates) < BATCH_MIN_CANDIDATES:
+        return [(value ^ int(candidate)).bit_count() for candidate in candidates]
+    array = candidates if isinstance(candidates, numpy.ndarray) else numpy.array(candidates, dtype=numpy.uint64)
+    return _popcount(array ^ numpy.uint64(value)).tolist()
+
+
+def chunks_for(size: int, max_distance: int) -> int:
+    ''' Number of fragments for size hashes with the fewest expected key lookups and candidates per query '''
+    def cost(chunks: int) -> float:
+        bits = HASH_BITS // chunks
+        radius = max_distance // chunks
+        if radius > MAX_CHUNK_RADIUS:
+            return float('inf')
+        keys = len(_flip_masks(bits, radius))
+        return chunks * keys * (LOOKUP_COST + size / 2 ** bits)
+
+    return min(range(MIN_CHUNKS, MAX_CHUNKS + 1), key=cost)
+
+
+class HammingIndex:
+    ''' Multi-index hashing of 64-bit hashes for "all hashes within distance d" queries.
+
+    Every hash is split into chunks fragments, each with its own table. Hashes within d of a
+    query differ in at most d // chunks bits of one of their fragments, so a query only looks up
+    the fragment keys within that radius and scores the hashes found there. chunks_for() picks
+    the number of fragments for a library size. Radii above MAX_CHUNK_RADIUS, and with NumPy
+    indexes of at most SCAN_MAX_SIZE hashes, fall back to scoring every hash.
+
+    The tables are built by the first query after add(), so add every hash before querying.
+    With NumPy they are the hash ids sorted by fragment, with bucket offsets or a binary search
+    to find the keys of a query, and all candidates are scored in one vectorised call.
+    '''
+
+    def __init__(self, chunks: int = CHUNKS) -> None:
+        self.chunks = chunks
+        # (shift, mask, width) of each fragment, the first ones get the remaining bits
+        widths = [HASH_BITS // chunks + (i < HASH_BITS % chunks) for i in range(chunks)]
+        self._fragments = [(sum(widths[:i]), (1 << width) - 1, width) for i, width in enumerate(widths)]
+        self.hashes: list[int] = []
+        self.scored: int = 0
+        self._built = 0
+        self._tables: list[defaultdict[int, list[int]]] = []
+        self._array: numpy.ndarray | None = None
+        self._sorted: list[tuple[numpy.ndarray | None, numpy.ndarray | None, numpy.ndarray]] = []
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add(self, value: int) -> int:
+        ''' Index value, returns its id: the position in hashes '''
+        self.hashes.append(value)
+        return len(self.hashes) - 1
+
+    def _scan(self, radius: int) -> bool:
+        return radius > MAX_CHUNK_RADIUS or (numpy is not None and len(self.hashes) <= SCAN_MAX_SIZE)
+
+    def _build(self) -> None:
+        if self._built == len(self.hashes):
+            return
+        if numpy is not None:
+            self._array = numpy.array(self.hashes, dtype=numpy.uint64)
+            self._sorted = []
+            if len(self.hashes) <= SCAN_MAX_SIZE:
+                # Only scanned
+                self._built = len(self.hashes)
+                return
+            for shift, mask, width in self._fragments:
+                fragments = (self._array >> numpy.uint64(shift) & numpy.uint64(mask)).astype(numpy.intp)
+                order = numpy.argsort(fragments, kind='stable')
+                if 2 ** width <= DENSE_MAX_KEYS:
+                    # Hashes with fragment key k are order[offsets[k]:offsets[k + 1]]
+                    offsets = numpy.zeros(2 ** width + 1, dtype=numpy.intp)
+                    numpy.cumsum(numpy.bincount(fragments, minlength=2 ** width), out=offsets[1:])
+                    self._sorted.append((offsets, None, order))
+                else:
+                    self._sorted.append((None, fragments[order], order))
+        else:
+            self._tables = [defaultdict(list) for _ in range(self.chunks)]
+            for hash_id, value in enumerate(self.hashes):
+                for table, (shift, mask, _) in zip(self._tables, self._fragments):
+                    table[value >> shift & mask].append(hash_id)
+        self._built = len(self.hashes)
+
+    def _candidate_array(self, value: int, radius: int) -> numpy.ndarray:
+        parts = []
+        for (offsets, fragments, order), (shift, mask, width) in zip(self._sorted, self._fragments):
+            keys = _flip_array(width, radius) ^ (value >> shift & mask)
+            if offsets is not None:
+                starts = offsets[keys]
+                lengths = offsets[keys + 1] - starts
+            else:
+                starts = numpy.searchsorted(fragments, keys, 'left')
+                lengths = numpy.searchsorted(fragments, keys, 'right') - starts
+            total = int(lengths.sum())
+            if total:
+                # Every position of the matching ranges: start of its range plus its offset in the range
+                ends = numpy.cumsum(lengths)
+                parts.append(order[numpy.repeat(starts - ends + lengths, lengths) + numpy.arange(total)])
+        # A hash can be found through several fragments, scoring it twice is cheaper than deduplicating
+        return numpy.concatenate(parts) if parts else numpy.empty(0, dtype=numpy.intp)
+
+    def _candidate_set(self, value: int, radius: int) -> set[int]:
+        found: set[int] = set()
+        for table, (shift, mask, width) in zip(self._tables, self._fragments):
+            fragment = value >> shift & mask
+            # Lookups of every key within radius, without a Python level loop
+            buckets = filter(None, map(table.get, map(fragment.__xor__, _flip_masks(width, radius))))
+            found.update(itertools.chain.from_iterable(buckets))
+        return found
+
+    def candidates(self, value: int, max_distance: int) -> list[int]:
+        ''' Ids of the hashes that may be within max_distance of value '''
+        radius = max_distance // self.chunks
+        if self._scan(radius):
+            return list(range(len(self.hashes)))
+        self._build()
+        if numpy is not None:
+            return sorted(set(self._candidate_array(value, radius).tolist()))
+        return sorted(self._candidate_set(value, radius))
+
+    def query(self, value: int, max_distance: int) -> list[tuple[int, int]]:
+        ''' (id, distance) of every indexed hash within max_distance of value, by id '''
+        self._build()
+        radius = max_distance // self.chunks
+        if numpy is not None:
+            if self._scan(radius):
+                ids = numpy.arange(len(self.hashes))
+                scores = _popcount(self._array ^ numpy.uint64(value))
+            else:
+                ids = self._candidate_array(value, radius)
+                scores = _popcount(self._array[ids] ^ numpy.uint64(value))
+            self.scored += len(ids)
+            within = scores <= max_distance
+            return sorted(dict(zip(ids[within].tolist(), scores[within].tolist())).items())
+        ids = range(len(self.hashes)) if self._scan(radius) else sorted(self._candidate_set(value, radius))
+        self.scored += len(ids)
+        return [(hash_id, distance) for hash_id, distance in zip(ids, distances(value, [self.hashes[i] for i in ids]))
+                if distance <= max_distance]
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+
+import profiling
+
+HASH_INDEX_NAME = 'hashes.txt'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str | Path, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+        profiling.count(profiling.BYTES_READ, f.tell())
+    return digest.hexdigest()
+
+
+def hash_file_edges(file_path: str | Path, size: int, edge_size: int) -> str:
+    ''' Hash of the first and last edge_size bytes, the whole file when it is not larger than both '''
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        if size <= 2 * edge_size:
+            digest.update(f.read())
+        else:
+            digest.update(f.read(edge_size))
+            f.seek(-edge_size, 2)
+            digest.update(f.read(edge_size))
+    profiling.count(profiling.BYTES_READ, min(size, 2 * edge_size))
+    return digest.hexdigest()
+
+
+class HashIndex:
+    ''' Content hash index of destination files keyed by (size, hash).
+
+    Persisted next to the DB as {name: {'size': int, 'mtime_ns': int, 'hash': str}}. Registered
+    files stay pending until a file of the same size has to be compared; then a stored hash is
+    only reused when the size and mtime of the file still match, so a file rewritten in place is
+    hashed again. Every destination file is read at most once across runs while unchanged.
+    '''
+
+    def __init__(self, folder: str | Path, index_name: str = HASH_INDEX_NAME) -> None:
+        self.index_path = Path(folder) / index_name
+        self.entries: dict[str, dict] = {}
+        self.hashed_files: int = 0
+        self._by_key: defaultdict[tuple[int, str], list[str]] = defaultdict(list)
+        self._pending: defaultdict[int, list[tuple[str, str | None]]] = defaultdict(list)
+        self._unnamed: dict[str, str] = {}
+        self._present: set[str] = set()
+        self._changed = False
+
+    def load(self) -> None:
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r') as f:
+                self.entries = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            self.entries = {}
+
+    def save(self, prune: bool = True) -> None:
+        ''' Persist the index. prune drops the names that were not registered in this run, i.e. that
+        are no longer in the destination; only pass it after a scan of the whole destination.
+        '''
+        if prune and self.entries.keys() - self._present:
+            self.entries = {name: entry for name, entry in self.entries.items() if name in self._present}
+            self._changed = True
+        if not self._changed:
+            return
+        with open(self.index_path, 'w') as f:
+            json.dump(self.entries, f)
+        self._changed = False
+
+    def register(self, file_path: str, size: int, name: str | None = None) -> None:
+        ''' Register a file whose hash is not checked yet.
+
+        Named files are destination files, their stored hash is reused when they are compared
+        and still have the stored size and mtime. Unnamed files (not yet in the destination) are
+        only kept in memory.
+        '''
+        if name:
+            self._present.add(name)
+        self._pending[size].append((file_path, name))
+
+    def add(self, file_path: str, size: int, digest: str) -> None:
+        ''' Add an unnamed file with a known hash '''
+        self._by_key[(size, digest)].append(file_path)
+        self._unnamed[file_path] = digest
+
+    def record(self, name: str, file_path: str, size: int, digest: str) -> None:
+        ''' Store the hash of the destination file name at file_path, with its current mtime '''
+        try:
+            mtime_ns = os.stat(file_path).st_mtime_ns
+            profiling.count(profiling.STAT_CALLS)
+        except OSError:
+            # Hashed again next time
+            mtime_ns = None
+        self.entries[name] = {'size': size, 'mtime_ns': mtime_ns, 'hash': digest}
+        self._present.add(name)
+        self._changed = True
+
+    def _digest(self, file_path: str, size: int, name: str | None) -> str:
+        if name:
+            entry = self.entries.get(name)
+            stat = os.stat(file_path)
+            profiling.count(profiling.STAT_CALLS)
+            if (entry and entry.get('size') == stat.st_size == size
+                    and entry.get('mtime_ns') == stat.st_mtime_ns):
+                return entry['hash']
+        digest = hash_file(file_path)
+        self.hashed_files += 1
+        if name:
+            self.entries[name] = {'size': size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest}
+            self._changed = True
+        return digest
+
+    def find(self, size: int, digest: str) -> list[str]:
+        ''' Files with the given size and hash, checking the pending files of that size first '''
+        pending = self._pending.pop(size, None)
+        if pending:
+            for file_path, name in pending:
+                try:
+                    file_digest = self._digest(file_path, size, name)
+                except OSError:
+                    continue
+                if name:
+                    self._by_key[(size, file_digest)].append(file_path)
+                else:
+                    self.add(file_path, size, file_digest)
+        return self._by_key.get((size, digest), [])
+
+    def move(self, file_path: str, new_path: str, size: int, name: str) -> None:
+        ''' A registered unnamed file was moved into the destination as name '''
+        digest = self._unnamed.pop(file_path, None)
+        if digest:
+            paths = self._by_key[(size, digest)]
+            paths[paths.index(file_path)] = new_path
+            self.record(name, new_path, size, digest)
+            return
+        pending = self._pending.get(size, [])
+        for i, (path, _) in enumerate(pending):
+            if path == file_path:
+                pending[i] = (new_path, name)
+                self._present.add(name)
+                return
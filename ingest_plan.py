@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+import profiling
+
+PLAN_VERSION = 1
+# Plan being run and its progress, kept in the destination folder until the run completes
+CHECKPOINT_PLAN_NAME = 'ingest.plan.json'
+CHECKPOINT_PROGRESS_NAME = 'ingest.progress'
+
+
+def file_entry(source: str, size: int, mtime_ns: int, **fields) -> dict:
+    ''' Plan entry of a source file with the size and mtime of the scan, used to detect later changes '''
+    return {'source': source, 'size': size, 'mtime_ns': mtime_ns, **fields}
+
+
+def make_plan(src: str | Path, dst: str | Path, files: list[dict], rejected: list[dict]) -> dict:
+    ''' Decisions of a planning run.
+
+    files: {'source', 'size', 'mtime_ns', 'source_name', 'target', 'new_name'} of each file to move,
+    rejected: {'source', 'size', 'mtime_ns', 'reason'} of each file that failed comparison.
+    '''
+    return {'version': PLAN_VERSION, 'src': str(src), 'dst': str(dst), 'files': files, 'rejected': rejected}
+
+
+def write_plan(plan_path: str | Path, plan: dict) -> None:
+    _write_json(Path(plan_path), plan, indent=4)
+
+
+def load_plan(plan_path: str | Path) -> dict:
+    with open(plan_path, 'r') as f:
+        plan = json.load(f)
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError(f'Unsupported plan version {plan.get("version")} in {plan_path}, expected {PLAN_VERSION}')
+    return plan
+
+
+def stale_reason(entry: dict) -> str | None:
+    ''' Why a planned source file can't be applied any more, None when it is unchanged '''
+    profiling.count(profiling.STAT_CALLS)
+    try:
+        stat = os.stat(entry['source'])
+    except OSError as e:
+        return f'Stale. {e.__class__.__name__} {e}'
+    if stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime_ns']:
+        return 'Stale. Changed since the plan was made'
+    return None
+
+
+def was_moved(entry: dict) -> bool:
+    ''' The source of a planned move is gone and its target holds a file of the planned size '''
+    if os.path.lexists(entry['source']):
+        return False
+    try:
+        return os.stat(entry['target']).st_size == entry['size']
+    except OSError:
+        return False
+
+
+def has_checkpoint(folder: str | Path) -> bool:
+    return (Path(folder) / CHECKPOINT_PLAN_NAME).exists()
+
+
+def write_checkpoint(folder: str | Path, plan: dict) -> None:
+    ''' Keep the plan in folder before running it '''
+    _write_json(Path(folder) / CHECKPOINT_PLAN_NAME, plan)
+    write_progress(folder, 0)
+
+
+def load_checkpoint(folder: str | Path) -> tuple[dict, int]:
+    ''' (plan, number of file entries done) of an interrupted run '''
+    return load_plan(Path(folder) / CHECKPOINT_PLAN_NAME), read_progress(folder)
+
+
+def write_progress(folder: str | Path, done: int) -> None:
+    _write_json(Path(folder) / CHECKPOINT_PROGRESS_NAME, {'done': done})
+
+
+def read_progress(folder: str | Path) -> int:
+    try:
+        with open(Path(folder) / CHECKPOINT_PROGRESS_NAME, 'r') as f:
+            return json.load(f)['done']
+    except (OSError, json.JSONDecodeError, KeyError, TypeError):
+        # Entries are checked again from the start, moved ones are recognized
+        return 0
+
+
+def remove_checkpoint(folder: str | Path) -> None:
+    (Path(folder) / CHECKPOINT_PROGRESS_NAME).unlink(missing_ok=True)
+    (Path(folder) / CHECKPOINT_PLAN_NAME).unlink(missing_ok=True)
+
+
+def _write_json(path: Path, data: dict, indent: int | None = None) -> None:
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
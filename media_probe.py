@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import BinaryIO
+
+import profiling
+
+# One file system block, what the first read of Pillow costs too; reads past it go through HeaderSource
+PROBE_SIZE = 4 * 1024
+
+JPEG = 'jpeg'
+PNG = 'png'
+GIF = 'gif'
+TIFF = 'tiff'
+BMP = 'bmp'
+WEBP = 'webp'
+ISO_BMFF = 'iso_bmff'
+HEIF = 'heif'
+RIFF_AVI = 'avi'
+MATROSKA = 'matroska'
+ASF = 'asf'
+FLV = 'flv'
+MPEG_PS = 'mpeg_ps'
+MPEG_TS = 'mpeg_ts'
+
+IMAGE_TYPES = frozenset({JPEG, PNG, GIF, TIFF, BMP, WEBP, HEIF})
+VIDEO_TYPES = frozenset({ISO_BMFF, RIFF_AVI, MATROSKA, ASF, FLV, MPEG_PS, MPEG_TS})
+
+_ASF_GUID = bytes.fromhex('3026b2758e66cf11a6d900aa0062ce6c')
+_MPEG_TS_PACKET = 188
+# ftyp major brands of HEIF still images (HEIC, AVIF and generic MIAF/HEIF)
+_HEIF_BRANDS = frozenset({b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1', b'avif', b'avis'})
+# Top level boxes QuickTime files written before ftyp existed start with
+_QUICKTIME_BOXES = frozenset({b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot'})
+
+
+class ProbeError(ValueError):
+    ''' The file structure can't be parsed from its header '''
+
+
+class HeaderSource:
+    ''' Random access to a file that serves reads from the probe buffer when it covers them.
+
+    The file itself is only opened when a read falls outside the buffer.
+    '''
+
+    def __init__(self, file_path: str | Path | None, header: bytes) -> None:
+        self.file_path = file_path
+        self.header = header
+        self.bytes_read = 0
+        self._f: BinaryIO | None = None
+
+    def read(self, offset: int, length: int) -> bytes:
+        if offset + length <= len(self.header):
+            return self.header[offset:offset + length]
+        if self.file_path is None:
+            raise ProbeError(f'Read of {length} bytes at {offset} is beyond the header buffer')
+        if self._f is None:
+            self._f = open(self.file_path, 'rb')
+        self._f.seek(offset)
+        data = self._f.read(length)
+        self.bytes_read += len(data)
+        profiling.count(profiling.BYTES_READ, len(data))
+        if len(data) != length:
+            raise ProbeError(f'Unexpected end of file reading {length} bytes at {offset}')
+        return data
+
+    def size(self) -> int:
+        if self.file_path is None:
+            return len(self.header)
+        return Path(self.file_path).stat().st_size
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def read_header(file_path: str | Path, size: int = PROBE_SIZE) -> bytes:
+    with open(file_path, 'rb') as f:
+        header = f.read(size)
+    profiling.count(profiling.BYTES_READ, len(header))
+    return header
+
+
+def detect_type(header: bytes) -> str | None:
+    ''' Media type from the leading magic bytes, None when unknown '''
+    if header.startswith(b'\xff\xd8\xff'):
+        return JPEG
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return PNG
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return GIF
+    if header[:4] in (b'II*\x00', b'MM\x00*'):
+        return TIFF
+    if header[4:8] == b'ftyp':
+        return HEIF if header[8:12] in _HEIF_BRANDS else ISO_BMFF
+    if header[4:8] in _QUICKTIME_BOXES:
+        return ISO_BMFF
+    if header[:4] == b'RIFF':
+        if header[8:12] == b'WEBP':
+            return WEBP
+        if header[8:12] == b'AVI ':
+            return RIFF_AVI
+    if header.startswith(b'\x1a\x45\xdf\xa3'):
+        return MATROSKA
+    if header.startswith(_ASF_GUID):
+        return ASF
+    if header.startswith(b'FLV\x01'):
+        return FLV
+    if header.startswith(b'\x00\x00\x01\xba'):
+        return MPEG_PS
+    if header[:1] == b'\x47' and header[_MPEG_TS_PACKET:_MPEG_TS_PACKET + 1] == b'\x47':
+        return MPEG_TS
+    if header.startswith(b'BM') and len(header) >= 26 and header[14] in (12, 40, 52, 56, 64, 108, 124):
+        return BMP
+    return None
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+import bmff
+import exif_reader
+import media_probe
+import profiling
+import regex_patterns
+
+DATE_TIME_ORIGINAL_KEY = 36867
+
+DATE_FROM_EXIF = 'exif'
+DATE_FROM_CONTAINER = 'container'
+DATE_FROM_MIN = 'min_date'
+UNSUPPORTED_DATE = 'unsupported_date'
+UNSUPPORTED = 'unsupported'
+
+
+def is_image(file_path: str) -> bool:
+    profiling.count(profiling.PILLOW_OPENS)
+    try:
+        with Image.open(file_path) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+
+
+def retrieve_min_date(file_name: str, full_path: str, min_time: float | None = None) -> dict[str, str]:
+    ''' Earliest of the file times and the date in the file name. min_time saves the stat when already known '''
+    if min_time is None:
+        stat = Path(full_path).stat()
+        profiling.count(profiling.STAT_CALLS)
+        min_time = min(stat.st_atime, stat.st_mtime, stat.st_ctime)
+    min_date = min_time
+    dt = datetime.fromtimestamp(min_date)
+    match = regex_patterns.match_acceptable(file_name)
+    if match:
+        group_dict = {key: int(value if value else '0') for key, value in match.groupdict().items()
+                      if key in ['year', 'month', 'day', 'hour', 'minute', 'second']}
+        dt_from_name = datetime(group_dict['year'], group_dict['month'], group_dict['day'], group_dict['hour'],
+                                group_dict['minute'], group_dict['second'])
+        dt = min(dt, dt_from_name)
+
+    return _date_props(dt)
+
+
+def _date_props(dt: datetime) -> dict[str, str]:
+    return {
+        'year': str(dt.year), 'month': f'{dt.month:02d}',
+        'day': f'{dt.day:02d}', 'hour': f'{dt.hour:02d}',
+        'minute': f'{dt.minute:02d}', 'second': f'{dt.second:02d}'
+        }
+
+
+def _read_photo_date(file_name: str, full_path: str, header: bytes, file_type: str | None,
+                     messages: list[tuple[int, str]]) -> str | None:
+    # Header-only readers for JPEG, PNG, TIFF based RAW and HEIF files, Pillow for anything they can't parse
+    try:
+        if file_type == media_probe.JPEG:
+            return exif_reader.read_jpeg_date(header, full_path)
+        if file_type == media_probe.PNG:
+            # Pillow decodes the whole image to look for an eXIf chunk after the image data
+            return exif_reader.read_png_date(header, full_path)
+        if file_type == media_probe.TIFF:
+            return exif_reader.read_tiff_date(header, full_path)
+        if file_type == media_probe.HEIF:
+            return bmff.read_heif_exif_date(header, full_path)
+    except (media_probe.ProbeError, OSError):
+        pass
+
+    date_taken = None
+    img = None
+    try:
+        # JPEG keeps EXIF in the leading APP1 segment, small ones fit in the probe buffer
+        if file_type == media_probe.JPEG:
+            profiling.count(profiling.PILLOW_OPENS)
+            try:
+                img = Image.open(BytesIO(header))
+            except Exception:
+                img = None
+        if img is None:
+            profiling.count(profiling.PILLOW_OPENS)
+            img = Image.open(full_path)
+    except OSError as e:
+        messages.append((logging.WARNING, f'Failed to open image {full_path}: {e}'))
+    if img:
+        try:
+            if hasattr(img, '_getexif'):
+                _getexif = img._getexif()
+                if _getexif and DATE_TIME_ORIGINAL_KEY in _getexif:
+                    date_taken = _getexif[DATE_TIME_ORIGINAL_KEY]
+            if not date_taken and hasattr(img, 'tag'):
+                messages.append((logging.INFO, f'tag exists {file_name}'))
+                date_taken = img.tag._tagdata[DATE_TIME_ORIGINAL_KEY]
+        except Exception as e:
+            messages.append((logging.WARNING, f'Failed to read EXIF data from {full_path}: {e}'))
+        finally:
+            img.close()
+    return date_taken
+
+
+def extract_metadata(file_name: str, full_path: str, min_time: float | None = None
+                     ) -> tuple[dict[str, str] | None, str, list[tuple[int, str]]]:
+    ''' Detect the media type of a file and extract its date.
+
+    The file is opened once for a header probe; its magic bytes decide the type and
+    Pillow is only used for photos or for files whose type the probe doesn't know.
+    Runs without touching handler state so it can be executed in a worker process.
+    Returns (date properties, status, log messages); status is one of DATE_FROM_EXIF,
+    DATE_FROM_CONTAINER (MP4/MOV mvhd creation time), DATE_FROM_MIN,
+    UNSUPPORTED_DATE (photo whose EXIF date can't be parsed) or UNSUPPORTED.
+    min_time is the earliest file time from the directory scan, used for DATE_FROM_MIN.
+    '''
+    messages: list[tuple[int, str]] = []
+    extension = Path(full_path).suffix.lstrip('.').lower()
+    try:
+        header = media_probe.read_header(full_path)
+    except OSError as e:
+        messages.append((logging.WARNING, f'Failed to read {full_path}: {e}'))
+        return None, UNSUPPORTED, messages
+    file_type = media_probe.detect_type(header)
+    is_photo = file_type in media_probe.IMAGE_TYPES
+    if file_type is None and extension not in regex_patterns.VIDEO_EXTENSION_SET:
+        # Unknown magic, let Pillow decide as it knows many more image formats
+        is_photo = is_image(full_path)
+
+    # Photo file
+    if is_photo:
+        date_taken = _read_photo_date(file_name, full_path, header, file_type, messages)
+        if date_taken:
+            match = regex_patterns.DATE_TAKEN_PATTERN.match(date_taken)
+            if match:
+                return match.groupdict(), DATE_FROM_EXIF, messages
+            messages.append((logging.INFO, f'date_taken case {date_taken} full_path: {full_path}'))
+            return None, UNSUPPORTED_DATE, messages
+        return retrieve_min_date(file_name, full_path, min_time), DATE_FROM_MIN, messages
+    if extension in regex_patterns.VIDEO_EXTENSION_SET:
+        if file_type == media_probe.ISO_BMFF:
+            try:
+                creation_time = bmff.read_video_creation_time(header, full_path)
+            except (media_probe.ProbeError, OSError) as e:
+                messages.append((logging.WARNING, f'Failed to read creation time from {full_path}: {e}'))
+                creation_time = None
+            if creation_time:
+                return _date_props(datetime.fromtimestamp(creation_time)), DATE_FROM_CONTAINER, messages
+        return retrieve_min_date(file_name, full_path, min_time), DATE_FROM_MIN, messages
+    return None, UNSUPPORTED, messages
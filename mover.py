@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+from pathlib import Path
+
+import profiling
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class Mover:
+    ''' Moves files into destination folders without overwriting existing files.
+
+    Target folders are created once per run and their device is remembered, so a
+    file on the same device is renamed in place and only files from another device
+    (USB card to NAS) are copied. Copies are written to a target opened with O_EXCL.
+    Safe to call from several threads as long as they move to distinct targets.
+    '''
+
+    def __init__(self) -> None:
+        self._target_devices: dict[str, int] = {}
+        self._source_devices: dict[str, int] = {}
+
+    def move(self, source: str, target: str | Path) -> bool:
+        ''' Move source to target, True when it was renamed in place rather than copied.
+
+        Raises FileExistsError when target exists.
+        '''
+        target = str(target)
+        target_folder, _ = os.path.split(target)
+        source_folder, _ = os.path.split(source)
+        if self._device(source_folder, self._source_devices) == self._target_device(target_folder):
+            if os.path.lexists(target):
+                raise FileExistsError(errno.EEXIST, 'Target exists', target)
+            try:
+                os.rename(source, target)
+                return True
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # Bind mount or mount point below the destination folder: copy
+        self._copy(source, target)
+        return False
+
+    def _target_device(self, folder: str) -> int:
+        device = self._target_devices.get(folder)
+        if device is None:
+            os.makedirs(folder, exist_ok=True)
+            device = self._device(folder, self._target_devices)
+        return device
+
+    @staticmethod
+    def _device(folder: str, devices: dict[str, int]) -> int:
+        device = devices.get(folder)
+        if device is None:
+            device = devices[folder] = os.stat(folder).st_dev
+            profiling.count(profiling.STAT_CALLS)
+        return device
+
+    @staticmethod
+    def _copy(source: str, target: str) -> None:
+        with open(source, 'rb') as fsrc:
+            with open(target, 'xb') as fdst:
+                try:
+                    shutil.copyfileobj(fsrc, fdst, COPY_CHUNK_SIZE)
+                    profiling.count(profiling.BYTES_READ, fsrc.tell())
+                except BaseException:
+                    fdst.close()
+                    os.unlink(target)
+                    raise
+        try:
+            shutil.copystat(source, target)
+        except OSError:
+            # File systems like FAT don't keep every attribute, the content is what matters
+            pass
+        os.unlink(source)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import re
+
+import regex_patterns
+
+ACCEPTED = 'accepted'
+IGNORED = 'ignored'
+UNMATCHED = 'unmatched'
+
+
+def _combine(regexs: list[str]) -> list[re.Pattern]:
+    ''' One alternation of the patterns when that matches the same names, else each pattern compiled '''
+    patterns = [re.compile(regex) for regex in regexs]
+    if len(patterns) > 1 and not any(pattern.groups or pattern.flags & ~re.UNICODE for pattern in patterns):
+        # Without groups nothing can refer to a group number, without inline flags nothing applies to the others
+        try:
+            return [re.compile('|'.join(f'(?:{regex})' for regex in regexs))]
+        except re.error:
+            pass
+    return patterns
+
+
+class NameClassifier:
+    ''' Ignore and accept decision for a source file name in one call.
+
+    Every pattern is compiled once. Ignore patterns, and accept patterns other than the presets
+    of regex_patterns.ACCEPTABLE_REGEXS, are joined into one alternation when possible. The presets
+    only run on names whose lower case extension is in regex_patterns.EXTENSION_SET.
+    '''
+
+    def __init__(self, ignore_regexs: list[str] | None = None, accept_regexs: list[str] | None = None) -> None:
+        ignore_regexs = ignore_regexs or []
+        accept_regexs = accept_regexs or []
+        self.ignore = _combine(ignore_regexs)
+        self.presets = [regex_patterns.ACCEPTABLE_PATTERNS[regex_patterns.ACCEPTABLE_REGEXS.index(regex)]
+                        for regex in dict.fromkeys(accept_regexs) if regex in regex_patterns.ACCEPTABLE_REGEXS]
+        self.accept = _combine([regex for regex in accept_regexs if regex not in regex_patterns.ACCEPTABLE_REGEXS])
+        self.accept_all = not accept_regexs
+
+    def __len__(self) -> int:
+        ''' Number of compiled accept patterns '''
+        return len(self.presets) + len(self.accept)
+
+    def classify(self, name: str) -> str:
+        ''' IGNORED, UNMATCHED (no accept pattern matches) or ACCEPTED '''
+        for pattern in self.ignore:
+            if pattern.match(name):
+                return IGNORED
+        if self.accept_all:
+            return ACCEPTED
+        for pattern in self.accept:
+            if pattern.match(name):
+                return ACCEPTED
+        if self.presets and regex_patterns.has_media_extension(name):
+            for pattern in self.presets:
+                if pattern.match(name):
+                    return ACCEPTED
+        return UNMATCHED
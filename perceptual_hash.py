@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import statistics
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable
+
+from PIL import ExifTags, Image
+
+import profiling
+from hamming_index import HammingIndex, chunks_for
+
+PERCEPTUAL_HASH_INDEX_NAME = 'phashes.txt'
+# Largest pHash and dHash distance (out of 64 bits) of two files still grouped as near duplicates
+NEAR_DUPLICATE_DISTANCE = 10
+PHASH_SIZE = 32
+HASH_BITS = 8
+# An EXIF thumbnail with another aspect ratio is letterboxed, it doesn't hash like the image
+THUMBNAIL_ASPECT_TOLERANCE = 0.05
+
+_JPEG_INTERCHANGE_FORMAT_TAG = 0x0201
+_JPEG_INTERCHANGE_FORMAT_LENGTH_TAG = 0x0202
+_ORIENTATION_TAG = 0x0112
+_EXIF_SIGNATURE = b'Exif\x00\x00'
+_TRANSPOSE = {
+    2: [Image.Transpose.FLIP_LEFT_RIGHT], 3: [Image.Transpose.ROTATE_180], 4: [Image.Transpose.FLIP_TOP_BOTTOM],
+    5: [Image.Transpose.TRANSPOSE], 6: [Image.Transpose.ROTATE_270], 7: [Image.Transpose.TRANSVERSE],
+    8: [Image.Transpose.ROTATE_90],
+}
+# DCT-II basis of the HASH_BITS lowest frequencies over PHASH_SIZE samples
+_DCT = [[math.cos(math.pi * k * (2 * n + 1) / (2 * PHASH_SIZE)) for n in range(PHASH_SIZE)]
+        for k in range(HASH_BITS)]
+
+
+def dhash(image: Image.Image) -> int:
+    ''' Difference hash: whether each pixel is brighter than its right neighbour on a 9x8 grayscale image '''
+    pixels = image.convert('L').resize((HASH_BITS + 1, HASH_BITS), Image.Resampling.BILINEAR).tobytes()
+    value = 0
+    for row in range(HASH_BITS):
+        for col in range(HASH_BITS):
+            left = pixels[row * (HASH_BITS + 1) + col]
+            value = value << 1 | (left > pixels[row * (HASH_BITS + 1) + col + 1])
+    return value
+
+
+def phash(image: Image.Image) -> int:
+    ''' DCT hash: whether each of the 8x8 lowest frequencies of a 32x32 grayscale image is above their median '''
+    pixels = image.convert('L').resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.BILINEAR).tobytes()
+    rows = [pixels[i:i + PHASH_SIZE] for i in range(0, PHASH_SIZE * PHASH_SIZE, PHASH_SIZE)]
+    # Separable 2D DCT, only the low frequencies are computed
+    row_freqs = [[sum(b * p for b, p in zip(basis, row)) for basis in _DCT] for row in rows]
+    coefficients = [sum(basis[n] * row_freqs[n][u] for n in range(PHASH_SIZE))
+                    for basis in _DCT for u in range(HASH_BITS)]
+    # The DC term is the mean brightness, it would skew the median
+    median = statistics.median(coefficients[1:])
+    value = 0
+    for coefficient in coefficients:
+        value = value << 1 | (coefficient > median)
+    return value
+
+
+def hamming(hash1: int, hash2: int) -> int:
+    return (hash1 ^ hash2).bit_count()
+
+
+def _exif_thumbnail(img: Image.Image) -> Image.Image | None:
+    ''' The JPEG thumbnail of the EXIF block when it has the aspect ratio of the image.
+
+    None also when the thumbnail can't be decoded, the image is then hashed from its own pixels.
+    '''
+    exif_data = img.info.get('exif')
+    if not exif_data or not exif_data.startswith(_EXIF_SIGNATURE):
+        return None
+    try:
+        ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+        offset = ifd1.get(_JPEG_INTERCHANGE_FORMAT_TAG)
+        length = ifd1.get(_JPEG_INTERCHANGE_FORMAT_LENGTH_TAG)
+        if not offset or not length:
+            return None
+        # Offsets count from the TIFF header that follows the signature
+        start = len(_EXIF_SIGNATURE) + offset
+        thumbnail = Image.open(BytesIO(exif_data[start:start + length]))
+        profiling.count(profiling.PILLOW_OPENS)
+        # A truncated thumbnail only fails when decoded, it is small enough to decode here
+        thumbnail.load()
+        width, height = img.size
+        thumb_width, thumb_height = thumbnail.size
+        if not thumb_height or abs(thumb_width / thumb_height - width / height) > \
+                THUMBNAIL_ASPECT_TOLERANCE * width / height:
+            return None
+    except (OSError, ValueError, SyntaxError, ZeroDivisionError):
+        return None
+    return thumbnail
+
+
+def hash_image(file_path: str | Path) -> tuple[int, int]:
+    ''' (dHash, pHash) of an image file, upright according to its EXIF orientation.
+
+    Hashed from the EXIF thumbnail when there is one, otherwise from a reduced JPEG decode
+    (Image.draft), so full resolution pixels are only decoded for other formats.
+    '''
+    profiling.count(profiling.PILLOW_OPENS)
+    with Image.open(file_path) as img:
+        small = _exif_thumbnail(img)
+        if small is None:
+            img.draft('L', (PHASH_SIZE, PHASH_SIZE))
+            small = img.convert('L')
+        else:
+            small = small.convert('L')
+        for method in _TRANSPOSE.get(img.getexif().get(_ORIENTATION_TAG), []):
+            small = small.transpose(method)
+    return dhash(small), phash(small)
+
+
+class PerceptualHashCache:
+    ''' Perceptual hashes of the image files of a folder tree.
+
+    Persisted in the folder as {relative path: {'size': int, 'mtime_ns': int, 'dhash': hex, 'phash': hex}};
+    a file is hashed again when its size or mtime changed. Files Pillow can't read are stored
+    with null hashes so they are not opened again either.
+    '''
+
+    def __init__(self, folder: str | Path, index_name: str = PERCEPTUAL_HASH_INDEX_NAME) -> None:
+        self.folder = Path(folder)
+        self.index_path = self.folder / index_name
+        self.entries: dict[str, dict] = {}
+        self.hashed_files: int = 0
+        self.cached_files: int = 0
+        self._seen: dict[str, dict] = {}
+        self._changed = False
+
+    def load(self) -> None:
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r') as f:
+                self.entries = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            self.entries = {}
+
+    def save(self) -> None:
+        ''' Persist the files looked up in this run, dropping the ones that were not '''
+        if not self._changed and self._seen.keys() == self.entries.keys():
+            return
+        with open(self.index_path, 'w') as f:
+            json.dump(self._seen, f)
+        self.entries = self._seen
+        self._changed = False
+
+    def get(self, file_path: str | Path, stat: os.stat_result | None = None) -> tuple[int, int] | None:
+        ''' (dHash, pHash) of file_path, None when it is not a readable image. stat saves the stat when known '''
+        if stat is None:
+            stat = os.stat(file_path)
+            profiling.count(profiling.STAT_CALLS)
+        key = os.path.relpath(file_path, self.folder)
+        entry = self.entries.get(key)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            self.cached_files += 1
+        else:
+            try:
+                hashes = hash_image(file_path)
+                entry_hashes = {'dhash': f'{hashes[0]:016x}', 'phash': f'{hashes[1]:016x}'}
+            except (OSError, ValueError, SyntaxError, Image.DecompressionBombError):
+                entry_hashes = {'dhash': None, 'phash': None}
+            self.hashed_files += 1
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, **entry_hashes}
+            self._changed = True
+        self._seen[key] = entry
+        if entry['dhash'] is None:
+            return None
+        return int(entry['dhash'], 16), int(entry['phash'], 16)
+
+
+def group_near_duplicates(hashes: dict[str, tuple[int, int]], max_distance: int = NEAR_DUPLICATE_DISTANCE,
+                          groups: list[list[str]] | None = None,
+                          key: Callable[[str], Any] | None = None) -> list[list[str]]:
+    ''' Groups of files whose dHash and pHash are both within max_distance of the first file of the group.
+
+    Files are taken in key order (the path by default), each one not grouped yet is kept and
+    groups the files within max_distance of it that are not grouped yet either. Files similar
+    to a member but not to the kept file are never grouped through it, so the groups can be
+    deleted down to their first file. The rest of a group is sorted by key.
+
+    groups are merged in, so exact duplicates of files that are not images stay grouped.
+    Candidates are looked up by pHash in a HammingIndex, then checked on their dHash.
+    '''
+    if key is None:
+        key = str
+    # An exact group is clustered as its first hashed file, identical files have identical hashes
+    copies: dict[str, list[str]] = {}
+    merged: list[list[str]] = []
+    for group in groups or []:
+        hashed = [path for path in group if path in hashes]
+        if hashed:
+            copies[hashed[0]] = [path for path in group if path != hashed[0]]
+        else:
+            merged.append(sorted(group, key=key))
+    grouped_copies = {path for group in copies.values() for path in group}
+    units = [path for path in hashes if path not in grouped_copies]
+    # Each unit ranks as its preferred copy
+    units.sort(key=lambda path: min(map(key, [path, *copies.get(path, [])])))
+    index = HammingIndex(chunks_for(len(units), max_distance))
+    for path in units:
+        index.add(hashes[path][1])
+
+    grouped = [False] * len(units)
+    for i, path in enumerate(units):
+        if grouped[i]:
+            continue
+        grouped[i] = True
+        dhash1, phash1 = hashes[path]
+        similar = []
+        for j, _ in index.query(phash1, max_distance):
+            if not grouped[j] and hamming(dhash1, hashes[units[j]][0]) <= max_distance:
+                grouped[j] = True
+                similar += [units[j], *copies.get(units[j], [])]
+        kept = sorted([path, *copies.get(path, [])], key=key)
+        if len(kept) + len(similar) > 1:
+            merged.append(kept + sorted(similar, key=key))
+    return merged
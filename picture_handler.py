@@ -2,22 +2,68 @@
 
 from __future__ import annotations
 
+import os
 import re
-import filecmp
+import sys
+import time
 from pathlib import Path
 from argparse import ArgumentParser, Namespace
 from collections import defaultdict
-from shutil import move
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator
 import json
-from PIL import Image
-from datetime import datetime
 from logger import logger
 import logging
 import regex_patterns
 import comparing
 import utils
+import catalog
+import hash_index
+import metadata
+import dir_snapshot
+import walker
+import ingest_plan
+import perceptual_hash
+import profiling
+import run_metrics
+from name_classifier import IGNORED, UNMATCHED, NameClassifier
+from suffix_allocator import SuffixAllocator
+from file_record import FileRecord
+from mover import Mover
+from async_scan import AsyncScanner, DEFAULT_IN_FLIGHT
 
-DATE_TIME_ORIGINAL_KEY = 36867
+METADATA_BATCH_SIZE = 256
+CHECKPOINT_INTERVAL = 256
+# Year (YYYY) and month (MM) folders of the destination
+DATE_DIR_REGEX = re.compile(r'^\d{2,4}$')
+YEAR_DIR_REGEX = re.compile(r'^\d{4}$')
+
+
+class CatalogOutOfSync(Exception):
+    ''' The DB doesn't match the destination folder in --trust-db mode '''
+
+
+class InterruptedRunPending(Exception):
+    ''' The checkpoint of an interrupted run is still in the destination folder '''
+
+
+class LoggedCount:
+    ''' --stream stand-in of a per source file list: appended items are handed to log and only counted '''
+
+    def __init__(self, log: Callable[[object], None]) -> None:
+        self._log = log
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator:
+        return iter(())
+
+    def append(self, item: object) -> None:
+        self._count += 1
+        self._log(item)
 
 
 def main() -> None:
@@ -26,14 +72,59 @@ def main() -> None:
 
     logging.getLogger("PIL.TiffImagePlugin").setLevel(logging.INFO)
 
+    if not args.profile and not args.profile_dump:
+        run(parser, args)
+        return
+    profiling.start(args.profile_dump)
+    try:
+        run(parser, args)
+    finally:
+        profiler = profiling.stop()
+        profiler.report(logger.info)
+        for path in profiler.dump():
+            logger.info(f'cProfile dump written to {path}')
+
+
+def run(parser: ArgumentParser, args: Namespace) -> None:
     logger.info('Handling started')
+    if args.apply or args.resume:
+        if args.apply:
+            plan, done = ingest_plan.load_plan(args.apply), 0
+        elif not args.dst:
+            parser.error('--resume needs the destination folder (--dst) of the interrupted run')
+        elif not ingest_plan.has_checkpoint(args.dst):
+            parser.error(f'Nothing to resume: no interrupted run in {args.dst}')
+        else:
+            plan, done = ingest_plan.load_checkpoint(args.dst)
+        handler = PicturesHandler(plan['src'], plan['dst'], dry_run=args.dry_run, move_workers=args.move_workers,
+                                  checkpoint_every=args.checkpoint_every)
+        try:
+            with _metrics_file(handler, args.metrics_file):
+                handler.apply_plan(plan, done, resume=args.resume)
+        except InterruptedRunPending as e:
+            parser.error(str(e))
+        handler.output()
+        logger.info('Handling finished\n')
+        return
+
     handler = PicturesHandler(args.src, args.dst, comparers=args.compare, ignore_regexs=args.ignore,
                               dry_run=args.dry_run, recursive=args.recursive, accept_regexs=args.accept,
-                              by_month=args.by_month)
+                              by_month=args.by_month, workers=args.workers, full_scan=args.full_scan,
+                              trust_db=args.trust_db, stream=args.stream, move_workers=args.move_workers,
+                              async_scan=args.async_scan, in_flight=args.in_flight,
+                              plan_out=args.plan_out, checkpoint_every=args.checkpoint_every)
     if args.convert_db:
         utils.convert_db(str(handler.dst), dry_run=args.dry_run, logger_func=logger.info)
         return
 
+    if args.import_catalog:
+        catalog.import_json_catalog(str(handler.dst), dry_run=args.dry_run, logger_func=logger.info)
+        return
+
+    if args.export_catalog:
+        catalog.export_json_catalog(str(handler.dst), dry_run=args.dry_run, logger_func=logger.info)
+        return
+
     if args.merge_db:
         utils.merge_dbs(str(handler.dst), args.merge_db, dry_run=args.dry_run, logger_func=logger.info)
         return
@@ -48,13 +139,15 @@ def main() -> None:
         return
 
     if args.duplicate_report:
-        utils.generate_duplicate_report(str(handler.dst), logger_func=logger.info)
+        utils.generate_duplicate_report(str(handler.dst), logger_func=logger.info,
+                                        near_duplicates=args.near_duplicates, max_distance=args.near_distance)
         return
 
-    if args.find_duplicates:
+    if args.find_duplicates or args.near_duplicates:
         utils.find_duplicates(str(handler.dst), delete=args.delete_duplicates,
                               keep_strategy=args.keep_strategy, keep_folder=args.keep_folder,
-                              logger_func=logger.info)
+                              logger_func=logger.info, near_duplicates=args.near_duplicates,
+                              max_distance=args.near_distance)
         return
 
     if args.compare_folders:
@@ -64,11 +157,29 @@ def main() -> None:
                               logger_func=logger.info)
         return
 
-    handler.handle()
+    try:
+        with _metrics_file(handler, args.metrics_file):
+            handler.handle()
+    except InterruptedRunPending as e:
+        parser.error(str(e))
     handler.output()
     logger.info('Handling finished\n')
 
 
+@contextmanager
+def _metrics_file(handler: PicturesHandler, path: str | None) -> Iterator[None]:
+    ''' --metrics-file: write the metrics of the run when it ends, also when it fails '''
+    start = time.monotonic()
+    success = False
+    try:
+        yield
+        success = True
+    finally:
+        if path:
+            handler.metrics(time.monotonic() - start, success).write(path)
+            logger.info(f'Run metrics written to {path}')
+
+
 def create_parser() -> ArgumentParser:
     parser = ArgumentParser(description="Pictures Handler parameters")
     parser.add_argument("--src", '-s', dest="src", type=str, help="Folder to parse")
@@ -96,6 +207,14 @@ def create_parser() -> ArgumentParser:
                         help='Scan destination folder and subfolders for duplicate media files (dry run by default)')
     parser.add_argument('--delete-duplicates', '--dd', dest='delete_duplicates', action='store_true', default=False,
                         help='Actually delete duplicate media files found by --find-duplicates (keeps one copy)')
+    parser.add_argument('--near-duplicates', '--nd', dest='near_duplicates', action='store_true', default=False,
+                        help='Find duplicates (--find-duplicates) including images that look the same, by '
+                        'perceptual hashes (e.g. re-saved or resized copies). The largest file of a group is kept. '
+                        'With --duplicate-report, near duplicates are added to the report')
+    parser.add_argument('--near-distance', '--ndist', dest='near_distance', type=int,
+                        default=perceptual_hash.NEAR_DUPLICATE_DISTANCE, metavar='BITS',
+                        help='Largest number of differing bits (of 64) between the hashes of near duplicates '
+                        f'(default {perceptual_hash.NEAR_DUPLICATE_DISTANCE})')
     parser.add_argument('--keep-strategy', '--ks', dest='keep_strategy', type=str, default=None,
                         choices=['folder_priority', 'shortest_path', 'oldest'],
                         help='Strategy for choosing which duplicate to keep: '
@@ -113,10 +232,56 @@ def create_parser() -> ArgumentParser:
                         help='Write folder comparison report to this file path')
     parser.add_argument('--convert-db', '--cdb', dest='convert_db', action='store_true', default=False,
                         help='Convert DB from old format (full paths) to new format (filenames + size)')
+    parser.add_argument('--import-catalog', '--ic', dest='import_catalog', action='store_true', default=False,
+                        help=f'Import {utils.DB_NAME} into an indexed SQLite {utils.CATALOG_DB_NAME}, '
+                        'used instead of the JSON DB from then on')
+    parser.add_argument('--export-catalog', '--ec', dest='export_catalog', action='store_true', default=False,
+                        help=f'Export {utils.CATALOG_DB_NAME} back to {utils.DB_NAME}')
     parser.add_argument('--merge-db', '--mdb', dest='merge_db', type=str, default=None,
                         metavar='DB_FILE',
-                        help='Merge a second DB file into the destination DB. '
+                        help='Merge a second DB file (files.txt or files.db) into the destination DB. '
                         'Handles duplicates (binary compare, keep one) and conflicts (rename with suffix increment)')
+    parser.add_argument('--full-scan', '--fs', dest='full_scan', action='store_true', default=False,
+                        help='List every destination folder instead of reusing the folder snapshot (dirs.txt) '
+                        'for folders whose modification time did not change')
+    parser.add_argument('--trust-db', '--tdb', dest='trust_db', action='store_true', default=False,
+                        help='Plan from the DB without scanning the destination folder; only destination files that '
+                        'are compared or would be overwritten are checked. Falls back to a scan on inconsistencies')
+    parser.add_argument('--stream', dest='stream', action='store_true', default=False,
+                        help='Move each file as soon as it is dated and compared instead of scanning the whole source '
+                        'first; moves are appended to the DB in batches. Dry runs always use the full plan')
+    parser.add_argument('--plan-out', '--po', dest='plan_out', type=str, default=None, metavar='PLAN_FILE',
+                        help='Write the planned moves and the files rejected by comparison to PLAN_FILE (JSON), '
+                        'typically with --dry-run, to be reviewed and run later with --apply')
+    parser.add_argument('--apply', dest='apply', type=str, default=None, metavar='PLAN_FILE',
+                        help='Move and delete files as decided in a plan written by --plan-out, without scanning. '
+                        'Files changed since the plan (size, modification time) are skipped')
+    parser.add_argument('--resume', dest='resume', action='store_true', default=False,
+                        help=f'Continue a run that was interrupted while moving files, from the plan and position '
+                        f'kept in the destination folder ({ingest_plan.CHECKPOINT_PLAN_NAME}), without scanning')
+    parser.add_argument('--checkpoint-every', '--ce', dest='checkpoint_every', type=int, default=CHECKPOINT_INTERVAL,
+                        help=f'Commit moved files to the DB and save the position in the plan every N moves '
+                        f'(default {CHECKPOINT_INTERVAL})')
+    parser.add_argument('--workers', '-w', dest='workers', type=int, default=1,
+                        help='Number of processes extracting source file metadata (EXIF, dates). '
+                        'Default 1 runs in the main process')
+    parser.add_argument('--async-scan', '--as', dest='async_scan', action='store_true', default=False,
+                        help='Overlap the directory listings, stats and header reads of the source and destination '
+                        'scans, for folders on network mounts (NFS/SMB). Results are the same as a serial scan')
+    parser.add_argument('--in-flight', dest='in_flight', type=int, default=DEFAULT_IN_FLIGHT,
+                        help=f'Maximum number of concurrent file system calls with --async-scan '
+                        f'(default {DEFAULT_IN_FLIGHT})')
+    parser.add_argument('--move-workers', '--mw', dest='move_workers', type=int, default=1,
+                        help='Number of threads moving files to the destination. Files on the destination device '
+                        'are renamed, others are copied; several copies in flight help slow links like USB to NAS')
+    parser.add_argument('--metrics-file', '--mf', dest='metrics_file', type=str, default=None, metavar='PROM_FILE',
+                        help='Write the duration and file counts of the run to an OpenMetrics textfile at the end, '
+                        'e.g. for the node_exporter textfile collector')
+    parser.add_argument('--profile', dest='profile', action='store_true', default=False,
+                        help='Log the wall time, CPU time, files/s, bytes read, stat calls, Pillow opens, filecmp '
+                        'calls and peak RSS of each stage at the end of the run')
+    parser.add_argument('--profile-dump', '--pd', dest='profile_dump', type=str, default=None, metavar='FOLDER',
+                        help='Also write a cProfile dump of each stage to FOLDER/<stage>.prof, implies --profile')
     return parser
 
 
@@ -126,7 +291,10 @@ class PicturesHandler:
                  ignore_regexs: list[str] | None = None, dry_run: bool = False,
                  recursive: bool = False, accept_regexs: list[str] | None = None,
                  sync: bool = False, db_path: str = 'files.txt',
-                 by_month: bool = False) -> None:
+                 by_month: bool = False, workers: int = 1, full_scan: bool = False,
+                 trust_db: bool = False, stream: bool = False, move_workers: int = 1,
+                 async_scan: bool = False, in_flight: int = DEFAULT_IN_FLIGHT, plan_out: str | None = None,
+                 checkpoint_every: int = CHECKPOINT_INTERVAL) -> None:
         if not src or not dst:
             raise ValueError('Mandatory parameter source folder or destination folder is missing')
         src_path = Path(src)
@@ -143,9 +311,18 @@ class PicturesHandler:
         self.db_path = db_path
         self.recursive = recursive
         self.dry_run = dry_run
-        self.ignore_regexs = [re.compile(rf'{regex}') for regex in ignore_regexs] if ignore_regexs else []
         self.sync_folder_and_db = sync
         self.by_month = by_month
+        self.workers = workers
+        self.full_scan = full_scan
+        self.trust_db = trust_db
+        self.stream = stream
+        self.move_workers = move_workers
+        self.plan_out = plan_out
+        self.checkpoint_every = checkpoint_every
+        self._executor: Executor | None = None
+        self.mover = Mover()
+        self.scanner = AsyncScanner(in_flight) if async_scan else None
 
         if accept_regexs:
             if 'default' in accept_regexs:
@@ -158,26 +335,54 @@ class PicturesHandler:
                 accept_regexs.remove('camera')
                 accept_regexs.append(regex_patterns.ACCEPTABLE_REGEXS[1])
 
-        self.acceptable_regexs = [re.compile(rf'{regex}') for regex in accept_regexs] if accept_regexs else []
+        self.classifier = NameClassifier(ignore_regexs, accept_regexs)
+
+        self.catalog: catalog.Catalog | None = None
+        self._reset_scan_state()
 
-        self.db_files: dict[str, dict] = {}
-        self.all_handled_names: list[str] = []
+    def _reset_scan_state(self) -> None:
         self.ignored: list[str] = []
-        self.sizes_files: defaultdict[int, list[str]] = defaultdict(list)
-        self.matched: defaultdict[str, list[dict]] = defaultdict(list)
+        # --compare binary: sizes of destination and accepted files, only files of a known size are hashed
+        self.sizes: set[int] = set()
+        self.matched: defaultdict[str, list[FileRecord]] = defaultdict(list)
         self.matched_regex: list[str] = []
         self.unmatched: list[str] = []
-        self.not_passed_comparison: list[tuple[str, str]] = []
-        self.destination_formats: defaultdict[str, list[dict]] = defaultdict(list)
+        # (path, reason, size, mtime_ns) of each rejected source file
+        self.not_passed_comparison: list[tuple[str, str, int, int | None]] = []
+        self.rejected_by: dict[str, int] = dict.fromkeys(self.comparers, 0)
+        self.destination_formats: defaultdict[str, list[FileRecord]] = defaultdict(list)
         self.destination_not_matched: list[str] = []
-        self.ready_to_add: defaultdict[str, list[dict]] = defaultdict(list)
+        self.ready_to_add: defaultdict[str, list[FileRecord]] = defaultdict(list)
+        self.suffixes = SuffixAllocator()
         self.added_files: list[str] = []
         self.moved: dict[str, dict] = {}
+        # --stream: moved files are logged and appended to the DB in batches, not kept in moved
+        self.num_moved: int = 0
+        # --stream: accepted files are planned and moved right away, not kept in matched
+        self.num_matched: int = 0
         self.unmoved: dict[str, str] = {}
         self.not_deleted: list[tuple[str, str]] = []
         self.min_date_taken: list[tuple[str, dict]] = []
         self.unsupported: list[str] = []
+        if self.stream and not self.dry_run and not self.plan_out:
+            # Memory stays bounded by the destination: per source file results are logged as they come
+            self.ignored = LoggedCount(logger.info)
+            self.unmatched = LoggedCount(logger.info)
+            self.unsupported = LoggedCount(logger.info)
+            self.min_date_taken = LoggedCount(lambda item: None)
+            self.not_passed_comparison = LoggedCount(self._delete_rejected)
         self.num_of_dst_files: int = 0
+        self.num_of_src_files: int = 0
+        self.moved_bytes: int = 0
+        # Size of the files that failed comparison, i.e. duplicates of destination or earlier source files
+        self.rejected_bytes: int = 0
+        self.hash_index = hash_index.HashIndex(self.dst)
+        self.dir_snapshot = dir_snapshot.DirectorySnapshot(self.dst)
+        # --trust-db: destination entries of the DB not checked on disk yet, by size
+        self._unverified: defaultdict[int, list[FileRecord]] = defaultdict(list)
+        # --async-scan: folder listings fetched ahead of the serial traversal, by folder path
+        self._dst_listings: dict[str, tuple[list[str], list[tuple[str, int]]]] = {}
+        self._src_listings: dict[str, tuple[list[os.DirEntry], list[os.DirEntry]]] = {}
 
     def output(self) -> None:
         logger.info(f'*****Total {self.num_of_dst_files} files found at destination directory {self.dst}\n')
@@ -208,22 +413,27 @@ class PicturesHandler:
         for item in self.unsupported:
             logger.info(f'{item}')
 
-        counter = 0
-        for key, matches in self.matched.items():
-            for match in matches:
-                counter += 1
-        logger.info(f'*****Total {counter} files matched\n')
-
-        logger.info('*****Following files are ready to be added')
-        counter = 0
-        for key, matches in self.ready_to_add.items():
-            if len(matches) > 1:
-                logger.info(f'***Ready group: {key}')
-            for match in matches:
-                counter += 1
-                indent = '\t' if len(matches) > 1 else ''
-                logger.info(f'{indent}Ready File: {match["file"]}, New File Name: {match["new_file_name"]}')
-        logger.info(f'*****Total {counter} files ready to be added\n')
+        if self.stream and not self.dry_run:
+            # Planned files were moved and logged as they streamed through
+            logger.info(f'*****Total {self.num_matched} files matched\n')
+            logger.info(f'*****Total {self.num_moved + len(self.unmoved)} files planned\n')
+        else:
+            counter = 0
+            for key, matches in self.matched.items():
+                for match in matches:
+                    counter += 1
+            logger.info(f'*****Total {counter} files matched\n')
+
+            logger.info('*****Following files are ready to be added')
+            counter = 0
+            for key, matches in self.ready_to_add.items():
+                if len(matches) > 1:
+                    logger.info(f'***Ready group: {key}')
+                for match in matches:
+                    counter += 1
+                    indent = '\t' if len(matches) > 1 else ''
+                    logger.info(f'{indent}Ready File: {match.file}, New File Name: {match.new_file_name}')
+            logger.info(f'*****Total {counter} files ready to be added\n')
 
         if not self.dry_run:
             logger.info(f'*****Total {len(self.unmoved)} files failed to be moved\n')
@@ -238,256 +448,613 @@ class PicturesHandler:
                 for f in self.not_deleted:
                     logger.info(f'Not deleted {f[0]}. Reason: {f[1]}')
 
-            logger.info(f'*****Total {len(self.moved)} files were moved to {self.dst}\n')
-            logger.info('******Moved files dict')
-            logger.info(json.dumps(self.moved, indent=4))
+            logger.info(f'*****Total {len(self.moved) + self.num_moved} files were moved to {self.dst}\n')
+            if not self.stream:
+                logger.info('******Moved files dict')
+                logger.info(json.dumps(self.moved, indent=4))
+
+    def metrics(self, duration: float, success: bool) -> run_metrics.MetricsFile:
+        ''' The counts of output() as gauges, for --metrics-file '''
+        if self.stream and not self.dry_run:
+            planned = self.num_moved + len(self.unmoved)
+        else:
+            planned = sum(len(matches) for matches in self.ready_to_add.values())
+        files = {
+            'destination': self.num_of_dst_files,
+            'destination_matched': sum(len(val) for val in self.destination_formats.values()),
+            'destination_not_matched': len(self.destination_not_matched),
+            'scanned': self.num_of_src_files,
+            'ignored': len(self.ignored),
+            'unmatched': len(self.unmatched),
+            'unsupported': len(self.unsupported),
+            'min_date': len(self.min_date_taken),
+            'matched': self.num_matched + sum(len(matches) for matches in self.matched.values()),
+            'planned': planned,
+            'rejected': len(self.not_passed_comparison),
+            'moved': len(self.moved) + self.num_moved,
+            'unmoved': len(self.unmoved),
+            'not_deleted': len(self.not_deleted),
+            }
+        metrics = run_metrics.MetricsFile()
+        metrics.gauge('run_success', 'Whether the last run finished without an error', int(success))
+        metrics.gauge('run_dry_run', 'Whether the last run was a dry run', int(self.dry_run))
+        metrics.gauge('run_timestamp_seconds', 'End time of the last run', time.time(), unit='seconds')
+        metrics.gauge('run_duration_seconds', 'Wall time of the last run', duration, unit='seconds')
+        metrics.gauge('files', 'Files of the last run by category', files, label='category')
+        metrics.gauge('rejected_files', 'Source files that failed each comparer in the last run', self.rejected_by,
+                      label='comparer')
+        metrics.gauge('moved_bytes', 'Size of the files moved to the destination in the last run', self.moved_bytes,
+                      unit='bytes')
+        metrics.gauge('duplicate_bytes', 'Size of the source files that failed comparison in the last run',
+                      self.rejected_bytes, unit='bytes')
+        return metrics
 
     def handle(self) -> None:
+        if not self.dry_run:
+            self._check_interrupted_run()
         self._load_db()
-        self._handle_destination_folder(self.dst)
-        self._handle_source_folder(self.src, self.recursive)
+        try:
+            if self.stream and not self.dry_run and not self.plan_out:
+                self._handle_stream()
+                return
+            try:
+                self._plan()
+            except CatalogOutOfSync as e:
+                logger.warning(f'DB is out of sync with {self.dst}: {e}. Falling back to a destination scan')
+                self.trust_db = False
+                self._reset_scan_state()
+                self._load_indexes()
+                self._plan()
+            if self.plan_out or not self.dry_run:
+                plan = self._make_plan()
+                if self.plan_out:
+                    ingest_plan.write_plan(self.plan_out, plan)
+                    logger.info(f'Plan of {len(plan["files"])} moves and {len(plan["rejected"])} rejected files '
+                                f'written to {self.plan_out}')
+                if not self.dry_run:
+                    self._run_plan(plan)
+        finally:
+            self.catalog.close()
+            if self.scanner:
+                self.scanner.close()
+
+    @profiling.staged('make plan')
+    def _make_plan(self) -> dict:
+        files = [ingest_plan.file_entry(f.fullpath, f.size, f.mtime_ns, source_name=f.file, new_name=f.new_file_name,
+                                        target=str(self._target_folder(f) / f.new_file_name))
+                 for matches in self.ready_to_add.values() for f in matches]
+        rejected = [ingest_plan.file_entry(path, size, mtime_ns, reason=reason)
+                    for path, reason, size, mtime_ns in self.not_passed_comparison]
+        profiling.count(profiling.FILES, len(files) + len(rejected))
+        return ingest_plan.make_plan(self.src, self.dst, files, rejected)
+
+    def _check_interrupted_run(self) -> None:
+        if ingest_plan.has_checkpoint(self.dst):
+            raise InterruptedRunPending(f'A previous run was interrupted, its plan {ingest_plan.CHECKPOINT_PLAN_NAME} '
+                                        f'is still in {self.dst}. Finish it with --resume first')
+
+    def apply_plan(self, plan: dict, done: int = 0, resume: bool = False) -> None:
+        ''' --apply, --resume: run the moves and deletions of a plan without scanning, skipping changed files.
+
+        done is the number of file entries already run. When resuming, files moved after the last
+        checkpoint are recorded instead of being reported as missing.
+        '''
+        if not self.dry_run and not resume:
+            self._check_interrupted_run()
+        self._load_db()
+        try:
+            for entry in plan['files'][done:]:
+                self.ready_to_add[entry['new_name']].append(self._plan_entry_record(entry))
+            for entry in plan['rejected']:
+                reason = ingest_plan.stale_reason(entry)
+                if not reason:
+                    self._reject(entry['source'], entry['reason'], entry['size'], entry['mtime_ns'])
+                elif not resume or os.path.lexists(entry['source']):
+                    # A missing rejected file was already deleted by the interrupted run
+                    self.not_deleted.append((entry['source'], reason))
+            if not self.dry_run:
+                self._run_plan(plan, done, resume)
+        finally:
+            self.catalog.close()
+
+    @staticmethod
+    def _plan_entry_record(entry: dict) -> FileRecord:
+        f = FileRecord(os.path.dirname(entry['source']), os.path.basename(entry['source']), entry['size'])
+        f.new_file_name = entry['new_name']
+        return f
+
+    @profiling.staged('move')
+    def _run_plan(self, plan: dict, done: int = 0, resume: bool = False) -> None:
+        ''' Move the planned files from entry done on, then delete the rejected ones.
+
+        The plan is kept in the destination folder while it runs. Every checkpoint_every moves the
+        moved files are committed to the DB and the position in the plan is saved, so an interrupted
+        run can be continued with --resume.
+        '''
+        if not resume:
+            ingest_plan.write_checkpoint(self.dst, plan)
+        pending: dict[str, dict] = {}
+        planned: list[tuple[int, FileRecord, Path]] = []
+        for index, entry in enumerate(plan['files'][done:], done):
+            f = self._plan_entry_record(entry)
+            reason = ingest_plan.stale_reason(entry)
+            if reason and resume and ingest_plan.was_moved(entry):
+                # Moved by the interrupted run after its last checkpoint
+                name, db_entry = self._record_move(f, Path(entry['target']), None)
+                self.moved[name] = pending[name] = db_entry
+            elif reason:
+                self.unmoved[entry['source']] = reason
+            else:
+                planned.append((index, f, Path(entry['target'])))
+
+        with self._move_map() as move_map:
+            # Transfers may run in threads, their results are recorded here in plan order
+            results = move_map(lambda p: self._move_to(p[1].fullpath, p[2]), planned)
+            try:
+                from tqdm import tqdm
+                results = tqdm(results, total=len(planned), desc='Moving files', unit='file')
+            except ImportError:
+                pass
+
+            for (index, f, target), error in zip(planned, results):
+                moved = self._record_move(f, target, error)
+                if not moved:
+                    continue
+                self.moved[moved[0]] = pending[moved[0]] = moved[1]
+                if len(pending) >= self.checkpoint_every:
+                    self._checkpoint(pending, index + 1)
+                    pending = {}
+        self._checkpoint(pending, len(plan['files']))
+        self._delete_not_added()
+        self._save_indexes()
+        ingest_plan.remove_checkpoint(self.dst)
+
+    @profiling.staged('commit DB')
+    def _checkpoint(self, moved: dict[str, dict], done: int) -> None:
+        ''' Commit moved files to the DB, then save the position in the plan '''
+        if moved:
+            self.catalog.update(moved)
+            self.catalog.commit()
+        ingest_plan.write_progress(self.dst, done)
+
+    def _plan(self) -> None:
+        self._scan_destination()
+        self._scan_source()
         self._prepare_new_files_for_copy()
-        if not self.dry_run:
-            self._move_prepared_files()
-            self._update_db()
-            self._delete_not_added()
+        if self.trust_db:
+            self._check_targets_free()
 
+    @profiling.staged('load DB and indexes')
     def _load_db(self) -> None:
-        self.db_files = utils.load_db_files(str(self.dst))
-        for new_name, entry in self.db_files.items():
-            self.all_handled_names += [entry['source_name'], new_name]
+        self.catalog = catalog.open_catalog(self.dst)
+        self._load_indexes()
+
+    def _load_indexes(self) -> None:
+        if 'binary' in self.comparers:
+            self.hash_index.load()
+        if not self.full_scan:
+            self.dir_snapshot.load()
 
+    @profiling.staged('delete rejected')
     def _delete_not_added(self) -> None:
+        profiling.count(profiling.FILES, len(self.not_passed_comparison))
         for f in self.not_passed_comparison:
-            try:
-                Path(f[0]).unlink()
-            except OSError as e:
-                self.not_deleted.append((f[0], f'Error {e.__class__.__name__} {e}'))
-
-    def _update_db(self) -> None:
-        self.db_files.update(self.moved)
-        utils.save_db_files(self.db_files, str(self.dst), 'files.txt')
+            self._delete_file(f[0])
 
+    def _delete_file(self, path: str) -> None:
+        try:
+            Path(path).unlink()
+        except OSError as e:
+            self.not_deleted.append((path, f'Error {e.__class__.__name__} {e}'))
+
+    def _delete_rejected(self, item: tuple[str, str, int, int | None]) -> None:
+        ''' --stream: a rejected file is deleted right away, the file it duplicates was moved already '''
+        logger.info(f'Not passed compare {item[1]}')
+        self._delete_file(item[0])
+
+    def _reject(self, path: str, reason: str, size: int, mtime_ns: int | None) -> None:
+        self.not_passed_comparison.append((path, reason, size, mtime_ns))
+        self.rejected_bytes += size
+        # Reasons look like 'NAME: IMG_0001.jpg; BINARY: ...', one part per failed comparer
+        for part in reason.split('; '):
+            comparer = part.split(':', 1)[0].lower()
+            self.rejected_by[comparer] = self.rejected_by.get(comparer, 0) + 1
+
+    @profiling.staged('save indexes')
+    def _save_indexes(self) -> None:
+        if 'binary' in self.comparers:
+            # With --trust-db the destination is not listed, files missing from it are unknown
+            self.hash_index.save(prune=not self.trust_db)
+        self.dir_snapshot.save()
+
+    @profiling.staged('plan names')
     def _prepare_new_files_for_copy(self) -> None:
-        def get_new_filename() -> str:
-            return regex_patterns.NEW_FILE_FORMAT.format(
-                regex_patterns.DESTINATION_FORMAT_NO_SUFFIX_NO_EXTENSION.format(**match).replace(
-                    'None', '00'), suffix, **match)
-
-        def get_new_suffix(file_props_list: list[dict]) -> str:
-            return regex_patterns.NEW_SUFFIX_FORMAT.format(
-                max(int(props['suffix']) for props in file_props_list) + 1)
-
         for key, matched in self.matched.items():
+            profiling.count(profiling.FILES, len(matched))
             for match in matched:
-                logger.info(f'match {match}')
-                file_format = regex_patterns.DESTINATION_FORMAT_NO_SUFFIX.format(**match).replace('None', '00')
-                if file_format not in list(self.destination_formats) + list(self.ready_to_add):
-                    suffix = '000'
-                elif file_format in self.ready_to_add:
-                    suffix = get_new_suffix(self.ready_to_add[file_format])
-                else:  # file_format in self.destination_formats
-                    suffix = get_new_suffix(self.destination_formats[file_format])
-                match['suffix'] = suffix
-                match['new_file_name'] = get_new_filename()
+                file_format = self._plan_file(match)
                 self.ready_to_add[file_format].append(match)
 
-    def _update_common_file_props(self, file: str, folder: str | Path) -> dict:
-        full_path = Path(folder) / file
-        return {
-            'fullpath': str(full_path),
-            'folder': str(folder),
-            'size': full_path.stat().st_size,
-            'file': file,
-            'extension': full_path.suffix.lstrip('.').lower(),
-        }
+    def _plan_file(self, match: FileRecord) -> str:
+        ''' Allocate the destination name of a matched file, returns its YYYYMMDD_HHMMSS.ext key '''
+        logger.info(f'match {match}')
+        file_format = match.key()
+        suffix = self.suffixes.allocate(file_format)
+        match.suffix = suffix
+        match.new_file_name = regex_patterns.NEW_FILE_FORMAT.format(match.date_name(), suffix,
+                                                                    extension=match.extension)
+        return file_format
+
+    def _update_common_file_props(self, file: str, folder: str | Path, size: int | None = None) -> FileRecord:
+        if size is None:
+            size = os.stat(os.path.join(folder, file)).st_size
+            profiling.count(profiling.STAT_CALLS)
+        return FileRecord(folder, file, size)
+
+    @profiling.staged('scan destination')
+    def _scan_destination(self) -> None:
+        if self.trust_db:
+            self._handle_destination_from_db()
+            return
+        if self.scanner:
+            self.dst.mkdir(parents=True, exist_ok=True)
+            self._dst_listings = self.scanner.walk(self.dst, self._list_destination_dir)
+        self._handle_destination_folder(self.dst)
+
+    def _list_destination_dir(self, folder: str) -> tuple[list[str], tuple[list[str], list[tuple[str, int]]]]:
+        ''' --async-scan: (year and month folders to list next, listing of folder) '''
+        subdirs, files = self.dir_snapshot.scan(folder)
+        return [os.path.join(folder, d) for d in subdirs if DATE_DIR_REGEX.match(d)], (subdirs, files)
 
     def _handle_destination_folder(self, folder: str | Path, recursive: bool = False) -> None:
         folder_path = Path(folder)
-        if not folder_path.exists():
-            folder_path.mkdir(parents=True)
-
+        listing = self._dst_listings.pop(str(folder_path), None)
+        if listing is None:
+            if not folder_path.exists():
+                folder_path.mkdir(parents=True)
+            # Unchanged directories come from the snapshot of the previous run without being listed
+            listing = self.dir_snapshot.scan(folder_path)
+        subdirs, files = listing
         # Always scan year subfolders (4-digit) and month subfolders (2-digit)
-        date_dirs = [d for d in folder_path.iterdir() if d.is_dir() and
-                     re.match(r'^\d{2,4}$', d.name)]
+        date_dirs = [folder_path / d for d in subdirs if DATE_DIR_REGEX.match(d)]
         for d in date_dirs:
             self._handle_destination_folder(d)
 
         if recursive:
-            other_dirs = [d for d in folder_path.iterdir() if d.is_dir() and
-                          not re.match(r'^\d{4}$', d.name) and
-                          str(d).lower() != str(self.src).lower()]
+            other_dirs = [folder_path / d for d in subdirs if
+                          not YEAR_DIR_REGEX.match(d) and
+                          str(folder_path / d).lower() != str(self.src).lower()]
             for d in other_dirs:
                 self._handle_destination_folder(d)
 
-        files = [f.name for f in folder_path.iterdir() if f.is_file()]
         self.num_of_dst_files += len(files)
+        profiling.count(profiling.FILES, len(files))
         counter_of_matched = 0
-        for f in files:
-            match = re.match(regex_patterns.DESTINATION_REGEX, f)
+        folder_name = str(folder_path)
+        for f, size in files:
+            match = regex_patterns.match_destination(f)
             if not match:
                 self.destination_not_matched.append(f)
                 continue
             else:
                 counter_of_matched += 1
 
-            properties = self._update_common_file_props(f, folder_path)
-            properties.update(match.groupdict())
-            # Create key with no suffix
-            key = regex_patterns.DESTINATION_FORMAT_NO_SUFFIX.format(**properties)
-            self.destination_formats[key].append(properties)
-            self.sizes_files[properties['size']].append(properties['fullpath'])
+            record = FileRecord.from_match(folder_name, f, size, match.groupdict())
+            self._add_destination_record(record)
+            if 'binary' in self.comparers:
+                self.hash_index.register(record.fullpath, size, f)
         self.num_of_dst_matched_files = counter_of_matched
 
-    @staticmethod
-    def _is_image(file_path: str) -> bool:
-        try:
-            with Image.open(file_path) as img:
-                img.verify()
-            return True
-        except Exception:
-            return False
+    def _add_destination_record(self, record: FileRecord) -> None:
+        # Key with no suffix
+        key = record.key()
+        self.destination_formats[key].append(record)
+        self.suffixes.seed(key, record.suffix)
+        self.sizes.add(record.size)
+
+    def _handle_destination_from_db(self) -> None:
+        ''' --trust-db: destination_formats and sizes from the DB instead of a destination scan '''
+        for name, entry in self.catalog.items():
+            self.num_of_dst_files += 1
+            match = regex_patterns.match_destination(name)
+            if not match:
+                self.destination_not_matched.append(name)
+                continue
+            record = FileRecord.from_match(self.dst, name, entry['size'], match.groupdict())
+            record.folder = sys.intern(str(self._target_folder(record)))
+            self._add_destination_record(record)
+            self._unverified[record.size].append(record)
+        profiling.count(profiling.FILES, self.num_of_dst_files)
+        self.num_of_dst_matched_files = sum(len(val) for val in self.destination_formats.values())
+
+    def _verify_destination_size(self, size: int) -> None:
+        ''' Locate the DB entries of a size before they are compared, in either year or year/month layout '''
+        for record in self._unverified.pop(size, []):
+            name = record.file
+            for by_month in (self.by_month, not self.by_month):
+                path = self._target_folder(record, by_month) / name
+                profiling.count(profiling.STAT_CALLS)
+                try:
+                    if path.stat().st_size == size:
+                        break
+                except OSError:
+                    continue
+            else:
+                raise CatalogOutOfSync(f'{name} of size {size} not found in {self.dst}')
+            self.hash_index.register(str(path), size, name)
+
+    @profiling.staged('check targets')
+    def _check_targets_free(self) -> None:
+        ''' --trust-db: a planned name that already exists means the DB is missing a destination file '''
+        for matches in self.ready_to_add.values():
+            for f in matches:
+                self._check_target_free(f)
+
+    def _check_target_free(self, f: FileRecord) -> None:
+        target = self._target_folder(f) / f.new_file_name
+        profiling.count(profiling.STAT_CALLS)
+        if target.exists():
+            raise CatalogOutOfSync(f'{target} exists but is not in the DB')
+
+    @profiling.staged('scan source')
+    def _scan_source(self) -> None:
+        with self._metadata_executor():
+            if self.scanner:
+                self._src_listings = self.scanner.walk(self.src, self._list_source_dir)
+            self._handle_source_folder(self.src, self.recursive)
+
+    def _list_source_dir(self, folder: str) -> tuple[list[str], tuple[list[os.DirEntry], list[os.DirEntry]]]:
+        ''' --async-scan: (subfolders to list next, listing of folder) '''
+        subdirs, entries = walker.scan_dir(folder)
+        dst = str(self.dst).lower()
+        children = [d.path for d in subdirs if d.path.lower() != dst] if self.recursive else []
+        return children, (subdirs, entries)
+
+    @contextmanager
+    def _metadata_executor(self) -> Iterator[None]:
+        if self.workers <= 1:
+            yield
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            self._executor = executor
+            try:
+                yield
+            finally:
+                self._executor = None
 
     def _handle_source_folder(self, folder: str | Path, recursive: bool) -> None:
         folder_path = Path(folder)
+        listing = self._src_listings.pop(str(folder_path), None)
+        subdirs, entries = listing if listing is not None else walker.scan_dir(folder_path)
+        self.num_of_src_files += len(entries)
+        profiling.count(profiling.FILES, len(entries))
+        if self.scanner:
+            # Fill the stat cache of the entries before they are classified one by one
+            self.scanner.map(lambda entry: entry.stat(), entries)
         if recursive:
-            dirs = [d for d in folder_path.iterdir() if d.is_dir() and
-                    str(d).lower() != str(self.dst).lower()]
+            dirs = [Path(d.path) for d in subdirs if d.path.lower() != str(self.dst).lower()]
             for d in dirs:
                 self._handle_source_folder(d, recursive)
-        files = [f.name for f in folder_path.iterdir() if f.is_file()]
 
         try:
             from tqdm import tqdm
-            file_iter = tqdm(files, desc=f'Scanning {folder_path.name}', unit='file')
+            file_iter = tqdm(entries, desc=f'Scanning {folder_path.name}', unit='file')
         except ImportError:
-            file_iter = files
+            file_iter = entries
 
-        for f in file_iter:
-            if any(regex.match(f) for regex in self.ignore_regexs):
-                self.ignored.append(f'{f}. Folder: {folder_path}')
+        batch: list[tuple[FileRecord, float]] = []
+        for entry in file_iter:
+            classified = self._classify_source_file(entry, folder_path)
+            if not classified:
                 continue
-
-            if self.acceptable_regexs and not any(re.match(_regex, f) for _regex in self.acceptable_regexs):
-                self.unmatched.append(str(folder_path / f))
-                continue
-
-            properties = self._update_common_file_props(f, folder_path)
-            full_path = properties['fullpath']
-            size = properties['size']
-            # Photo file
-            if self._is_image(full_path):
-                date_taken = None
-                img = None
-                try:
-                    img = Image.open(full_path)
-                except OSError as e:
-                    logger.warning(f'Failed to open image {full_path}: {e}')
-                if img:
-                    try:
-                        if hasattr(img, '_getexif'):
-                            _getexif = img._getexif()
-                            if _getexif and DATE_TIME_ORIGINAL_KEY in _getexif:
-                                date_taken = _getexif[DATE_TIME_ORIGINAL_KEY]
-                        if not date_taken and hasattr(img, 'tag'):
-                            logger.info(f'tag exists {f}')
-                            date_taken = img.tag._tagdata[DATE_TIME_ORIGINAL_KEY]
-                    except Exception as e:
-                        logger.warning(f'Failed to read EXIF data from {full_path}: {e}')
-                if date_taken:
-                    match = re.match(regex_patterns.DATE_TAKEN_REGEX, date_taken)
-                    if match:
-                        properties.update(match.groupdict())
-                    else:
-                        logger.info(f'date_taken case {date_taken} full_path: {full_path}')
-                        self.unsupported.append(full_path)
-                else:
-                    properties.update(self._retrieve_min_date(f, full_path))
-            elif properties['extension'] in regex_patterns.VIDEO_FILE_EXTENSIONS:
-                properties.update(self._retrieve_min_date(f, full_path))
+            batch.append(classified)
+            if len(batch) >= METADATA_BATCH_SIZE:
+                self._handle_source_batch(batch)
+                batch = []
+        if batch:
+            self._handle_source_batch(batch)
+
+    def _classify_source_file(self, entry: os.DirEntry, folder_path: Path) -> tuple[FileRecord, float] | None:
+        ''' (record, earliest file time) of a source file that passes the ignore and accept filters '''
+        f = entry.name
+        decision = self.classifier.classify(f)
+        if decision == IGNORED:
+            self.ignored.append(f'{f}. Folder: {folder_path}')
+            return None
+        if decision == UNMATCHED:
+            self.unmatched.append(str(folder_path / f))
+            return None
+
+        stat = entry.stat()
+        profiling.count(profiling.STAT_CALLS)
+        record = self._update_common_file_props(f, folder_path, stat.st_size)
+        record.mtime_ns = stat.st_mtime_ns
+        return record, min(stat.st_atime, stat.st_mtime, stat.st_ctime)
+
+    def _handle_source_batch(self, batch: list[tuple[FileRecord, float]]) -> None:
+        for record in self._date_batch(batch):
+            if self._compare_source_file(record):
+                self.matched[record.file].append(record)
+
+    def _date_batch(self, batch: list[tuple[FileRecord, float]]) -> Iterator[FileRecord]:
+        ''' Extract metadata for a batch of accepted files, yielding the supported ones in scan order '''
+        records = [record for record, _ in batch]
+        names = [record.file for record in records]
+        paths = [record.fullpath for record in records]
+        min_times = [min_time for _, min_time in batch]
+        with profiling.stage('read dates'):
+            profiling.count(profiling.FILES, len(batch))
+            if self._executor:
+                results = list(self._executor.map(metadata.extract_metadata, names, paths, min_times,
+                                                  chunksize=max(1, len(batch) // (self.workers * 4))))
+            elif self.scanner:
+                results = self.scanner.map(metadata.extract_metadata, names, paths, min_times)
             else:
-                self.unsupported.append(full_path)
-                continue
+                results = list(map(metadata.extract_metadata, names, paths, min_times))
 
-            passed_comparison = True
-            errors: list[str] = []
-            # Name Filter
-            if 'name' in self.comparers:
-                if f in self.all_handled_names:
-                    errors.append(f'NAME: {f}')
+        for record, path, (date_props, status, messages) in zip(records, paths, results):
+            for level, message in messages:
+                logger.log(level, message)
+            if status == metadata.UNSUPPORTED:
+                self.unsupported.append(path)
+                continue
+            if status == metadata.UNSUPPORTED_DATE:
+                self.unsupported.append(path)
+            elif status == metadata.DATE_FROM_MIN:
+                self.min_date_taken.append((record.file, date_props))
+            if date_props:
+                record.set_date(date_props)
+            yield record
+
+    @profiling.staged('compare')
+    def _compare_source_file(self, record: FileRecord) -> bool:
+        ''' Run the comparers against the destination and the files accepted so far '''
+        f = record.file
+        full_path = record.fullpath
+        size = record.size
+        passed_comparison = True
+        errors: list[str] = []
+        profiling.count(profiling.FILES)
+        # Name Filter
+        if 'name' in self.comparers:
+            if self.catalog.is_handled_name(f):
+                errors.append(f'NAME: {f}')
+                passed_comparison = False
+
+        if 'size' in self.comparers:
+            pass
+
+        # binary Comparer: one hash of the new file and a (size, hash) lookup
+        digest = None
+        if passed_comparison and 'binary' in self.comparers:
+            if size in self.sizes:
+                self._verify_destination_size(size)
+                digest = hash_index.hash_file(full_path)
+                same = self.hash_index.find(size, digest)
+                if same:
+                    errors.append(f'BINARY: {full_path} same as {same[0]} {size}')
                     passed_comparison = False
 
-            if 'size' in self.comparers:
-                pass
-
-            # binary Comparer
-            if passed_comparison and 'binary' in self.comparers:
-                if size in self.sizes_files:
-                    for _f in self.sizes_files[size]:
-                        if filecmp.cmp(_f, full_path, shallow=False):
-                            errors.append(f'BINARY: {full_path} same as {_f} {size}')
-                            passed_comparison = False
-                            break
-
-            if passed_comparison:
-                self.matched[f].append(properties)
-                self.sizes_files[size].append(full_path)
-            else:
-                self.not_passed_comparison.append((full_path, '; '.join(errors)))
-
-    def _retrieve_min_date(self, f: str, full_path: str) -> dict[str, str]:
-        p = Path(full_path)
-        stat = p.stat()
-        min_date = min(stat.st_atime, stat.st_mtime, stat.st_ctime)
-        dt = datetime.fromtimestamp(min_date)
-        match = re.match(regex_patterns.ACCEPTABLE_REGEXS[0], f)
-        if match:
-            group_dict = {key: int(value if value else '0') for key, value in match.groupdict().items()
-                          if key in ['year', 'month', 'day', 'hour', 'minute', 'second']}
-            dt_from_name = datetime(group_dict['year'], group_dict['month'], group_dict['day'], group_dict['hour'],
-                                    group_dict['minute'], group_dict['second'])
-            dt = min(dt, dt_from_name)
-
-        date_props = {
-            'year': str(dt.year), 'month': f'{dt.month:02d}',
-            'day': f'{dt.day:02d}', 'hour': f'{dt.hour:02d}',
-            'minute': f'{dt.minute:02d}', 'second': f'{dt.second:02d}'
-            }
-        self.min_date_taken.append((f, date_props))
-        return date_props
-
-    def _move_prepared_files(self) -> None:
-        all_files = [(fg, f) for fg, files in self.ready_to_add.items() for f in files]
-
+        if not passed_comparison:
+            self._reject(full_path, '; '.join(errors), size, record.mtime_ns)
+        elif digest:
+            self.sizes.add(size)
+            self.hash_index.add(full_path, size, digest)
+        elif 'binary' in self.comparers:
+            self.sizes.add(size)
+            self.hash_index.register(full_path, size)
+        return passed_comparison
+
+    def _target_folder(self, record: FileRecord, by_month: bool | None = None) -> Path:
+        year = record.year
+        month = record.month
+        if by_month is None:
+            by_month = self.by_month
+        if year and by_month and month:
+            return self.dst / str(year) / f'{month:02d}'
+        elif year:
+            return self.dst / str(year)
+        return self.dst
+
+    @contextmanager
+    def _move_map(self) -> Iterator[Callable]:
+        if self.move_workers <= 1:
+            yield map
+            return
+        with ThreadPoolExecutor(max_workers=self.move_workers) as executor:
+            yield executor.map
+
+    @profiling.staged('move')
+    def _move_file(self, f: FileRecord) -> tuple[str, dict] | None:
+        ''' Move a planned file to the destination, returns its (new name, DB entry) '''
+        return self._record_move(f, *self._transfer(f))
+
+    def _transfer(self, f: FileRecord) -> tuple[Path, str | None]:
+        ''' Move f to its planned path without touching handler state, returns (path, error) '''
+        new_file_path = self._target_folder(f) / f.new_file_name
+        return new_file_path, self._move_to(f.fullpath, new_file_path)
+
+    def _move_to(self, source: str, target: Path) -> str | None:
+        ''' Move source to target, returns the reason it was not moved '''
         try:
-            from tqdm import tqdm
-            file_iter = tqdm(all_files, desc='Moving files', unit='file')
-        except ImportError:
-            file_iter = all_files
-
-        for fg, f in file_iter:
-            year = f.get('year', '')
-            month = f.get('month', '')
-            if year and self.by_month and month:
-                target_folder = self.dst / year / month
-            elif year:
-                target_folder = self.dst / year
-            else:
-                target_folder = self.dst
-            target_folder.mkdir(parents=True, exist_ok=True)
-            new_file_path = target_folder / f['new_file_name']
-            full_path = Path(f['folder']) / f['file']
-            try:
-                if new_file_path.exists():
-                    self.unmoved[str(full_path)] = f'Exists {new_file_path}'
-                    continue
-                move(str(full_path), str(new_file_path))
-                self.moved[new_file_path.name] = {
-                    'source_name': f['file'],
-                    'size': f['size']
-                }
-            except OSError as e:
-                self.unmoved[str(full_path)] = f'Error {e.__class__.__name__} {e}'
+            self.mover.move(source, target)
+        except FileExistsError:
+            return f'Exists {target}'
+        except OSError as e:
+            return f'Error {e.__class__.__name__} {e}'
+        return None
+
+    def _record_move(self, f: FileRecord, new_file_path: Path, error: str | None) -> tuple[str, dict] | None:
+        if error:
+            self.unmoved[f.fullpath] = error
+            return None
+        profiling.count(profiling.FILES)
+        self.moved_bytes += f.size
+        if 'binary' in self.comparers:
+            self.hash_index.move(f.fullpath, str(new_file_path), f.size, new_file_path.name)
+        return new_file_path.name, {'source_name': f.file, 'size': f.size}
+
+    @profiling.staged('stream')
+    def _handle_stream(self) -> None:
+        ''' --stream: walk -> classify -> date -> compare -> plan -> move -> DB append, one file at a time.
+
+        Stages are generators pulling from each other, so at most one metadata batch of files is
+        in flight: moves start once the first batch is dated and no per-file state is kept for the
+        whole source. Moved files are appended to the DB every METADATA_BATCH_SIZE moves.
+        '''
+        self._scan_destination()
+        moved: dict[str, dict] = {}
+        try:
+            with self._metadata_executor():
+                for record in self._stream_source():
+                    self._plan_file(record)
+                    if self.trust_db:
+                        self._check_target_free(record)
+                    moved_file = self._move_file(record)
+                    if not moved_file:
+                        continue
+                    moved[moved_file[0]] = moved_file[1]
+                    if len(moved) >= METADATA_BATCH_SIZE:
+                        self._append_moved(moved)
+                        moved = {}
+        except CatalogOutOfSync as e:
+            logger.error(f'DB is out of sync with {self.dst}: {e}. Stopped, run again without --trust-db')
+        finally:
+            self._append_moved(moved)
+            self._save_indexes()
+        self._delete_not_added()
+
+    def _stream_source(self) -> Iterator[FileRecord]:
+        ''' Walk, classify, date and compare source files, yielding the ones to add '''
+        dst = str(self.dst).lower()
+        entries = walker.walk(self.src, recursive=self.recursive, dir_filter=lambda d: d.path.lower() != dst)
+        batch: list[tuple[FileRecord, float]] = []
+        for entry in entries:
+            self.num_of_src_files += 1
+            classified = self._classify_source_file(entry, Path(os.path.dirname(entry.path)))
+            if not classified:
+                continue
+            batch.append(classified)
+            if len(batch) >= METADATA_BATCH_SIZE:
+                yield from self._stream_batch(batch)
+                batch = []
+        if batch:
+            yield from self._stream_batch(batch)
+
+    def _stream_batch(self, batch: list[tuple[FileRecord, float]]) -> Iterator[FileRecord]:
+        for record in self._date_batch(batch):
+            if self._compare_source_file(record):
+                self.num_matched += 1
+                yield record
+
+    @profiling.staged('commit DB')
+    def _append_moved(self, moved: dict[str, dict]) -> None:
+        if not moved:
+            return
+        self.catalog.update(moved)
+        self.catalog.commit()
+        self.num_moved += len(moved)
+        logger.info(json.dumps(moved, indent=4))
 
 
 if __name__ == "__main__":
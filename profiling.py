@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import cProfile
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, TypeVar
+
+try:
+    import resource
+except ImportError:
+    # Windows: no peak RSS
+    resource = None
+
+FILES = 'files'
+BYTES_READ = 'bytes read'
+STAT_CALLS = 'stat calls'
+PILLOW_OPENS = 'Pillow opens'
+FILECMP_CALLS = 'filecmp calls'
+COUNTERS = [FILES, BYTES_READ, STAT_CALLS, PILLOW_OPENS, FILECMP_CALLS]
+# Time and counts outside of any stage
+OTHER_STAGE = 'other'
+
+F = TypeVar('F', bound=Callable)
+
+_active: Profiler | None = None
+
+
+def peak_rss_mib() -> float | None:
+    ''' Peak resident set size of this process so far '''
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+class Stage:
+    __slots__ = ('name', 'calls', 'seconds', 'cpu_seconds', 'counters', 'peak_rss', 'profile')
+
+    def __init__(self, name: str, profile: cProfile.Profile | None) -> None:
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.peak_rss: float | None = None
+        self.profile = profile
+
+
+class Profiler:
+    ''' Wall time, CPU time and counters of the stages of a run.
+
+    Stages nest; the time of an inner stage is not counted in the enclosing one, so the stage
+    times add up to the run time. With dump_folder, each stage also gets a cProfile dump of the
+    calls made in the main thread while it was the innermost stage.
+    Time and counts outside of any stage go to OTHER_STAGE.
+    '''
+
+    def __init__(self, dump_folder: str | None = None) -> None:
+        self.dump_folder = dump_folder
+        self.stages: dict[str, Stage] = {}
+        self._stack: list[Stage] = []
+        self._lock = threading.Lock()
+        self._wall = 0.0
+        self._cpu = 0.0
+        self._stack.append(self._stage(OTHER_STAGE))
+        self._stack[0].calls = 1
+        self._resume()
+
+    def _stage(self, name: str) -> Stage:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage(name, cProfile.Profile() if self.dump_folder else None)
+        return stage
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        stage = self._stage(name)
+        self._pause()
+        self._stack.append(stage)
+        stage.calls += 1
+        self._resume()
+        try:
+            yield
+        finally:
+            self._pause()
+            self._stack.pop()
+            rss = peak_rss_mib()
+            if rss is not None:
+                stage.peak_rss = max(stage.peak_rss or 0, rss)
+            self._resume()
+
+    def count(self, counter: str, n: int = 1) -> None:
+        # Moves and async scans count from worker threads, into the stage that started them
+        with self._lock:
+            if self._stack:
+                self._stack[-1].counters[counter] += n
+
+    def _pause(self) -> None:
+        if self._stack:
+            current = self._stack[-1]
+            if current.profile:
+                current.profile.disable()
+            current.seconds += time.perf_counter() - self._wall
+            current.cpu_seconds += time.process_time() - self._cpu
+
+    def _resume(self) -> None:
+        if self._stack:
+            current = self._stack[-1]
+            self._wall = time.perf_counter()
+            self._cpu = time.process_time()
+            if current.profile:
+                current.profile.enable()
+
+    def close(self) -> None:
+        ''' Stop timing, stages entered later are not counted '''
+        self._pause()
+        self._stack.clear()
+        self.stages[OTHER_STAGE].peak_rss = peak_rss_mib()
+
+    def dump(self) -> list[str]:
+        ''' Write the cProfile dump of every stage, returns their paths '''
+        if not self.dump_folder:
+            return []
+        os.makedirs(self.dump_folder, exist_ok=True)
+        paths = []
+        for stage in self.stages.values():
+            file_name = re.sub(r'[^\w.-]+', '_', stage.name)
+            path = os.path.join(self.dump_folder, f'{file_name}.prof')
+            stage.profile.dump_stats(path)
+            paths.append(path)
+        return paths
+
+    def report(self, logger_func: Callable[..., None]) -> None:
+        logger_func('*****Profile')
+        logger_func(f'{"Stage":28s} {"Calls":>7s} {"Wall s":>9s} {"CPU s":>9s} {"Files":>9s} {"Files/s":>9s} '
+                    f'{"Bytes read":>13s} {"Stat calls":>10s} {"Pillow opens":>12s} {"filecmp calls":>13s} '
+                    f'{"Peak RSS MiB":>12s}')
+        total = Stage('total', None)
+        for stage in self.stages.values():
+            if not stage.calls:
+                continue
+            total.seconds += stage.seconds
+            total.cpu_seconds += stage.cpu_seconds
+            # Stages see the same files one after the other, their file counts don't add up
+            for counter in COUNTERS[1:]:
+                total.counters[counter] += stage.counters[counter]
+            logger_func(self._row(stage))
+        total.calls = 1
+        total.peak_rss = peak_rss_mib()
+        logger_func(self._row(total))
+
+    @staticmethod
+    def _row(stage: Stage) -> str:
+        counters = stage.counters
+        rate = f'{counters[FILES] / stage.seconds:9.0f}' if counters[FILES] and stage.seconds else f'{"":9s}'
+        rss = f'{stage.peak_rss:12.0f}' if stage.peak_rss is not None else f'{"":12s}'
+        return (f'{stage.name:28s} {stage.calls:7d} {stage.seconds:9.3f} {stage.cpu_seconds:9.3f} '
+                f'{counters[FILES]:9d} {rate} {counters[BYTES_READ]:13d} {counters[STAT_CALLS]:10d} '
+                f'{counters[PILLOW_OPENS]:12d} {counters[FILECMP_CALLS]:13d} {rss}')
+
+
+def start(dump_folder: str | None = None) -> Profiler:
+    ''' Profile the stages and counters of this process until stop() '''
+    global _active
+    _active = Profiler(dump_folder)
+    return _active
+
+
+def stop() -> Profiler | None:
+    global _active
+    profiler = _active
+    _active = None
+    if profiler:
+        profiler.close()
+    return profiler
+
+
+def count(counter: str, n: int = 1) -> None:
+    if _active is not None:
+        _active.count(counter, n)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    ''' Time the enclosed block as stage name while a profiler runs '''
+    if _active is None:
+        yield
+        return
+    with _active.stage(name):
+        yield
+
+
+def staged(name: str) -> Callable[[F], F]:
+    ''' Decorator timing every call of a function as stage name while a profiler runs '''
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,7 +1,9 @@
+import re
+
 NEW_FILE_FORMAT: str = '{}_{}.{extension}'
 NEW_SUFFIX_FORMAT: str = '{:0=3d}'
 DELIMITER: str = '[-|_| |\\.|~]?'
-PHOTO_FILE_EXTENSIONS: list[str] = ['jpg', 'jpeg', 'png', 'nef', 'gif', 'dng']
+PHOTO_FILE_EXTENSIONS: list[str] = ['jpg', 'jpeg', 'png', 'nef', 'gif', 'dng', 'heic', 'heif', 'avif']
 VIDEO_FILE_EXTENSIONS: list[str] = [
     '264', '3g2', '3gp', '3gp2', '3gpp', '3gpp2', '3mm', '3p2', '60d', '787', '89', 'aaf', 'aec', 'aep', 'aepx',
     'aet', 'aetx', 'ajp', 'ale', 'am', 'amc', 'amv', 'amx', 'anim', 'aqt', 'arcut', 'arf', 'asf', 'asx', 'avb',
@@ -34,10 +36,13 @@ VIDEO_FILE_EXTENSIONS: list[str] = [
     ]
 
 EXTENSIONS: list[str] = PHOTO_FILE_EXTENSIONS + VIDEO_FILE_EXTENSIONS
+# Lower case extensions for membership checks
+EXTENSION_SET: frozenset[str] = frozenset(EXTENSIONS)
+VIDEO_EXTENSION_SET: frozenset[str] = frozenset(VIDEO_FILE_EXTENSIONS)
 
-_ALL_EXTENSIONS: str = '|'.join(EXTENSIONS + [ext.upper() for ext in EXTENSIONS])
 REGEX_PARTS: dict[str, str] = {
-        'extension': f'\\.(?P<extension>{_ALL_EXTENSIONS})',
+        # Any last extension; match_acceptable and match_destination check it against EXTENSION_SET
+        'extension': '\\.(?P<extension>[^.]+)',
         'date': '((?P<year>[1-2][9|0]\\d{2})' + DELIMITER + '(?P<month>[0-1]\\d)' + DELIMITER + '(?P<day>[0-3]\\d))',
         'time_no_milli': '(?P<hour>[0-2]\\d)' + DELIMITER + '(?P<minute>\\d{2})' + DELIMITER + '(?P<second>\\d{2})',
         'time': '((?P<hour>[0-2]\\d)' + DELIMITER + '(?P<minute>\\d{2})' + DELIMITER + '(?P<second>\\d{2})' +
@@ -58,4 +63,30 @@ ACCEPTABLE_REGEXS: list[str] = [
 DESTINATION_REGEX: str = '^{date}_{time_no_milli}_{suffix}{extension}'.format(**REGEX_PARTS)
 DESTINATION_FORMAT_NO_SUFFIX_NO_EXTENSION: str = '{year}{month}{day}_{hour}{minute}{second}'
 DESTINATION_FORMAT_NO_SUFFIX: str = DESTINATION_FORMAT_NO_SUFFIX_NO_EXTENSION + '.{extension}'
-DESTINATION_FORMAT: str = DESTINATION_FORMAT_NO_SUFFIX_NO_EXTENSION + '{suffix}' + '{extension}'
\ No newline at end of file
+DESTINATION_FORMAT: str = DESTINATION_FORMAT_NO_SUFFIX_NO_EXTENSION + '{suffix}' + '{extension}'
+
+ACCEPTABLE_PATTERNS: list[re.Pattern] = [re.compile(regex) for regex in ACCEPTABLE_REGEXS]
+DATE_TAKEN_PATTERN: re.Pattern = re.compile(DATE_TAKEN_REGEX)
+DESTINATION_PATTERN: re.Pattern = re.compile(DESTINATION_REGEX)
+
+
+def has_media_extension(name: str) -> bool:
+    _, dot, extension = name.rpartition('.')
+    return bool(dot) and extension.lower() in EXTENSION_SET
+
+
+def _media_match(pattern: re.Pattern, name: str) -> re.Match | None:
+    match = pattern.match(name)
+    if match and match.group('extension').lower() in EXTENSION_SET:
+        return match
+    return None
+
+
+def match_acceptable(name: str, index: int = 0) -> re.Match | None:
+    ''' Match of ACCEPTABLE_REGEXS[index] on a media file name '''
+    return _media_match(ACCEPTABLE_PATTERNS[index], name)
+
+
+def match_destination(name: str) -> re.Match | None:
+    ''' Match of DESTINATION_REGEX on a media file name '''
+    return _media_match(DESTINATION_PATTERN, name)
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+METRIC_PREFIX = 'pictures_ingest'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class MetricsFile:
+    ''' Gauges of one run in the OpenMetrics text format.
+
+    Written for the node_exporter textfile collector, which reads the same files as the
+    Prometheus text format: # UNIT and # EOF lines are comments there.
+    '''
+
+    def __init__(self, prefix: str = METRIC_PREFIX) -> None:
+        self.prefix = prefix
+        self.lines: list[str] = []
+
+    def gauge(self, name: str, help_text: str, value: float | dict[str, float], label: str | None = None,
+              unit: str | None = None) -> None:
+        ''' A gauge with one sample, or one sample per label value when value is a dict '''
+        full_name = f'{self.prefix}_{name}'
+        self.lines.append(f'# TYPE {full_name} gauge')
+        if unit:
+            self.lines.append(f'# UNIT {full_name} {unit}')
+        self.lines.append(f'# HELP {full_name} {help_text}')
+        if isinstance(value, dict):
+            for label_value, sample in sorted(value.items()):
+                self.lines.append(f'{full_name}{{{label}="{_escape(label_value)}"}} {_format_value(sample)}')
+        else:
+            self.lines.append(f'{full_name} {_format_value(value)}')
+
+    def text(self) -> str:
+        return '\n'.join(self.lines + ['# EOF']) + '\n'
+
+    def write(self, path: str | Path) -> None:
+        ''' Replace path at once, so the collector never reads a partial file '''
+        path = Path(path)
+        tmp_path = path.with_name(f'.{path.name}.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(self.text())
+        os.replace(tmp_path, path)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import regex_patterns
+
+
+class SuffixAllocator:
+    ''' Next free destination suffix per YYYYMMDD_HHMMSS.ext key.
+
+    A new name takes the highest suffix known for its key plus one, '000' for a new key,
+    the same as scanning all destination and planned names of the key each time.
+    '''
+
+    def __init__(self) -> None:
+        self._next: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._next)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._next
+
+    def seed(self, key: str, suffix: str) -> None:
+        ''' Register an existing destination suffix of key. Non numeric suffixes never collide '''
+        if not suffix.isdigit():
+            return
+        value = int(suffix) + 1
+        if value > self._next.get(key, 0):
+            self._next[key] = value
+
+    def allocate(self, key: str) -> str:
+        value = self._next.get(key, 0)
+        self._next[key] = value + 1
+        return regex_patterns.NEW_SUFFIX_FORMAT.format(value)
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import walker
+from async_scan import AsyncScanner
+
+
+class TestAsyncScanner:
+
+    def test_walk_lists_every_child(self, tmp_path) -> None:
+        (tmp_path / 'a' / 'b').mkdir(parents=True)
+        (tmp_path / 'c').mkdir()
+        (tmp_path / 'a' / 'one.jpg').write_bytes(b'1')
+
+        def list_dir(folder: str) -> tuple[list[str], list[str]]:
+            dirs, files = walker.scan_dir(folder)
+            return [d.path for d in dirs], sorted(f.name for f in files)
+
+        scanner = AsyncScanner(4)
+        try:
+            listings = scanner.walk(tmp_path, list_dir)
+        finally:
+            scanner.close()
+        assert sorted(os.path.relpath(folder, tmp_path) for folder in listings) == \
+            ['.', 'a', os.path.join('a', 'b'), 'c']
+        assert listings[str(tmp_path / 'a')] == ['one.jpg']
+
+    def test_map_keeps_order_and_limits_in_flight(self) -> None:
+        lock = threading.Lock()
+        in_flight = []
+        running = 0
+
+        def call(value: int, offset: int) -> int:
+            nonlocal running
+            with lock:
+                running += 1
+                in_flight.append(running)
+            time.sleep(0.01 * (value % 3))
+            with lock:
+                running -= 1
+            return value + offset
+
+        scanner = AsyncScanner(3)
+        try:
+            assert scanner.map(call, range(20), [100] * 20) == [value + 100 for value in range(20)]
+        finally:
+            scanner.close()
+        assert max(in_flight) <= 3
+
+    def test_map_raises_call_error(self) -> None:
+        scanner = AsyncScanner(2)
+        try:
+            with pytest.raises(ZeroDivisionError):
+                scanner.map(lambda value: 1 / value, [1, 0, 2])
+        finally:
+            scanner.close()
+
+    def test_in_flight_must_be_positive(self) -> None:
+        with pytest.raises(ValueError):
+            AsyncScanner(0)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import os
+import struct
+import sys
+import pytest
+from datetime import datetime
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bmff
+import media_probe
+import metadata
+
+CREATION_TIME = 1600000000  # 2020-09-13 12:26:40 UTC
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def _mvhd(creation_time: int, version: int = 0) -> bytes:
+    mac_time = creation_time + bmff.MAC_EPOCH_OFFSET if creation_time else 0
+    if version == 1:
+        payload = struct.pack('>B3xQQIQ', 1, mac_time, mac_time, 1000, 0)
+    else:
+        payload = struct.pack('>B3xIIII', 0, mac_time, mac_time, 1000, 0)
+    return _box(b'mvhd', payload + b'\x00' * 80)
+
+
+def _ftyp() -> bytes:
+    return _box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2mp41')
+
+
+class TestReadCreationTime:
+
+    def test_moov_at_start(self) -> None:
+        data = _ftyp() + _box(b'moov', _mvhd(CREATION_TIME)) + _box(b'mdat', b'\x00' * 100)
+        assert bmff.read_video_creation_time(data) == CREATION_TIME
+
+    def test_mvhd_version_1(self) -> None:
+        data = _ftyp() + _box(b'moov', _box(b'udta', b'') + _mvhd(CREATION_TIME, version=1))
+        assert bmff.read_video_creation_time(data) == CREATION_TIME
+
+    def test_unset_creation_time(self) -> None:
+        data = _ftyp() + _box(b'moov', _mvhd(0))
+        assert bmff.read_video_creation_time(data) is None
+
+    def test_no_moov(self) -> None:
+        assert bmff.read_video_creation_time(_ftyp() + _box(b'mdat', b'\x00' * 10)) is None
+
+    def test_moov_at_end_of_large_file_reads_only_box_headers(self, tmp_path) -> None:
+        f = tmp_path / 'clip.mov'
+        mdat_size = 4 * 1024 ** 3
+        with open(f, 'wb') as out:
+            out.write(_ftyp())
+            out.write(struct.pack('>I4sQ', 1, b'mdat', mdat_size))
+            out.seek(len(_ftyp()) + mdat_size)
+            out.write(_box(b'moov', _mvhd(CREATION_TIME)))
+        header = media_probe.read_header(f)
+        source = media_probe.HeaderSource(f, header)
+        try:
+            assert bmff.read_creation_time(source) == CREATION_TIME
+        finally:
+            source.close()
+        assert source.bytes_read < 1024
+
+
+HEIF_DATE = '2022:03:04 05:06:07'
+
+
+def _exif_payload() -> bytes:
+    exif = Image.Exif()
+    exif.get_ifd(0x8769)[metadata.DATE_TIME_ORIGINAL_KEY] = HEIF_DATE
+    # Exif item: offset to the TIFF header, then 'Exif\0\0' and the TIFF structure
+    return struct.pack('>I', 6) + exif.tobytes()
+
+
+def _full_box(box_type: bytes, version: int, payload: bytes) -> bytes:
+    return _box(box_type, bytes([version, 0, 0, 0]) + payload)
+
+
+def _infe(item_id: int, item_type: bytes) -> bytes:
+    return _full_box(b'infe', 2, struct.pack('>HH4s', item_id, 0, item_type) + b'\x00')
+
+
+def _build_heic(use_idat: bool = False, with_exif: bool = True) -> bytes:
+    exif = _exif_payload()
+    items = [_infe(1, b'hvc1')] + ([_infe(2, b'Exif')] if with_exif else [])
+    iinf = _full_box(b'iinf', 0, struct.pack('>H', len(items)) + b''.join(items))
+    ftyp = _box(b'ftyp', b'heic\x00\x00\x00\x00mif1heic')
+
+    def build_meta(exif_offset: int) -> bytes:
+        if use_idat:
+            iloc = _full_box(b'iloc', 1, bytes([0x44, 0x00]) + struct.pack('>H', 1) +
+                             struct.pack('>HHHHII', 2, 1, 0, 1, 0, len(exif)))
+            return _full_box(b'meta', 0, iinf + iloc + _box(b'idat', exif))
+        iloc = _full_box(b'iloc', 0, bytes([0x44, 0x00]) + struct.pack('>H', 1) +
+                         struct.pack('>HHHII', 2, 0, 1, exif_offset, len(exif)))
+        return _full_box(b'meta', 0, iinf + iloc)
+
+    # Exif item stored in mdat after the meta box
+    meta_size = len(build_meta(0))
+    mdat = _box(b'mdat', b'\x00' * 32 + exif)
+    exif_offset = len(ftyp) + meta_size + 8 + 32
+    return ftyp + build_meta(exif_offset) + mdat
+
+
+class TestReadHeifDate:
+
+    def test_detected_as_heif(self) -> None:
+        assert media_probe.detect_type(_build_heic()) == media_probe.HEIF
+
+    def test_exif_item_in_mdat(self) -> None:
+        assert bmff.read_heif_exif_date(_build_heic()) == HEIF_DATE
+
+    def test_exif_item_in_idat(self) -> None:
+        assert bmff.read_heif_exif_date(_build_heic(use_idat=True)) == HEIF_DATE
+
+    def test_no_exif_item(self) -> None:
+        assert bmff.read_heif_exif_date(_build_heic(with_exif=False)) is None
+
+    def test_heic_photo_metadata(self, tmp_path) -> None:
+        f = tmp_path / 'IMG_0001.HEIC'
+        f.write_bytes(_build_heic())
+        date_props, status, _ = metadata.extract_metadata(f.name, str(f))
+        assert status == metadata.DATE_FROM_EXIF
+        assert date_props['year'] == '2022'
+        assert date_props['second'] == '07'
+
+
+class TestVideoMetadata:
+
+    def test_video_dated_by_creation_time(self, tmp_path) -> None:
+        f = tmp_path / 'VID_20300101_000000.mp4'
+        f.write_bytes(_ftyp() + _box(b'moov', _mvhd(CREATION_TIME)))
+        date_props, status, _ = metadata.extract_metadata(f.name, str(f))
+        expected = datetime.fromtimestamp(CREATION_TIME)
+        assert status == metadata.DATE_FROM_CONTAINER
+        assert date_props['year'] == str(expected.year)
+        assert date_props['minute'] == f'{expected.minute:02d}'
+
+    @pytest.mark.parametrize('leading', [b'', _box(b'wide', b''), _box(b'free', b'\x00' * 16)])
+    def test_quicktime_without_ftyp(self, tmp_path, leading: bytes) -> None:
+        f = tmp_path / 'MVI_0001.mov'
+        f.write_bytes(leading + _box(b'moov', _mvhd(CREATION_TIME)) + _box(b'mdat', b'\x00' * 100))
+        date_props, status, _ = metadata.extract_metadata(f.name, str(f))
+        assert status == metadata.DATE_FROM_CONTAINER
+        assert date_props['year'] == str(datetime.fromtimestamp(CREATION_TIME).year)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import os
+import json
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import catalog
+import utils
+
+
+ENTRIES = {
+    '20200101_120000_000.jpg': {'source_name': 'IMG_0001.jpg', 'size': 100},
+    '20210202_130000_000.jpg': {'source_name': 'IMG_0002.jpg', 'size': 200},
+}
+
+
+@pytest.fixture(params=[catalog.JSON_BACKEND, catalog.SQLITE_BACKEND])
+def filled_catalog(request, tmp_path):
+    db = catalog.open_catalog(tmp_path, request.param)
+    db.update(ENTRIES)
+    db.commit()
+    db.close()
+    db = catalog.open_catalog(tmp_path, request.param)
+    yield db
+    db.close()
+
+
+class TestCatalog:
+
+    def test_entries_persisted(self, filled_catalog) -> None:
+        assert len(filled_catalog) == 2
+        assert filled_catalog.to_dict() == ENTRIES
+        assert filled_catalog.get('20200101_120000_000.jpg') == ENTRIES['20200101_120000_000.jpg']
+        assert filled_catalog.get('missing.jpg') is None
+
+    def test_is_handled_name_matches_destination_and_source_names(self, filled_catalog) -> None:
+        assert filled_catalog.is_handled_name('20200101_120000_000.jpg')
+        assert filled_catalog.is_handled_name('IMG_0002.jpg')
+        assert not filled_catalog.is_handled_name('IMG_0003.jpg')
+
+    def test_delete(self, filled_catalog) -> None:
+        filled_catalog.delete('20200101_120000_000.jpg')
+        assert '20200101_120000_000.jpg' not in filled_catalog
+        assert not filled_catalog.is_handled_name('IMG_0001.jpg')
+        assert filled_catalog.names() == {'20210202_130000_000.jpg'}
+
+    def test_incomplete_backend_not_instantiable(self) -> None:
+        class ReadOnlyCatalog(catalog.Catalog):
+            def __len__(self) -> int:
+                return 0
+
+        with pytest.raises(TypeError):
+            ReadOnlyCatalog()
+
+
+class TestJsonCatalogJournal:
+
+    def test_commit_appends_to_journal_without_rewriting_db(self, tmp_path) -> None:
+        utils.save_db_files(ENTRIES, str(tmp_path))
+        base_text = (tmp_path / utils.DB_NAME).read_text()
+        db = catalog.JsonCatalog(tmp_path)
+        db.add('20220303_140000_000.jpg', {'source_name': 'IMG_0003.jpg', 'size': 300})
+        db.delete('20200101_120000_000.jpg')
+        db.commit()
+        assert (tmp_path / utils.DB_NAME).read_text() == base_text
+        assert len((tmp_path / f'{utils.DB_NAME}.journal').read_text().splitlines()) == 2
+        assert catalog.JsonCatalog(tmp_path).names() == {'20210202_130000_000.jpg', '20220303_140000_000.jpg'}
+
+    def test_compact_folds_journal(self, tmp_path) -> None:
+        db = catalog.JsonCatalog(tmp_path)
+        db.update(ENTRIES)
+        db.compact()
+        assert not (tmp_path / f'{utils.DB_NAME}.journal').exists()
+        assert json.loads((tmp_path / utils.DB_NAME).read_text()) == ENTRIES
+
+
+class TestOpenCatalog:
+
+    def test_json_by_default(self, tmp_path) -> None:
+        assert isinstance(catalog.open_catalog(tmp_path), catalog.JsonCatalog)
+
+    def test_sqlite_when_db_exists(self, tmp_path) -> None:
+        catalog.SqliteCatalog(tmp_path / utils.CATALOG_DB_NAME).close()
+        db = catalog.open_catalog(tmp_path)
+        assert isinstance(db, catalog.SqliteCatalog)
+        db.close()
+
+    def test_unknown_backend_raises(self, tmp_path) -> None:
+        with pytest.raises(ValueError):
+            catalog.open_catalog(tmp_path, 'csv')
+
+    def test_db_with_hash_column_still_opens(self, tmp_path) -> None:
+        import sqlite3
+        connection = sqlite3.connect(str(tmp_path / utils.CATALOG_DB_NAME))
+        connection.executescript('''
+            CREATE TABLE files (name TEXT PRIMARY KEY, source_name TEXT NOT NULL, size INTEGER NOT NULL, hash TEXT);
+            CREATE INDEX files_hash ON files (hash);
+        ''')
+        connection.close()
+        db = catalog.open_catalog(tmp_path)
+        db.update(ENTRIES)
+        db.commit()
+        assert db.to_dict() == ENTRIES
+        assert db.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_hash'").fetchone() is None
+        db.close()
+
+
+class TestImportExport:
+
+    def test_import_creates_db(self, tmp_path) -> None:
+        utils.save_db_files(ENTRIES, str(tmp_path))
+        assert catalog.import_json_catalog(str(tmp_path), dry_run=False, logger_func=lambda *a: None) == 2
+        db = catalog.SqliteCatalog(tmp_path / utils.CATALOG_DB_NAME)
+        assert db.to_dict() == ENTRIES
+        db.close()
+
+    def test_import_dry_run_creates_nothing(self, tmp_path) -> None:
+        utils.save_db_files(ENTRIES, str(tmp_path))
+        catalog.import_json_catalog(str(tmp_path), dry_run=True, logger_func=lambda *a: None)
+        assert not (tmp_path / utils.CATALOG_DB_NAME).exists()
+
+    def test_import_refuses_old_format(self, tmp_path) -> None:
+        (tmp_path / utils.DB_NAME).write_text(json.dumps({'/a/IMG_0001.jpg': '/b/20200101_120000_000.jpg'}))
+        assert catalog.import_json_catalog(str(tmp_path), dry_run=False, logger_func=lambda *a: None) == 0
+        assert not (tmp_path / utils.CATALOG_DB_NAME).exists()
+
+    def test_export_round_trip(self, tmp_path) -> None:
+        db = catalog.SqliteCatalog(tmp_path / utils.CATALOG_DB_NAME)
+        db.update(ENTRIES)
+        db.commit()
+        db.close()
+        assert catalog.export_json_catalog(str(tmp_path), dry_run=False, logger_func=lambda *a: None) == 2
+        assert utils.load_db_files(str(tmp_path)) == ENTRIES
+
+
+class TestUtilsWithSqliteCatalog:
+
+    def test_sync_removes_missing_entries(self, tmp_path) -> None:
+        (tmp_path / '20200101_120000_000.jpg').write_bytes(b'x' * 100)
+        db = catalog.SqliteCatalog(tmp_path / utils.CATALOG_DB_NAME)
+        db.update(ENTRIES)
+        db.commit()
+        db.close()
+        utils.sync_folder_and_db(str(tmp_path), recursive=False, dry_run=False, logger_func=lambda *a: None)
+        db = catalog.open_catalog(tmp_path)
+        assert db.names() == {'20200101_120000_000.jpg'}
+        db.close()
+        assert not (tmp_path / utils.DB_NAME).exists()
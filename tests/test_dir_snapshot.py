@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import os
+import json
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import dir_snapshot
+
+
+@pytest.fixture
+def no_racy_window(monkeypatch) -> None:
+    monkeypatch.setattr(dir_snapshot, 'RACY_MTIME_NS', 0)
+
+
+def _tree(root) -> None:
+    (root / '2020' / '01').mkdir(parents=True)
+    (root / '2020' / '01' / '20200101_120000_000.jpg').write_bytes(b'12345')
+    (root / '2021').mkdir()
+    (root / '2021' / '20210101_120000_000.jpg').write_bytes(b'123')
+
+
+def _scan_all(snapshot: dir_snapshot.DirectorySnapshot, folder) -> dict:
+    dirs, files = snapshot.scan(folder)
+    result = {str(folder): sorted(files)}
+    for d in dirs:
+        result.update(_scan_all(snapshot, folder / d))
+    return result
+
+
+class TestDirectorySnapshot:
+
+    def test_unchanged_dirs_served_from_snapshot(self, tmp_path, no_racy_window) -> None:
+        _tree(tmp_path)
+        first = dir_snapshot.DirectorySnapshot(tmp_path)
+        listing = _scan_all(first, tmp_path)
+        first.save()
+        assert first.listed_dirs == 4
+
+        second = dir_snapshot.DirectorySnapshot(tmp_path)
+        second.load()
+        listing_again = _scan_all(second, tmp_path)
+        snapshot_size = first.snapshot_path.stat().st_size
+        assert listing_again.pop(str(tmp_path)) == [(dir_snapshot.DIR_SNAPSHOT_NAME, snapshot_size)]
+        listing.pop(str(tmp_path))
+        assert listing_again == listing
+        # The root changed when the snapshot itself was written
+        assert second.listed_dirs == 1
+        assert second.cached_dirs == 3
+
+    def test_changed_dir_listed_again(self, tmp_path, no_racy_window) -> None:
+        _tree(tmp_path)
+        first = dir_snapshot.DirectorySnapshot(tmp_path)
+        _scan_all(first, tmp_path)
+        first.save()
+        new_file = tmp_path / '2021' / '20210202_120000_000.jpg'
+        new_file.write_bytes(b'1')
+        stat = (tmp_path / '2021').stat()
+        os.utime(tmp_path / '2021', ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        second = dir_snapshot.DirectorySnapshot(tmp_path)
+        second.load()
+        listing = _scan_all(second, tmp_path)
+        assert ('20210202_120000_000.jpg', 1) in listing[str(tmp_path / '2021')]
+        assert second.cached_dirs == 2
+
+    def test_removed_dirs_dropped_on_save(self, tmp_path, no_racy_window) -> None:
+        _tree(tmp_path)
+        first = dir_snapshot.DirectorySnapshot(tmp_path)
+        _scan_all(first, tmp_path)
+        first.save()
+        (tmp_path / '2021' / '20210101_120000_000.jpg').unlink()
+        (tmp_path / '2021').rmdir()
+
+        second = dir_snapshot.DirectorySnapshot(tmp_path)
+        second.load()
+        _scan_all(second, tmp_path)
+        second.save()
+        saved = json.loads((tmp_path / dir_snapshot.DIR_SNAPSHOT_NAME).read_text())
+        assert sorted(saved) == ['.', '2020', os.path.join('2020', '01')]
+
+    def test_recently_modified_dir_not_trusted(self, tmp_path) -> None:
+        _tree(tmp_path)
+        first = dir_snapshot.DirectorySnapshot(tmp_path)
+        _scan_all(first, tmp_path)
+        first.save()
+        second = dir_snapshot.DirectorySnapshot(tmp_path)
+        second.load()
+        _scan_all(second, tmp_path)
+        assert second.cached_dirs == 0
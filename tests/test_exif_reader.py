@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import os
+import struct
+import sys
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import exif_reader
+import media_probe
+
+DATE = '2018:01:02 03:04:05'
+
+
+def _build_tiff(endian: str = '<', date: str | None = DATE, in_exif_ifd: bool = True,
+                padding: int = 0) -> bytes:
+    ''' Minimal TIFF: IFD0 (optionally pointing to an Exif IFD placed after padding bytes) '''
+    order = b'II' if endian == '<' else b'MM'
+    date_bytes = date.encode() + b'\x00' if date else b''
+    ifd0_offset = 8
+    ifd0_entries = 1
+    ifd0_size = 2 + 12 * ifd0_entries + 4
+    exif_offset = ifd0_offset + ifd0_size + padding
+    exif_size = 2 + 12 + 4
+    date_offset = exif_offset + exif_size if in_exif_ifd else ifd0_offset + ifd0_size
+    data = order + struct.pack(endian + 'HI', 42, ifd0_offset)
+    if in_exif_ifd:
+        data += struct.pack(endian + 'H', 1)
+        data += struct.pack(endian + 'HHII', exif_reader.EXIF_IFD_POINTER_TAG, 4, 1, exif_offset)
+        data += struct.pack(endian + 'I', 0) + b'\x00' * padding
+        data += struct.pack(endian + 'H', 1)
+    else:
+        data += struct.pack(endian + 'H', 1)
+    data += struct.pack(endian + 'HHII', exif_reader.DATE_TIME_ORIGINAL_TAG, exif_reader.ASCII_TYPE,
+                        len(date_bytes), date_offset)
+    data += struct.pack(endian + 'I', 0)
+    return data + date_bytes
+
+
+class TestReadTiffDate:
+
+    @pytest.mark.parametrize('endian', ['<', '>'])
+    def test_date_in_exif_ifd(self, endian: str) -> None:
+        assert exif_reader.read_tiff_date(_build_tiff(endian)) == DATE
+
+    def test_date_in_ifd0(self) -> None:
+        assert exif_reader.read_tiff_date(_build_tiff(in_exif_ifd=False)) == DATE
+
+    def test_pillow_tiff_with_date_in_ifd0(self, tmp_path) -> None:
+        f = tmp_path / 'raw.nef'
+        Image.new('RGB', (8, 8)).save(str(f), format='TIFF', tiffinfo={exif_reader.DATE_TIME_ORIGINAL_TAG: DATE})
+        data = f.read_bytes()
+        assert exif_reader.read_tiff_date(data) == DATE
+
+    def test_exif_ifd_beyond_header_read_from_file(self, tmp_path) -> None:
+        f = tmp_path / 'raw.dng'
+        data = _build_tiff(padding=100000)
+        f.write_bytes(data)
+        assert exif_reader.read_tiff_date(data[:1024], f) == DATE
+
+    def test_beyond_header_without_file_raises(self) -> None:
+        data = _build_tiff(padding=100000)
+        with pytest.raises(media_probe.ProbeError):
+            exif_reader.read_tiff_date(data[:1024])
+
+    def test_no_date(self) -> None:
+        assert exif_reader.read_tiff_date(_build_tiff(date=None)) is None
+
+    def test_invalid_byte_order_raises(self) -> None:
+        with pytest.raises(exif_reader.ExifError):
+            exif_reader.read_tiff_date(b'XX*\x00\x08\x00\x00\x00')
+
+    def test_oversized_ascii_value_raises(self) -> None:
+        with pytest.raises(exif_reader.ExifError):
+            exif_reader.read_tiff_date(_build_tiff(date='9' * 1000))
+
+
+class TestReadJpegDate:
+
+    def test_date_from_app1(self, tmp_path) -> None:
+        f = tmp_path / 'photo.jpg'
+        exif = Image.Exif()
+        exif.get_ifd(exif_reader.EXIF_IFD_POINTER_TAG)[exif_reader.DATE_TIME_ORIGINAL_TAG] = DATE
+        Image.new('RGB', (8, 8)).save(str(f), exif=exif)
+        assert exif_reader.read_jpeg_date(f.read_bytes()[:4096]) == DATE
+
+    def test_jpeg_without_exif(self, tmp_path) -> None:
+        f = tmp_path / 'photo.jpg'
+        Image.new('RGB', (8, 8)).save(str(f))
+        assert exif_reader.read_jpeg_date(f.read_bytes()) is None
+
+    def test_exif_after_other_segments(self) -> None:
+        tiff = _build_tiff()
+        app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00' + b'\x00' * 9
+        app1 = b'\xff\xe1' + struct.pack('>H', 8 + len(tiff)) + b'Exif\x00\x00' + tiff
+        data = b'\xff\xd8' + app0 + app1 + b'\xff\xda'
+        assert exif_reader.read_jpeg_date(data) == DATE
+
+    def test_not_jpeg_raises(self) -> None:
+        with pytest.raises(exif_reader.ExifError):
+            exif_reader.read_jpeg_date(b'\x89PNG\r\n\x1a\n')
+
+
+class TestReadPngDate:
+
+    def test_date_from_exif_chunk(self, tmp_path) -> None:
+        f = tmp_path / 'screenshot.png'
+        exif = Image.Exif()
+        exif.get_ifd(exif_reader.EXIF_IFD_POINTER_TAG)[exif_reader.DATE_TIME_ORIGINAL_TAG] = DATE
+        Image.new('RGB', (8, 8)).save(str(f), exif=exif.tobytes())
+        assert exif_reader.read_png_date(f.read_bytes()) == DATE
+
+    def test_exif_chunk_with_app1_signature(self) -> None:
+        tiff = b'Exif\x00\x00' + _build_tiff()
+        ihdr = struct.pack('>I4s', 13, b'IHDR') + b'\x00' * 17
+        exif = struct.pack('>I4s', len(tiff), b'eXIf') + tiff + b'\x00' * 4
+        assert exif_reader.read_png_date(b'\x89PNG\r\n\x1a\n' + ihdr + exif) == DATE
+
+    def test_image_data_not_read(self, tmp_path) -> None:
+        f = tmp_path / 'screenshot.png'
+        Image.frombytes('RGB', (256, 256), os.urandom(256 * 256 * 3)).save(str(f))
+        header = f.read_bytes()[:64]
+        assert exif_reader.read_png_date(header) is None
+
+    def test_not_png_raises(self) -> None:
+        with pytest.raises(exif_reader.ExifError):
+            exif_reader.read_png_date(b'\xff\xd8\xff\xe0' + b'\x00' * 16)
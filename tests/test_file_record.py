@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import regex_patterns
+from file_record import FileRecord
+
+
+class TestFileRecord:
+
+    def test_destination_match(self) -> None:
+        name = '20200102_030405_001.JPG'
+        match = re.match(regex_patterns.DESTINATION_REGEX, name)
+        record = FileRecord.from_match('/dst/2020', name, 10, match.groupdict())
+        assert (record.year, record.month, record.day, record.hour, record.minute, record.second) == \
+            (2020, 1, 2, 3, 4, 5)
+        assert record.suffix == '001'
+        assert record.key() == '20200102_030405.JPG'
+        assert record.fullpath == os.path.join('/dst/2020', name)
+
+    def test_source_file_extension_lowered_and_dated(self) -> None:
+        record = FileRecord('/src', 'IMG_1.JPG', 5)
+        assert record.extension == 'jpg'
+        assert record.year is None
+        record.set_date({'year': '2021', 'month': '12', 'day': '31', 'hour': '23', 'minute': '59', 'second': '58'})
+        assert record.date_name() == '20211231_235958'
+
+    def test_unknown_date_fields_formatted_as_00(self) -> None:
+        record = FileRecord('/src', 'a.jpg', 1, year=2020, month=1, day=1)
+        assert record.key() == '20200101_000000.jpg'
+
+    def test_folders_and_years_shared(self) -> None:
+        first = FileRecord(os.path.join('/src', 'a'), 'a.jpg', 1, year='2020')
+        second = FileRecord(os.path.join('/src', 'a'), 'b.jpg', 1, year='2020')
+        assert first.folder is second.folder
+        assert first.year is second.year
+
+    def test_equality_and_no_dict(self) -> None:
+        assert FileRecord('/src', 'a.jpg', 1, year=2020) == FileRecord('/src', 'a.jpg', 1, year='2020')
+        assert FileRecord('/src', 'a.jpg', 1) != FileRecord('/src', 'a.jpg', 2)
+        assert not hasattr(FileRecord('/src', 'a.jpg', 1), '__dict__')
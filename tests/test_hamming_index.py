@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import os
+import random
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import hamming_index
+from hamming_index import HammingIndex
+
+
+def _hashes(count: int, seed: int = 0) -> list[int]:
+    ''' Random hashes, every fourth one a copy of an earlier hash with up to 12 flipped bits '''
+    rng = random.Random(seed)
+    hashes: list[int] = []
+    for i in range(count):
+        if i % 4 == 3:
+            flipped = sum(1 << bit for bit in rng.sample(range(64), rng.randrange(13)))
+            hashes.append(hashes[rng.randrange(i)] ^ flipped)
+        else:
+            hashes.append(rng.getrandbits(64))
+    return hashes
+
+
+def _brute_force(hashes: list[int], value: int, max_distance: int) -> list[tuple[int, int]]:
+    return [(i, (h ^ value).bit_count()) for i, h in enumerate(hashes) if (h ^ value).bit_count() <= max_distance]
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def no_scan(request):
+    ''' Index lookups even for small indexes, with and without NumPy '''
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+        with patch.object(hamming_index, 'SCAN_MAX_SIZE', 0):
+            yield
+    else:
+        with patch.object(hamming_index, 'numpy', None):
+            yield
+
+
+class TestHammingIndex:
+
+    @pytest.mark.parametrize('chunks', [2, 3, 4, 5])
+    @pytest.mark.parametrize('max_distance', [0, 4, 10, 16])
+    def test_query_matches_brute_force(self, no_scan, chunks: int, max_distance: int) -> None:
+        hashes = _hashes(1000)
+        index = HammingIndex(chunks)
+        for value in hashes:
+            index.add(value)
+        for value in hashes[:40]:
+            assert index.query(value, max_distance) == _brute_force(hashes, value, max_distance)
+            assert {i for i, _ in _brute_force(hashes, value, max_distance)} <= set(
+                index.candidates(value, max_distance))
+
+    def test_small_radius_scores_few_candidates(self, no_scan) -> None:
+        index = HammingIndex()
+        for value in _hashes(5000):
+            index.add(value)
+        index.query(0, 10)
+        assert 0 < len(index) == 5000
+        assert index.scored < 500
+
+    def test_hashes_added_after_a_query(self, no_scan) -> None:
+        index = HammingIndex()
+        index.add(0)
+        assert index.query(1, 2) == [(0, 1)]
+        index.add(3)
+        assert index.query(1, 2) == [(0, 1), (1, 1)]
+
+    def test_small_index_scanned_with_numpy(self) -> None:
+        pytest.importorskip('numpy')
+        hashes = _hashes(300)
+        index = HammingIndex()
+        for value in hashes:
+            index.add(value)
+        assert index.query(hashes[5], 10) == _brute_force(hashes, hashes[5], 10)
+        assert index.scored == 300
+
+    def test_chunks_for(self) -> None:
+        assert hamming_index.chunks_for(1_000_000, 10) == 4
+        assert hamming_index.chunks_for(1_000_000, 0) == hamming_index.MIN_CHUNKS
+        # Radius per chunk of at most MAX_CHUNK_RADIUS
+        assert hamming_index.chunks_for(1_000_000, 30) == 8
+
+    def test_large_radius_scores_every_hash(self) -> None:
+        index = HammingIndex()
+        for value in _hashes(100):
+            index.add(value)
+        assert index.candidates(0, 4 * (hamming_index.MAX_CHUNK_RADIUS + 1)) == list(range(100))
+
+    def test_flip_masks(self) -> None:
+        assert hamming_index._flip_masks(4, 1) == (0, 1, 2, 4, 8)
+        assert len(hamming_index._flip_masks(16, 2)) == 1 + 16 + 120
+
+
+class TestDistances:
+
+    def test_small_and_batch_agree(self) -> None:
+        hashes = _hashes(500)
+        expected = [(hashes[0] ^ h).bit_count() for h in hashes]
+        assert hamming_index.distances(hashes[0], hashes) == expected
+        assert hamming_index.distances(hashes[0], hashes[:10]) == expected[:10]
+
+    def test_byte_table_without_bitwise_count(self) -> None:
+        numpy = pytest.importorskip('numpy')
+        old_numpy = SimpleNamespace(array=numpy.array, ndarray=numpy.ndarray, uint8=numpy.uint8, uint64=numpy.uint64)
+        hashes = _hashes(200) + [2 ** 64 - 1]
+        with patch.object(hamming_index, 'numpy', old_numpy):
+            assert hamming_index.distances(0, hashes) == [h.bit_count() for h in hashes]
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import os
+import json
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import hash_index
+
+
+class TestHashFile:
+
+    def test_identical_content_same_hash(self, tmp_path) -> None:
+        f1 = tmp_path / 'a.jpg'
+        f2 = tmp_path / 'b.jpg'
+        f1.write_bytes(b'same bytes')
+        f2.write_bytes(b'same bytes')
+        assert hash_index.hash_file(f1) == hash_index.hash_file(f2)
+
+    def test_different_content_different_hash(self, tmp_path) -> None:
+        f1 = tmp_path / 'a.jpg'
+        f2 = tmp_path / 'b.jpg'
+        f1.write_bytes(b'bytes one')
+        f2.write_bytes(b'bytes two')
+        assert hash_index.hash_file(f1) != hash_index.hash_file(f2)
+
+
+class TestHashIndex:
+
+    def test_pending_files_hashed_on_first_find(self, tmp_path) -> None:
+        existing = tmp_path / '20200101_000000_000.jpg'
+        existing.write_bytes(b'content')
+        index = hash_index.HashIndex(tmp_path)
+        index.register(str(existing), 7, existing.name)
+        digest = hash_index.hash_file(existing)
+        assert index.find(7, digest) == [str(existing)]
+        assert index.hashed_files == 1
+        assert index.entries[existing.name] == {'size': 7, 'mtime_ns': existing.stat().st_mtime_ns, 'hash': digest}
+
+    def test_stored_hash_reused_without_reading(self, tmp_path) -> None:
+        existing = tmp_path / '20200101_000000_000.jpg'
+        existing.write_bytes(b'content')
+        digest = hash_index.hash_file(existing)
+        (tmp_path / hash_index.HASH_INDEX_NAME).write_text(
+            json.dumps({existing.name: {'size': 7, 'mtime_ns': existing.stat().st_mtime_ns, 'hash': digest}}))
+        index = hash_index.HashIndex(tmp_path)
+        index.load()
+        index.register(str(existing), 7, existing.name)
+        with patch.object(hash_index, 'hash_file') as mock_hash:
+            assert index.find(7, digest) == [str(existing)]
+            mock_hash.assert_not_called()
+
+    def test_stale_entry_rehashed_when_size_changes(self, tmp_path) -> None:
+        existing = tmp_path / '20200101_000000_000.jpg'
+        existing.write_bytes(b'new content')
+        (tmp_path / hash_index.HASH_INDEX_NAME).write_text(
+            json.dumps({existing.name: {'size': 7, 'hash': 'stale'}}))
+        index = hash_index.HashIndex(tmp_path)
+        index.load()
+        index.register(str(existing), 11, existing.name)
+        assert index.find(7, 'stale') == []
+        assert index.find(11, hash_index.hash_file(existing)) == [str(existing)]
+
+    def test_entry_rehashed_when_rewritten_with_same_size(self, tmp_path) -> None:
+        existing = tmp_path / '20200101_000000_000.jpg'
+        existing.write_bytes(b'old content')
+        old_digest = hash_index.hash_file(existing)
+        (tmp_path / hash_index.HASH_INDEX_NAME).write_text(
+            json.dumps({existing.name: {'size': 11, 'mtime_ns': existing.stat().st_mtime_ns, 'hash': old_digest}}))
+        existing.write_bytes(b'new content')
+        os.utime(existing, ns=(existing.stat().st_atime_ns, existing.stat().st_mtime_ns + 1_000_000_000))
+        index = hash_index.HashIndex(tmp_path)
+        index.load()
+        index.register(str(existing), 11, existing.name)
+        assert index.find(11, old_digest) == []
+        assert index.entries[existing.name]['hash'] == hash_index.hash_file(existing)
+
+    def test_entry_without_mtime_rehashed(self, tmp_path) -> None:
+        existing = tmp_path / '20200101_000000_000.jpg'
+        existing.write_bytes(b'new content')
+        (tmp_path / hash_index.HASH_INDEX_NAME).write_text(
+            json.dumps({existing.name: {'size': 11, 'hash': 'stale'}}))
+        index = hash_index.HashIndex(tmp_path)
+        index.load()
+        index.register(str(existing), 11, existing.name)
+        assert index.find(11, 'stale') == []
+        assert index.hashed_files == 1
+
+    def test_unnamed_files_not_persisted(self, tmp_path) -> None:
+        index = hash_index.HashIndex(tmp_path)
+        index.add('/src/IMG_0001.jpg', 5, 'abc')
+        assert index.find(5, 'abc') == ['/src/IMG_0001.jpg']
+        assert index.entries == {}
+
+    def test_save_and_load_roundtrip(self, tmp_path) -> None:
+        existing = tmp_path / '20200101_000000_000.jpg'
+        existing.write_bytes(b'12345')
+        index = hash_index.HashIndex(tmp_path)
+        index.record(existing.name, str(existing), 5, 'abc')
+        index.save()
+        reloaded = hash_index.HashIndex(tmp_path)
+        reloaded.load()
+        assert reloaded.entries == {existing.name: {'size': 5, 'mtime_ns': existing.stat().st_mtime_ns, 'hash': 'abc'}}
+
+    def test_save_drops_files_not_registered(self, tmp_path) -> None:
+        existing = tmp_path / '20200101_000000_000.jpg'
+        existing.write_bytes(b'content')
+        (tmp_path / hash_index.HASH_INDEX_NAME).write_text(json.dumps({
+            existing.name: {'size': 7, 'mtime_ns': 1, 'hash': 'a'},
+            '20200101_000000_001.jpg': {'size': 7, 'mtime_ns': 1, 'hash': 'b'}}))
+        index = hash_index.HashIndex(tmp_path)
+        index.load()
+        index.register(str(existing), 7, existing.name)
+        index.save(prune=False)
+        assert len(index.entries) == 2
+        index.save()
+        reloaded = hash_index.HashIndex(tmp_path)
+        reloaded.load()
+        assert list(reloaded.entries) == [existing.name]
+
+    def test_save_without_changes_writes_nothing(self, tmp_path) -> None:
+        index = hash_index.HashIndex(tmp_path)
+        index.save()
+        assert not (tmp_path / hash_index.HASH_INDEX_NAME).exists()
+
+    def test_move_keeps_moved_file_comparable(self, tmp_path) -> None:
+        src = tmp_path / 'IMG_0001.jpg'
+        src.write_bytes(b'content')
+        index = hash_index.HashIndex(tmp_path)
+        index.register(str(src), 7)
+        moved = tmp_path / '20200101_000000_000.jpg'
+        src.rename(moved)
+        index.move(str(src), str(moved), 7, moved.name)
+        digest = hash_index.hash_file(moved)
+        assert index.find(7, digest) == [str(moved)]
+        assert index.entries[moved.name] == {'size': 7, 'mtime_ns': moved.stat().st_mtime_ns, 'hash': digest}
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import ingest_plan
+
+
+class TestIngestPlan:
+
+    def test_round_trip(self, tmp_path) -> None:
+        source = tmp_path / 'a.jpg'
+        source.write_bytes(b'data')
+        entry = ingest_plan.file_entry(str(source), 4, source.stat().st_mtime_ns, new_name='20200101_000000_000.jpg')
+        assert entry['size'] == 4
+        plan_path = tmp_path / 'plan.json'
+        ingest_plan.write_plan(plan_path, ingest_plan.make_plan(tmp_path, tmp_path / 'dst', [entry], []))
+        plan = ingest_plan.load_plan(plan_path)
+        assert plan['files'] == [entry]
+        assert plan['dst'] == str(tmp_path / 'dst')
+
+    def test_unsupported_version(self, tmp_path) -> None:
+        plan_path = tmp_path / 'plan.json'
+        plan_path.write_text(json.dumps({'version': 99, 'files': [], 'rejected': []}))
+        with pytest.raises(ValueError):
+            ingest_plan.load_plan(plan_path)
+
+    def test_stale_reason(self, tmp_path) -> None:
+        source = tmp_path / 'a.jpg'
+        source.write_bytes(b'data')
+        entry = ingest_plan.file_entry(str(source), 4, source.stat().st_mtime_ns)
+        assert ingest_plan.stale_reason(entry) is None
+        source.write_bytes(b'changed')
+        assert 'Changed' in ingest_plan.stale_reason(entry)
+        source.unlink()
+        assert 'FileNotFoundError' in ingest_plan.stale_reason(entry)
+
+    def test_checkpoint(self, tmp_path) -> None:
+        plan = ingest_plan.make_plan(tmp_path, tmp_path, [], [])
+        assert not ingest_plan.has_checkpoint(tmp_path)
+        ingest_plan.write_checkpoint(tmp_path, plan)
+        assert ingest_plan.load_checkpoint(tmp_path) == (plan, 0)
+        ingest_plan.write_progress(tmp_path, 7)
+        assert ingest_plan.read_progress(tmp_path) == 7
+        (tmp_path / ingest_plan.CHECKPOINT_PROGRESS_NAME).write_text('{"do')
+        assert ingest_plan.read_progress(tmp_path) == 0
+        ingest_plan.remove_checkpoint(tmp_path)
+        assert not ingest_plan.has_checkpoint(tmp_path)
+        assert not (tmp_path / ingest_plan.CHECKPOINT_PROGRESS_NAME).exists()
+
+    def test_was_moved(self, tmp_path) -> None:
+        source = tmp_path / 'a.jpg'
+        source.write_bytes(b'data')
+        entry = ingest_plan.file_entry(str(source), 4, source.stat().st_mtime_ns, target=str(tmp_path / 'b.jpg'))
+        assert not ingest_plan.was_moved(entry)
+        source.rename(tmp_path / 'b.jpg')
+        assert ingest_plan.was_moved(entry)
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import os
+import sys
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import media_probe
+
+
+class TestDetectType:
+
+    @pytest.mark.parametrize('header, expected', [
+        (b'\xff\xd8\xff\xe1\x00\x10Exif', media_probe.JPEG),
+        (b'\x89PNG\r\n\x1a\n\x00\x00', media_probe.PNG),
+        (b'GIF89a\x01\x00', media_probe.GIF),
+        (b'II*\x00\x08\x00\x00\x00', media_probe.TIFF),
+        (b'MM\x00*\x00\x00\x00\x08', media_probe.TIFF),
+        (b'\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00', media_probe.ISO_BMFF),
+        (b'\x00\x00\x00\x08wide\x00\x00\x10\x00mdat', media_probe.ISO_BMFF),
+        (b'\x00\x00\x01\x00moov\x00\x00\x00\x6cmvhd', media_probe.ISO_BMFF),
+        (b'RIFF\x00\x00\x00\x00WEBPVP8 ', media_probe.WEBP),
+        (b'RIFF\x00\x00\x00\x00AVI LIST', media_probe.RIFF_AVI),
+        (b'\x1a\x45\xdf\xa3\x01\x00', media_probe.MATROSKA),
+        (b'\x00\x00\x01\xba\x44\x00', media_probe.MPEG_PS),
+        (b'FLV\x01\x05', media_probe.FLV),
+        (b'plain text', None),
+        (b'', None),
+    ])
+    def test_magic_bytes(self, header: bytes, expected: str | None) -> None:
+        assert media_probe.detect_type(header) == expected
+
+    def test_mpeg_ts_needs_second_sync_byte(self) -> None:
+        packet = b'\x47' + b'\x00' * 187
+        assert media_probe.detect_type(packet * 2) == media_probe.MPEG_TS
+        assert media_probe.detect_type(packet) is None
+
+    @pytest.mark.parametrize('image_format, expected', [
+        ('JPEG', media_probe.JPEG), ('PNG', media_probe.PNG), ('GIF', media_probe.GIF),
+        ('TIFF', media_probe.TIFF), ('BMP', media_probe.BMP), ('WEBP', media_probe.WEBP),
+    ])
+    def test_pillow_written_images(self, tmp_path, image_format: str, expected: str) -> None:
+        f = tmp_path / 'image'
+        Image.new('RGB', (4, 4)).save(str(f), format=image_format)
+        assert media_probe.detect_type(media_probe.read_header(f)) == expected
+
+
+class TestReadHeader:
+
+    def test_reads_at_most_probe_size(self, tmp_path) -> None:
+        f = tmp_path / 'big.mp4'
+        f.write_bytes(b'\x00' * (media_probe.PROBE_SIZE + 100))
+        assert len(media_probe.read_header(f)) == media_probe.PROBE_SIZE
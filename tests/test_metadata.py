@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import os
+import sys
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import metadata
+
+
+def _create_exif_image(path: Path, date_taken: str | None = '2019:05:04 03:02:01') -> None:
+    img = Image.new('RGB', (8, 8), color='red')
+    exif = Image.Exif()
+    if date_taken:
+        exif.get_ifd(0x8769)[metadata.DATE_TIME_ORIGINAL_KEY] = date_taken
+    img.save(str(path), exif=exif)
+
+
+class TestExtractMetadata:
+
+    def test_exif_date_taken(self, tmp_path) -> None:
+        f = tmp_path / 'IMG_0001.jpg'
+        _create_exif_image(f)
+        date_props, status, _ = metadata.extract_metadata(f.name, str(f))
+        assert status == metadata.DATE_FROM_EXIF
+        assert date_props == {'year': '2019', 'month': '05', 'day': '04',
+                              'hour': '03', 'minute': '02', 'second': '01'}
+
+    def test_image_without_exif_uses_min_date(self, tmp_path) -> None:
+        f = tmp_path / 'IMG_0001.png'
+        Image.new('RGB', (8, 8)).save(str(f))
+        date_props, status, _ = metadata.extract_metadata(f.name, str(f))
+        assert status == metadata.DATE_FROM_MIN
+        assert set(date_props) == {'year', 'month', 'day', 'hour', 'minute', 'second'}
+
+    def test_min_date_prefers_earlier_date_from_name(self, tmp_path) -> None:
+        f = tmp_path / 'VID_20100102_030405.mp4'
+        f.write_bytes(b'\x00' * 16)
+        date_props, status, _ = metadata.extract_metadata(f.name, str(f))
+        assert status == metadata.DATE_FROM_MIN
+        assert date_props['year'] == '2010'
+        assert date_props['second'] == '05'
+
+    def test_unparseable_exif_date(self, tmp_path) -> None:
+        f = tmp_path / 'IMG_0001.jpg'
+        _create_exif_image(f, '0000:00:00 00:00:00')
+        date_props, status, messages = metadata.extract_metadata(f.name, str(f))
+        assert status == metadata.UNSUPPORTED_DATE
+        assert date_props is None
+        assert messages
+
+    def test_unsupported_file(self, tmp_path) -> None:
+        f = tmp_path / 'notes.txt'
+        f.write_text('text')
+        assert metadata.extract_metadata(f.name, str(f)) == (None, metadata.UNSUPPORTED, [])
+
+    def test_video_does_not_invoke_pillow(self, tmp_path) -> None:
+        f = tmp_path / 'clip.mp4'
+        f.write_bytes(b'\x00\x00\x00\x18ftypmp42' + b'\x00' * 64)
+        with patch.object(metadata.Image, 'open') as mock_open:
+            _, status, _ = metadata.extract_metadata(f.name, str(f))
+        mock_open.assert_not_called()
+        assert status == metadata.DATE_FROM_MIN
+
+    def test_jpeg_date_read_without_pillow(self, tmp_path) -> None:
+        f = tmp_path / 'IMG_0001.jpg'
+        _create_exif_image(f)
+        with patch.object(metadata.Image, 'open') as mock_open:
+            date_props, status, _ = metadata.extract_metadata(f.name, str(f))
+        mock_open.assert_not_called()
+        assert status == metadata.DATE_FROM_EXIF
+        assert date_props['year'] == '2019'
+
+    def test_png_date_read_without_pillow(self, tmp_path) -> None:
+        f = tmp_path / 'Screenshot_0001.png'
+        exif = Image.Exif()
+        exif.get_ifd(0x8769)[metadata.DATE_TIME_ORIGINAL_KEY] = '2019:05:04 03:02:01'
+        Image.new('RGB', (8, 8)).save(str(f), exif=exif.tobytes())
+        with patch.object(metadata.Image, 'open') as mock_open:
+            date_props, status, _ = metadata.extract_metadata(f.name, str(f))
+        mock_open.assert_not_called()
+        assert status == metadata.DATE_FROM_EXIF
+        assert date_props['year'] == '2019'
+
+    @pytest.mark.parametrize('extension', ['jpg', 'png', 'tif'])
+    def test_photo_read_with_one_open(self, tmp_path, extension: str) -> None:
+        f = tmp_path / f'IMG_0001.{extension}'
+        exif = Image.Exif()
+        exif.get_ifd(0x8769)[metadata.DATE_TIME_ORIGINAL_KEY] = '2019:05:04 03:02:01'
+        Image.new('RGB', (64, 64)).save(str(f), exif=exif.tobytes())
+        with patch('builtins.open', wraps=open) as mock_open:
+            _, status, _ = metadata.extract_metadata(f.name, str(f), 0.0)
+        assert mock_open.call_count == 1
+        assert status == metadata.DATE_FROM_EXIF
+
+    def test_unparseable_exif_falls_back_to_pillow(self, tmp_path) -> None:
+        f = tmp_path / 'IMG_0001.jpg'
+        _create_exif_image(f)
+        with patch.object(metadata.exif_reader, 'read_jpeg_date',
+                          side_effect=metadata.exif_reader.ExifError('broken')):
+            date_props, status, _ = metadata.extract_metadata(f.name, str(f))
+        assert status == metadata.DATE_FROM_EXIF
+        assert date_props['month'] == '05'
+
+
+class TestIsImage:
+
+    def test_image_and_other_file(self, tmp_path) -> None:
+        image = tmp_path / 'IMG_0001.jpg'
+        Image.new('RGB', (8, 8)).save(str(image))
+        other = tmp_path / 'IMG_0002.jpg'
+        other.write_text('x')
+        assert metadata.is_image(str(image))
+        assert not metadata.is_image(str(other))
+
+
+class TestRetrieveMinDate:
+
+    def test_returns_date_props_from_file_stats(self, tmp_path) -> None:
+        test_file = tmp_path / 'test.jpg'
+        test_file.write_text('x')
+        result = metadata.retrieve_min_date('test.jpg', str(test_file))
+        assert set(result) == {'year', 'month', 'day', 'hour', 'minute', 'second'}
+        assert len(result['month']) == 2
+        assert len(result['day']) == 2
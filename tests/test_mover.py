@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mover import Mover
+
+
+class TestMover:
+
+    def test_same_device_renamed(self, tmp_path) -> None:
+        source = tmp_path / 'a.jpg'
+        source.write_bytes(b'data')
+        target = tmp_path / 'dst' / '2020' / 'b.jpg'
+        assert Mover().move(str(source), target) is True
+        assert target.read_bytes() == b'data'
+        assert not source.exists()
+
+    def test_other_device_copied(self, tmp_path) -> None:
+        source = tmp_path / 'a.jpg'
+        source.write_bytes(b'data' * 1000)
+        os.utime(source, (1_000_000_000, 1_000_000_000))
+        target = tmp_path / 'dst' / 'b.jpg'
+        mover = Mover()
+        mover._source_devices[str(tmp_path)] = -1
+        assert mover.move(str(source), target) is False
+        assert target.read_bytes() == b'data' * 1000
+        assert target.stat().st_mtime == 1_000_000_000
+        assert not source.exists()
+
+    @pytest.mark.parametrize('source_device', [None, -1])
+    def test_existing_target_kept(self, tmp_path, source_device) -> None:
+        source = tmp_path / 'a.jpg'
+        source.write_bytes(b'new')
+        target = tmp_path / 'b.jpg'
+        target.write_bytes(b'old')
+        mover = Mover()
+        if source_device:
+            mover._source_devices[str(tmp_path)] = source_device
+        with pytest.raises(FileExistsError):
+            mover.move(str(source), target)
+        assert target.read_bytes() == b'old'
+        assert source.read_bytes() == b'new'
+
+    def test_target_folder_created_once(self, tmp_path) -> None:
+        mover = Mover()
+        for name in ('a.jpg', 'b.jpg'):
+            (tmp_path / name).write_bytes(b'x')
+        with patch('os.makedirs', wraps=os.makedirs) as makedirs:
+            mover.move(str(tmp_path / 'a.jpg'), tmp_path / '2020' / 'a.jpg')
+            mover.move(str(tmp_path / 'b.jpg'), tmp_path / '2020' / 'b.jpg')
+        assert makedirs.call_count == 1
+
+    def test_failed_copy_removes_partial_target(self, tmp_path) -> None:
+        source = tmp_path / 'a.jpg'
+        source.write_bytes(b'data')
+        target = tmp_path / 'dst' / 'b.jpg'
+        mover = Mover()
+        mover._source_devices[str(tmp_path)] = -1
+        with patch('shutil.copyfileobj', side_effect=OSError('No space left')), pytest.raises(OSError):
+            mover.move(str(source), target)
+        assert not target.exists()
+        assert source.exists()
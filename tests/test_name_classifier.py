@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import regex_patterns
+from name_classifier import ACCEPTED, IGNORED, UNMATCHED, NameClassifier
+
+
+class TestNameClassifier:
+
+    def test_accepts_everything_without_patterns(self) -> None:
+        classifier = NameClassifier()
+        assert classifier.classify('notes.txt') == ACCEPTED
+        assert len(classifier) == 0
+
+    def test_ignore_comes_first(self) -> None:
+        classifier = NameClassifier([r'thumbs\.db', r'\.DS_Store', r'IMG_0001'], regex_patterns.ACCEPTABLE_REGEXS)
+        assert len(classifier.ignore) == 1
+        assert classifier.classify('thumbs.db') == IGNORED
+        assert classifier.classify('.DS_Store') == IGNORED
+        assert classifier.classify('IMG_0001.jpg') == IGNORED
+        assert classifier.classify('IMG_0002.jpg') == ACCEPTED
+
+    def test_presets_check_the_extension(self) -> None:
+        classifier = NameClassifier(accept_regexs=regex_patterns.ACCEPTABLE_REGEXS)
+        assert classifier.classify('IMG_20200101_120000.jpg') == ACCEPTED
+        assert classifier.classify('IMG_20200101_120000.JPG') == ACCEPTED
+        assert classifier.classify('IMG_20200101_120000.Jpg') == ACCEPTED
+        assert classifier.classify('DSC_0001.NEF') == ACCEPTED
+        assert classifier.classify('IMG_20200101_120000.txt') == UNMATCHED
+        assert classifier.classify('IMG_20200101_120000') == UNMATCHED
+
+    def test_custom_and_preset_accept_patterns(self) -> None:
+        classifier = NameClassifier(accept_regexs=[regex_patterns.ACCEPTABLE_REGEXS[1], r'.*\.txt$', r'.*\.md$'])
+        assert len(classifier) == 2
+        assert classifier.classify('notes.txt') == ACCEPTED
+        assert classifier.classify('README.md') == ACCEPTED
+        assert classifier.classify('DSC_0001.nef') == ACCEPTED
+        assert classifier.classify('photo.gif') == UNMATCHED
+
+    def test_patterns_with_groups_or_flags_stay_separate(self) -> None:
+        classifier = NameClassifier([r'(a)\1', r'(?i)thumbs\.db'])
+        assert len(classifier.ignore) == 2
+        assert classifier.classify('aa.jpg') == IGNORED
+        assert classifier.classify('Thumbs.db') == IGNORED
+        assert classifier.classify('ab.jpg') == ACCEPTED
+
+
+class TestMediaMatch:
+
+    def test_match_destination(self) -> None:
+        match = regex_patterns.match_destination('20200101_120000_000.mpeg')
+        assert match.group('extension') == 'mpeg'
+        assert regex_patterns.match_destination('20200101_120000_000.JPG').group('extension') == 'JPG'
+        assert regex_patterns.match_destination('20200101_120000_000.doc') is None
+
+    def test_match_acceptable(self) -> None:
+        assert regex_patterns.match_acceptable('IMG_20200101_120000.dv-avi').group('extension') == 'dv-avi'
+        assert regex_patterns.match_acceptable('DSC_0001.nef', 1).group('prefix') == 'DSC'
+        assert regex_patterns.match_acceptable('IMG_20200101_120000.doc') is None
+
+    def test_has_media_extension(self) -> None:
+        assert regex_patterns.has_media_extension('a.HEIC')
+        assert not regex_patterns.has_media_extension('a.txt')
+        assert not regex_patterns.has_media_extension('jpg')
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+import struct
+import sys
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import perceptual_hash
+
+
+def _photo(seed: int, size: tuple[int, int] = (640, 480)) -> Image.Image:
+    img = Image.new('RGB', size, (40 * seed % 256, 80, 120))
+    draw = ImageDraw.Draw(img)
+    for i in range(6):
+        x, y = (seed * 97 + i * 131) % size[0], (seed * 53 + i * 71) % size[1]
+        draw.ellipse([x, y, x + size[0] // 3, y + size[1] // 3], fill=((seed * 37 + i * 90) % 256, 200, 30 * i))
+    return img
+
+
+def _exif_with_thumbnail(thumbnail: bytes, orientation: int = 1) -> bytes:
+    ''' Little endian TIFF with the orientation in IFD0 and the thumbnail in IFD1 '''
+    tiff = b'II' + struct.pack('<HI', 42, 8)
+    tiff += struct.pack('<H', 1) + struct.pack('<HHIHH', 0x0112, 3, 1, orientation, 0) + struct.pack('<I', 26)
+    tiff += struct.pack('<H', 2) + struct.pack('<HHII', 0x0201, 4, 1, 56)
+    tiff += struct.pack('<HHII', 0x0202, 4, 1, len(thumbnail)) + struct.pack('<I', 0)
+    return b'Exif\x00\x00' + tiff + thumbnail
+
+
+def _jpeg(img: Image.Image, **kwargs) -> bytes:
+    data = io.BytesIO()
+    img.save(data, 'JPEG', **kwargs)
+    return data.getvalue()
+
+
+class TestHashes:
+
+    def test_resaved_copy_is_near(self, tmp_path) -> None:
+        img = _photo(1)
+        img.save(tmp_path / 'a.png')
+        (tmp_path / 'a.jpg').write_bytes(_jpeg(img.resize((320, 240)), quality=40))
+        d1, p1 = perceptual_hash.hash_image(tmp_path / 'a.png')
+        d2, p2 = perceptual_hash.hash_image(tmp_path / 'a.jpg')
+        assert perceptual_hash.hamming(d1, d2) <= perceptual_hash.NEAR_DUPLICATE_DISTANCE
+        assert perceptual_hash.hamming(p1, p2) <= perceptual_hash.NEAR_DUPLICATE_DISTANCE
+
+    def test_different_images_are_far(self, tmp_path) -> None:
+        _, p1 = perceptual_hash.hash_image(io.BytesIO(_jpeg(_photo(1))))
+        _, p2 = perceptual_hash.hash_image(io.BytesIO(_jpeg(_photo(4))))
+        assert perceptual_hash.hamming(p1, p2) > perceptual_hash.NEAR_DUPLICATE_DISTANCE
+
+    def test_dhash_of_gradient(self) -> None:
+        img = Image.linear_gradient('L').rotate(90)
+        assert perceptual_hash.dhash(img) in (0, 2 ** 64 - 1)
+
+    def test_hamming(self) -> None:
+        assert perceptual_hash.hamming(0b1011, 0b0001) == 2
+
+
+class TestExifThumbnail:
+
+    def test_thumbnail_used(self) -> None:
+        thumbnail = _photo(2, (160, 120))
+        data = _jpeg(_photo(3), exif=_exif_with_thumbnail(_jpeg(thumbnail)))
+        with Image.open(io.BytesIO(data)) as img:
+            assert perceptual_hash._exif_thumbnail(img).size == (160, 120)
+        assert perceptual_hash.hash_image(io.BytesIO(data)) == perceptual_hash.hash_image(
+            io.BytesIO(_jpeg(thumbnail)))
+
+    def test_letterboxed_thumbnail_ignored(self) -> None:
+        data = _jpeg(_photo(3, (600, 200)), exif=_exif_with_thumbnail(_jpeg(_photo(2, (160, 120)))))
+        with Image.open(io.BytesIO(data)) as img:
+            assert perceptual_hash._exif_thumbnail(img) is None
+
+    def test_corrupt_thumbnail_ignored(self, tmp_path) -> None:
+        img = _photo(3)
+        thumbnail = _jpeg(_photo(2, (160, 120)))
+        for name, data in (('garbage.jpg', b'\xff\xd8' + os.urandom(200)), ('truncated.jpg', thumbnail[:400])):
+            (tmp_path / name).write_bytes(_jpeg(img, exif=_exif_with_thumbnail(data)))
+            with Image.open(tmp_path / name) as opened:
+                assert perceptual_hash._exif_thumbnail(opened) is None
+            cache = perceptual_hash.PerceptualHashCache(tmp_path)
+            assert cache.get(tmp_path / name) == perceptual_hash.hash_image(io.BytesIO(_jpeg(img)))
+
+    def test_orientation_applied(self) -> None:
+        img = _photo(5)
+        rotated = _jpeg(img.rotate(90, expand=True), exif=_exif_with_thumbnail(b'', orientation=6))
+        _, upright = perceptual_hash.hash_image(io.BytesIO(_jpeg(img)))
+        _, turned = perceptual_hash.hash_image(io.BytesIO(rotated))
+        assert perceptual_hash.hamming(upright, turned) <= perceptual_hash.NEAR_DUPLICATE_DISTANCE
+
+
+class TestPerceptualHashCache:
+
+    def test_rerun_uses_cache(self, tmp_path) -> None:
+        (tmp_path / 'a.jpg').write_bytes(_jpeg(_photo(1)))
+        (tmp_path / 'broken.jpg').write_bytes(b'not an image')
+        cache = perceptual_hash.PerceptualHashCache(tmp_path)
+        hashes = cache.get(tmp_path / 'a.jpg')
+        assert cache.get(tmp_path / 'broken.jpg') is None
+        cache.save()
+        saved = json.loads((tmp_path / perceptual_hash.PERCEPTUAL_HASH_INDEX_NAME).read_text())
+        assert saved['broken.jpg']['phash'] is None
+
+        cache = perceptual_hash.PerceptualHashCache(tmp_path)
+        cache.load()
+        assert cache.get(tmp_path / 'a.jpg') == hashes
+        assert cache.get(tmp_path / 'broken.jpg') is None
+        assert (cache.hashed_files, cache.cached_files) == (0, 2)
+
+    def test_changed_file_hashed_again_and_missing_dropped(self, tmp_path) -> None:
+        (tmp_path / 'a.jpg').write_bytes(_jpeg(_photo(1)))
+        (tmp_path / 'b.jpg').write_bytes(_jpeg(_photo(2)))
+        cache = perceptual_hash.PerceptualHashCache(tmp_path)
+        cache.get(tmp_path / 'a.jpg')
+        cache.get(tmp_path / 'b.jpg')
+        cache.save()
+
+        (tmp_path / 'a.jpg').write_bytes(_jpeg(_photo(4)))
+        os.utime(tmp_path / 'a.jpg', ns=(0, 1))
+        (tmp_path / 'b.jpg').unlink()
+        cache = perceptual_hash.PerceptualHashCache(tmp_path)
+        cache.load()
+        cache.get(tmp_path / 'a.jpg')
+        cache.save()
+        assert cache.hashed_files == 1
+        assert list(cache.entries) == ['a.jpg']
+
+
+class TestGroupNearDuplicates:
+
+    def test_pairs_within_distance_grouped(self) -> None:
+        hashes = {'a': (0b0000, 0b0000), 'b': (0b0011, 0b0001), 'c': (0b1111, 0b0011), 'd': (2 ** 64 - 1, 0)}
+        assert perceptual_hash.group_near_duplicates(hashes, max_distance=2) == [['a', 'b']]
+        assert perceptual_hash.group_near_duplicates(hashes, max_distance=1) == []
+
+    def test_not_chained_through_members(self) -> None:
+        # a~b and b~c are 10 bits apart, a and c 20 bits
+        a, b, c = 0, 2 ** 10 - 1, 2 ** 20 - 1
+        hashes = {'a': (a, a), 'b': (b, b), 'c': (c, c)}
+        assert perceptual_hash.group_near_duplicates(hashes, max_distance=10) == [['a', 'b']]
+        # The first file in key order is kept
+        by_c = {'c': 0, 'b': 1, 'a': 2}.get
+        assert perceptual_hash.group_near_duplicates(hashes, max_distance=10, key=by_c) == [['c', 'b']]
+        by_b = {'b': 0, 'a': 1, 'c': 2}.get
+        assert perceptual_hash.group_near_duplicates(hashes, max_distance=10, key=by_b) == [['b', 'a', 'c']]
+
+    def test_exact_groups_merged(self) -> None:
+        hashes = {'a': (0, 0), 'b': (1, 1)}
+        groups = perceptual_hash.group_near_duplicates(hashes, 1, [['b', 'video1'], ['video2', 'video3']])
+        assert sorted(groups) == [['a', 'b', 'video1'], ['video2', 'video3']]
@@ -11,9 +11,14 @@ from PIL import Image
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
+import hash_index
+import perceptual_hash
 import picture_handler
+import profiling
 from picture_handler import PicturesHandler, create_parser
 import regex_patterns
+import utils
+from file_record import FileRecord
 
 
 class TestCreateParser:
@@ -88,7 +93,7 @@ class TestPicturesHandlerInit:
         src = tmp_path / 'src'
         src.mkdir()
         handler = PicturesHandler(str(src), str(tmp_path), accept_regexs=['default'])
-        assert len(handler.acceptable_regexs) == len(regex_patterns.ACCEPTABLE_REGEXS)
+        assert len(handler.classifier) == len(regex_patterns.ACCEPTABLE_REGEXS)
 
 
 class TestHandleDestinationFolder:
@@ -136,26 +141,6 @@ class TestHandleSourceFolder:
         assert len(handler.unsupported) == 1
 
 
-class TestRetrieveMinDate:
-
-    def test_returns_date_props_from_file_stats(self, tmp_path) -> None:
-        src = tmp_path / 'src'
-        src.mkdir()
-        dst = tmp_path / 'dst'
-        test_file = src / 'test.jpg'
-        test_file.write_text('x')
-        handler = PicturesHandler(str(src), str(dst), dry_run=True)
-        result = handler._retrieve_min_date('test.jpg', str(test_file))
-        assert 'year' in result
-        assert 'month' in result
-        assert 'day' in result
-        assert 'hour' in result
-        assert 'minute' in result
-        assert 'second' in result
-        assert len(result['month']) == 2
-        assert len(result['day']) == 2
-
-
 class TestMoveFlow:
 
     def _create_test_image(self, path: Path) -> None:
@@ -206,6 +191,126 @@ class TestMoveFlow:
         assert len(found) == 1
         assert re.match(r'^\d{4}$', found[0].parent.name)
 
+    def test_move_workers_copy_every_planned_file(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        for i in range(12):
+            Image.new('RGB', (10, 10), color=(i, 0, 0)).save(str(src / f'IMG_{i:04d}.jpg'))
+        handler = PicturesHandler(str(src), str(dst), dry_run=False, move_workers=4)
+        # Source on another device: every file goes through the copy path
+        with patch.object(handler.mover, '_source_devices', {str(src): -1}):
+            handler.handle()
+        planned = {f.new_file_name: f.file for files in handler.ready_to_add.values() for f in files}
+        assert len(planned) == 12
+        assert handler.unmoved == {}
+        assert list(src.iterdir()) == []
+        assert {name: entry['source_name'] for name, entry in handler.moved.items()} == planned
+        assert sorted(p.name for p in dst.rglob('*.jpg')) == sorted(planned)
+
+
+class TestProfile:
+
+    def test_profile_flags(self) -> None:
+        parser = create_parser()
+        args = parser.parse_args(['-s', 'a', '-d', 'b'])
+        assert not args.profile
+        assert args.profile_dump is None
+        args = parser.parse_args(['-s', 'a', '-d', 'b', '--profile', '--pd', 'prof'])
+        assert args.profile
+        assert args.profile_dump == 'prof'
+
+    def test_handle_stages_and_counters(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst' / '2020'
+        dst.mkdir(parents=True)
+        (dst / '20200101_000000_000.jpg').write_bytes(b'x' * 10)
+        for i in range(3):
+            Image.new('RGB', (10, 10), color=(i * 100, 0, 0)).save(str(src / f'IMG_{i:04d}.jpg'))
+        handler = PicturesHandler(str(src), str(dst.parent), comparers=['binary'], dry_run=False)
+        profiling.start()
+        try:
+            handler.handle()
+        finally:
+            profiler = profiling.stop()
+        stages = profiler.stages
+        assert stages['scan destination'].counters[profiling.FILES] == 1
+        assert stages['scan source'].counters[profiling.FILES] == 3
+        assert stages['scan source'].counters[profiling.STAT_CALLS] == 3
+        assert stages['read dates'].counters[profiling.BYTES_READ] > 0
+        assert stages['compare'].calls == 3
+        assert stages['move'].counters[profiling.FILES] == 3
+        assert all(stage.seconds >= 0 for stage in stages.values())
+
+    def test_main_logs_the_report(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        dst.mkdir()
+        with patch('sys.argv', ['picture_handler.py', '-s', str(src), '-d', str(dst), '--dr',
+                                '--pd', str(tmp_path / 'prof')]), \
+                patch.object(picture_handler, 'logger') as logger:
+            picture_handler.main()
+        logged = [call.args[0] for call in logger.info.call_args_list]
+        assert '*****Profile' in logged
+        assert (tmp_path / 'prof' / 'scan_source.prof').exists()
+
+
+class TestMetricsFile:
+
+    def test_metrics_of_a_run(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        (dst / '2020').mkdir(parents=True)
+        Image.new('RGB', (10, 10), color='red').save(str(src / 'IMG_0001.jpg'))
+        Image.new('RGB', (10, 10), color='blue').save(str(src / 'IMG_0002.jpg'))
+        (src / 'notes.txt').write_text('x')
+        existing = dst / '2020' / '20200101_000000_000.jpg'
+        existing.write_bytes((src / 'IMG_0002.jpg').read_bytes())
+        metrics_path = tmp_path / 'ingest.prom'
+        with patch('sys.argv', ['picture_handler.py', '-s', str(src), '-d', str(dst), '-c', 'binary',
+                                '--mf', str(metrics_path)]), patch.object(picture_handler, 'logger'):
+            picture_handler.main()
+        lines = metrics_path.read_text().splitlines()
+        assert 'pictures_ingest_run_success 1' in lines
+        assert 'pictures_ingest_files{category="scanned"} 3' in lines
+        assert 'pictures_ingest_files{category="moved"} 1' in lines
+        assert 'pictures_ingest_files{category="rejected"} 1' in lines
+        assert 'pictures_ingest_files{category="unsupported"} 1' in lines
+        assert 'pictures_ingest_rejected_files{comparer="binary"} 1' in lines
+        moved = [p for p in dst.rglob('*.jpg') if p != existing]
+        assert f'pictures_ingest_moved_bytes {moved[0].stat().st_size}' in lines
+        assert f'pictures_ingest_duplicate_bytes {existing.stat().st_size}' in lines
+        assert lines[-1] == '# EOF'
+
+    def test_stream_counts_matched_files(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        (dst / '2020').mkdir(parents=True)
+        Image.new('RGB', (10, 10), color='red').save(str(src / 'IMG_0001.jpg'))
+        Image.new('RGB', (10, 10), color='blue').save(str(src / 'IMG_0002.jpg'))
+        (dst / '2020' / '20200101_000000_000.jpg').write_bytes((src / 'IMG_0002.jpg').read_bytes())
+        metrics_path = tmp_path / 'ingest.prom'
+        with patch('sys.argv', ['picture_handler.py', '-s', str(src), '-d', str(dst), '-c', 'binary', '--stream',
+                                '--mf', str(metrics_path)]), patch.object(picture_handler, 'logger'):
+            picture_handler.main()
+        lines = metrics_path.read_text().splitlines()
+        assert 'pictures_ingest_files{category="matched"} 1' in lines
+        assert 'pictures_ingest_files{category="moved"} 1' in lines
+
+    def test_failed_run_is_written(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        src.mkdir()
+        metrics_path = tmp_path / 'ingest.prom'
+        handler = PicturesHandler(str(src), str(tmp_path / 'dst'))
+        with patch.object(handler, '_plan', side_effect=OSError('gone')), pytest.raises(OSError):
+            with picture_handler._metrics_file(handler, str(metrics_path)):
+                handler.handle()
+        assert 'pictures_ingest_run_success 0' in metrics_path.read_text().splitlines()
+
 
 class TestHandleDestinationWithYearFolders:
 
@@ -280,6 +385,15 @@ class TestCreateParserOrganizeByYear:
         args = parser.parse_args(['--src', '/s', '--dst', '/d', '--find-duplicates'])
         assert args.find_duplicates is True
 
+    def test_near_duplicates_flags(self) -> None:
+        parser = create_parser()
+        args = parser.parse_args(['--src', '/s', '--dst', '/d'])
+        assert args.near_duplicates is False
+        assert args.near_distance == perceptual_hash.NEAR_DUPLICATE_DISTANCE
+        args = parser.parse_args(['--src', '/s', '--dst', '/d', '--near-duplicates', '--near-distance', '6'])
+        assert args.near_duplicates is True
+        assert args.near_distance == 6
+
     def test_delete_duplicates_flag_default_false(self) -> None:
         parser = create_parser()
         args = parser.parse_args(['--src', '/s', '--dst', '/d'])
@@ -381,3 +495,461 @@ class TestHandleDestinationWithMonthFolders:
         handler._handle_destination_folder(dst)
         assert handler.num_of_dst_files == 1
         assert len(handler.destination_formats) == 1
+
+
+class TestBinaryComparerHashIndex:
+
+    def _create_test_image(self, path: Path, color: str = 'green') -> None:
+        img = Image.new('RGB', (10, 10), color=color)
+        img.save(str(path))
+
+    def test_binary_duplicate_of_destination_rejected(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        (dst / '2020').mkdir(parents=True)
+        self._create_test_image(src / 'IMG_0001.jpg')
+        (dst / '2020' / '20200101_120000_000.jpg').write_bytes((src / 'IMG_0001.jpg').read_bytes())
+        handler = PicturesHandler(str(src), str(dst), comparers=['binary'], dry_run=True)
+        handler.handle()
+        assert len(handler.not_passed_comparison) == 1
+        assert 'BINARY' in handler.not_passed_comparison[0][1]
+
+    def test_hash_index_persisted_for_moved_and_compared_files(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        (dst / '2020').mkdir(parents=True)
+        self._create_test_image(src / 'IMG_0001.jpg', 'red')
+        existing = dst / '2020' / '20200101_120000_000.jpg'
+        existing.write_bytes(b'x' * (src / 'IMG_0001.jpg').stat().st_size)
+        handler = PicturesHandler(str(src), str(dst), comparers=['binary'], dry_run=False)
+        handler.handle()
+        assert len(handler.moved) == 1
+        index = json.loads((dst / 'hashes.txt').read_text())
+        assert existing.name in index
+        assert list(handler.moved)[0] in index
+
+    def test_destination_rewritten_in_place_is_hashed_again(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        (dst / '2020').mkdir(parents=True)
+        self._create_test_image(src / 'IMG_0001.jpg')
+        existing = dst / '2020' / '20200101_120000_000.jpg'
+        existing.write_bytes((src / 'IMG_0001.jpg').read_bytes())
+        (dst / 'hashes.txt').write_text(json.dumps({existing.name: {
+            'size': existing.stat().st_size, 'mtime_ns': existing.stat().st_mtime_ns,
+            'hash': hash_index.hash_file(existing)}}))
+        # Same size, other content: the stored hash is stale
+        existing.write_bytes(b'x' * existing.stat().st_size)
+        os.utime(existing, ns=(existing.stat().st_atime_ns, existing.stat().st_mtime_ns + 1_000_000_000))
+        handler = PicturesHandler(str(src), str(dst), comparers=['binary'], dry_run=False)
+        handler.handle()
+        assert handler.not_passed_comparison == []
+        assert len(handler.moved) == 1
+
+
+class TestMetadataWorkers:
+
+    def test_workers_flag(self) -> None:
+        parser = create_parser()
+        assert parser.parse_args(['--src', '/s', '--dst', '/d']).workers == 1
+        assert parser.parse_args(['--src', '/s', '--dst', '/d', '--workers', '4']).workers == 4
+
+    def test_process_pool_matches_serial_scan(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        (src / 'sub').mkdir(parents=True)
+        dst = tmp_path / 'dst'
+        for i, color in enumerate(['red', 'green', 'blue']):
+            Image.new('RGB', (10, 10), color=color).save(str(src / f'IMG_000{i}.jpg'))
+        (src / 'sub' / 'VID_20100102_030405.mp4').write_bytes(b'\x00' * 32)
+        (src / 'sub' / 'readme.txt').write_text('x')
+
+        results = []
+        for workers in (1, 2):
+            handler = PicturesHandler(str(src), str(dst), dry_run=True, recursive=True, workers=workers)
+            with patch.object(picture_handler, 'METADATA_BATCH_SIZE', 2):
+                handler.handle()
+            results.append((dict(handler.matched), handler.unsupported, handler.min_date_taken,
+                            dict(handler.ready_to_add)))
+        assert results[0] == results[1]
+        assert len(results[0][0]) == 4
+
+
+class TestAsyncScan:
+
+    def test_async_scan_matches_serial_scan(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        (src / 'sub' / 'deeper').mkdir(parents=True)
+        dst = tmp_path / 'dst'
+        (dst / '2020' / '01').mkdir(parents=True)
+        (dst / '2021').mkdir()
+        (dst / '2020' / '01' / '20200101_120000_000.jpg').write_bytes(b'a')
+        (dst / '2021' / '20210101_120000_000.jpg').write_bytes(b'b')
+        (dst / 'notes.txt').write_text('x')
+        for i, folder in enumerate([src, src, src / 'sub', src / 'sub' / 'deeper']):
+            Image.new('RGB', (10, 10), color=(i, 0, 0)).save(str(folder / f'IMG_000{i}.jpg'))
+        (src / 'sub' / 'readme.txt').write_text('x')
+
+        results = []
+        for async_scan in (False, True):
+            handler = PicturesHandler(str(src), str(dst), dry_run=True, recursive=True, async_scan=async_scan,
+                                      in_flight=2, full_scan=True)
+            with patch.object(picture_handler, 'METADATA_BATCH_SIZE', 2):
+                handler.handle()
+            results.append((dict(handler.matched), handler.unsupported, handler.min_date_taken,
+                            dict(handler.ready_to_add), dict(handler.destination_formats),
+                            handler.destination_not_matched, handler.sizes))
+        assert results[0] == results[1]
+        assert len(results[0][0]) == 4
+        assert len(results[0][4]) == 2
+
+    def test_async_scan_flags(self) -> None:
+        args = create_parser().parse_args(['--src', '/s', '--dst', '/d', '--async-scan', '--in-flight', '128'])
+        assert args.async_scan
+        assert args.in_flight == 128
+
+
+class TestPlanApply:
+
+    def _setup(self, tmp_path) -> tuple[Path, Path]:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        (dst / '2020').mkdir(parents=True)
+        Image.new('RGB', (10, 10), color='red').save(str(src / 'IMG_0001.jpg'))
+        Image.new('RGB', (10, 10), color='blue').save(str(src / 'IMG_0002.jpg'))
+        (dst / '2020' / '20200101_120000_000.jpg').write_bytes((src / 'IMG_0001.jpg').read_bytes())
+        return src, dst
+
+    def test_apply_moves_planned_files_without_scanning(self, tmp_path) -> None:
+        src, dst = self._setup(tmp_path)
+        plan_path = tmp_path / 'plan.json'
+        planner = PicturesHandler(str(src), str(dst), dry_run=True, comparers=['binary'], plan_out=str(plan_path))
+        planner.handle()
+        assert (src / 'IMG_0002.jpg').exists()
+        plan = json.loads(plan_path.read_text())
+        assert [entry['source_name'] for entry in plan['files']] == ['IMG_0002.jpg']
+        assert [entry['source'] for entry in plan['rejected']] == [str(src / 'IMG_0001.jpg')]
+
+        handler = PicturesHandler(plan['src'], plan['dst'])
+        with patch.object(handler, '_scan_source', side_effect=AssertionError('scanned')), \
+                patch('metadata.extract_metadata', side_effect=AssertionError('parsed')):
+            handler.apply_plan(plan)
+        target = Path(plan['files'][0]['target'])
+        assert target.exists()
+        assert handler.moved == {target.name: {'source_name': 'IMG_0002.jpg',
+                                               'size': plan['files'][0]['size']}}
+        assert not (src / 'IMG_0001.jpg').exists()
+        assert not (src / 'IMG_0002.jpg').exists()
+        assert target.name in utils.load_db_files(str(dst))
+
+    def test_changed_files_skipped(self, tmp_path) -> None:
+        src, dst = self._setup(tmp_path)
+        plan_path = tmp_path / 'plan.json'
+        PicturesHandler(str(src), str(dst), dry_run=True, comparers=['binary'], plan_out=str(plan_path)).handle()
+        (src / 'IMG_0001.jpg').write_bytes(b'edited after review')
+        (src / 'IMG_0002.jpg').unlink()
+        handler = PicturesHandler(str(src), str(dst))
+        handler.apply_plan(picture_handler.ingest_plan.load_plan(plan_path))
+        assert handler.moved == {}
+        assert list(handler.unmoved) == [str(src / 'IMG_0002.jpg')]
+        assert handler.not_deleted[0][0] == str(src / 'IMG_0001.jpg')
+        assert (src / 'IMG_0001.jpg').exists()
+
+    def test_sources_deleted_after_scanning(self, tmp_path) -> None:
+        src, dst = self._setup(tmp_path)
+        handler = PicturesHandler(str(src), str(dst), comparers=['binary'])
+        scan_source = handler._scan_source
+
+        def scan_then_delete():
+            scan_source()
+            for path in src.iterdir():
+                path.unlink()
+        with patch.object(handler, '_scan_source', scan_then_delete):
+            handler.handle()
+        assert handler.moved == {}
+        assert list(handler.unmoved) == [str(src / 'IMG_0002.jpg')]
+        assert [path for path, _ in handler.not_deleted] == [str(src / 'IMG_0001.jpg')]
+        assert not picture_handler.ingest_plan.has_checkpoint(dst)
+
+    def test_dry_run_apply_changes_nothing(self, tmp_path) -> None:
+        src, dst = self._setup(tmp_path)
+        plan_path = tmp_path / 'plan.json'
+        PicturesHandler(str(src), str(dst), dry_run=True, comparers=['binary'], plan_out=str(plan_path)).handle()
+        handler = PicturesHandler(str(src), str(dst), dry_run=True)
+        handler.apply_plan(picture_handler.ingest_plan.load_plan(plan_path))
+        assert sorted(p.name for p in src.iterdir()) == ['IMG_0001.jpg', 'IMG_0002.jpg']
+        assert len(handler.ready_to_add) == 1
+
+
+class TestCheckpointResume:
+
+    def _setup(self, tmp_path, files: int = 5) -> tuple[Path, Path]:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        dst.mkdir()
+        for i in range(files):
+            Image.new('RGB', (10, 10), color=(i, 0, 0)).save(str(src / f'IMG_{i:04d}.jpg'))
+        return src, dst
+
+    def _interrupt_after(self, handler: PicturesHandler, moves: int) -> None:
+        ''' Simulate a crash on the move following the first moves '''
+        move = handler.mover.move
+        calls = []
+
+        def crashing_move(source, target):
+            calls.append(source)
+            if len(calls) > moves:
+                raise KeyboardInterrupt
+            return move(source, target)
+        handler.mover.move = crashing_move
+
+    def test_resume_after_interruption(self, tmp_path) -> None:
+        src, dst = self._setup(tmp_path)
+        handler = PicturesHandler(str(src), str(dst), checkpoint_every=2)
+        self._interrupt_after(handler, 3)
+        with pytest.raises(KeyboardInterrupt):
+            handler.handle()
+        # Two moves committed with the checkpoint, the third one moved but not recorded
+        assert len(utils.load_db_files(str(dst))) == 2
+        plan, done = picture_handler.ingest_plan.load_checkpoint(dst)
+        assert done == 2
+        with pytest.raises(picture_handler.InterruptedRunPending):
+            PicturesHandler(str(src), str(dst)).handle()
+        assert len(list(src.iterdir())) == 2
+
+        resumed = PicturesHandler(plan['src'], plan['dst'])
+        with patch.object(resumed, '_scan_source', side_effect=AssertionError('scanned')):
+            resumed.apply_plan(plan, done, resume=True)
+        assert resumed.unmoved == {}
+        assert len(resumed.moved) == 3
+        db = utils.load_db_files(str(dst))
+        assert sorted(entry['source_name'] for entry in db.values()) == [f'IMG_{i:04d}.jpg' for i in range(5)]
+        assert list(src.iterdir()) == []
+        assert not picture_handler.ingest_plan.has_checkpoint(dst)
+
+    def test_completed_run_leaves_no_checkpoint(self, tmp_path) -> None:
+        src, dst = self._setup(tmp_path, files=3)
+        handler = PicturesHandler(str(src), str(dst), checkpoint_every=1)
+        handler.handle()
+        assert len(handler.moved) == 3
+        assert len(utils.load_db_files(str(dst))) == 3
+        assert not picture_handler.ingest_plan.has_checkpoint(dst)
+        assert not (dst / picture_handler.ingest_plan.CHECKPOINT_PROGRESS_NAME).exists()
+
+    def test_resume_flags(self) -> None:
+        args = create_parser().parse_args(['--dst', '/d', '--resume', '--checkpoint-every', '10'])
+        assert args.resume
+        assert args.checkpoint_every == 10
+
+    def test_run_over_checkpoint_fails(self, tmp_path, capsys) -> None:
+        src, dst = self._setup(tmp_path, files=2)
+        picture_handler.ingest_plan.write_checkpoint(dst, picture_handler.ingest_plan.make_plan(src, dst, [], []))
+        metrics_path = tmp_path / 'ingest.prom'
+        with patch('sys.argv', ['picture_handler.py', '-s', str(src), '-d', str(dst), '--mf', str(metrics_path)]), \
+                patch.object(picture_handler, 'logger'), pytest.raises(SystemExit) as exit_info:
+            picture_handler.main()
+        assert exit_info.value.code != 0
+        assert 'Finish it with --resume first' in capsys.readouterr().err
+        assert 'pictures_ingest_run_success 0' in metrics_path.read_text().splitlines()
+        assert len(list(src.iterdir())) == 2
+
+    def test_resume_without_checkpoint_is_an_error(self, tmp_path, capsys) -> None:
+        with patch('sys.argv', ['picture_handler.py', '-d', str(tmp_path), '--resume']), \
+                patch.object(picture_handler, 'logger'), pytest.raises(SystemExit):
+            picture_handler.main()
+        assert 'Nothing to resume' in capsys.readouterr().err
+
+
+class TestSqliteCatalog:
+
+    def test_handled_source_name_skipped_and_moved_recorded(self, tmp_path) -> None:
+        import catalog
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        dst.mkdir()
+        Image.new('RGB', (10, 10), color='blue').save(str(src / 'IMG_0001.jpg'))
+        Image.new('RGB', (10, 10), color='red').save(str(src / 'IMG_0002.jpg'))
+        db = catalog.SqliteCatalog(dst / 'files.db')
+        db.add('20200101_120000_000.jpg', {'source_name': 'IMG_0001.jpg', 'size': 1})
+        db.commit()
+        db.close()
+        handler = PicturesHandler(str(src), str(dst), comparers=['name'], dry_run=False)
+        handler.handle()
+        assert [entry['source_name'] for entry in handler.moved.values()] == ['IMG_0002.jpg']
+        db = catalog.open_catalog(dst)
+        assert len(db) == 2
+        assert db.is_handled_name('IMG_0002.jpg')
+        db.close()
+        assert not (dst / 'files.txt').exists()
+
+
+class TestPrepareNewFilesForCopy:
+
+    def test_burst_suffixes_continue_after_destination(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        (dst / '2020').mkdir(parents=True)
+        (dst / '2020' / '20200101_120000_000.jpg').write_text('a')
+        (dst / '2020' / '20200101_120000_002.jpg').write_text('b')
+        handler = PicturesHandler(str(src), str(dst), dry_run=True)
+        handler._handle_destination_folder(dst)
+        date = {'year': '2020', 'month': '01', 'day': '01', 'hour': '12', 'minute': '00', 'second': '00'}
+        for name, second in (('IMG_0001.jpg', '00'), ('IMG_0002.jpg', '00'), ('IMG_0003.jpg', '01')):
+            handler.matched[name].append(FileRecord(src, name, 1, **dict(date, second=second)))
+        handler._prepare_new_files_for_copy()
+        names = sorted(m.new_file_name for matches in handler.ready_to_add.values() for m in matches)
+        assert names == ['20200101_120000_003.jpg', '20200101_120000_004.jpg', '20200101_120001_000.jpg']
+
+
+class TestDestinationSnapshot:
+
+    def _run(self, src: Path, dst: Path, **kwargs) -> PicturesHandler:
+        handler = PicturesHandler(str(src), str(dst), dry_run=False, **kwargs)
+        handler.handle()
+        return handler
+
+    def test_second_run_reuses_unchanged_folders(self, tmp_path) -> None:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        (dst / '2019').mkdir(parents=True)
+        (dst / '2019' / '20190101_120000_000.jpg').write_text('old')
+        with patch('dir_snapshot.RACY_MTIME_NS', 0):
+            first = self._run(src, dst)
+            second = self._run(src, dst)
+            full = self._run(src, dst, full_scan=True)
+        assert first.dir_snapshot.listed_dirs == 2
+        assert second.dir_snapshot.cached_dirs == 1
+        assert full.dir_snapshot.cached_dirs == 0
+        assert list(second.destination_formats) == list(full.destination_formats) == ['20190101_120000.jpg']
+        assert second.sizes == full.sizes
+
+
+class TestTrustDb:
+
+    def _setup(self, tmp_path, same_content: bool = False) -> tuple[Path, Path]:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        (dst / '2020').mkdir(parents=True)
+        Image.new('RGB', (10, 10), color='red').save(str(src / 'IMG_20200101_120000.jpg'))
+        existing = dst / '2020' / '20200101_120000_000.jpg'
+        existing.write_bytes((src / 'IMG_20200101_120000.jpg').read_bytes() if same_content else b'existing')
+        utils.save_db_files({existing.name: {'source_name': 'IMG_0001.jpg', 'size': existing.stat().st_size}},
+                            str(dst))
+        return src, dst
+
+    def _plan(self, src: Path, dst: Path, **kwargs) -> PicturesHandler:
+        handler = PicturesHandler(str(src), str(dst), dry_run=True, **kwargs)
+        handler.handle()
+        return handler
+
+    def test_plans_from_db_without_destination_scan(self, tmp_path) -> None:
+        src, dst = self._setup(tmp_path)
+        trusted = self._plan(src, dst, trust_db=True)
+        scanned = self._plan(src, dst)
+        assert trusted.trust_db
+        assert trusted.dir_snapshot.listed_dirs == 0
+        assert list(trusted.destination_formats) == list(scanned.destination_formats)
+        names = [m.new_file_name for matches in trusted.ready_to_add.values() for m in matches]
+        assert names == [m.new_file_name for matches in scanned.ready_to_add.values() for m in matches]
+        assert names == ['20200101_120000_001.jpg']
+
+    def test_binary_duplicate_found_in_db_entry(self, tmp_path) -> None:
+        src, dst = self._setup(tmp_path, same_content=True)
+        handler = self._plan(src, dst, trust_db=True, comparers=['binary'])
+        assert handler.trust_db
+        assert 'BINARY' in handler.not_passed_comparison[0][1]
+
+    def test_missing_destination_file_falls_back_to_scan(self, tmp_path) -> None:
+        src, dst = self._setup(tmp_path, same_content=True)
+        (dst / '2020' / '20200101_120000_000.jpg').unlink()
+        handler = self._plan(src, dst, trust_db=True, comparers=['binary'])
+        assert not handler.trust_db
+        assert handler.not_passed_comparison == []
+        assert len(handler.matched) == 1
+
+    def test_untracked_destination_file_falls_back_to_scan(self, tmp_path) -> None:
+        src, dst = self._setup(tmp_path)
+        (dst / '2020' / '20200101_120000_001.jpg').write_bytes(b'not in db')
+        handler = self._plan(src, dst, trust_db=True)
+        assert not handler.trust_db
+        names = [m.new_file_name for matches in handler.ready_to_add.values() for m in matches]
+        assert names == ['20200101_120000_002.jpg']
+
+
+class TestStream:
+
+    def _source(self, tmp_path, count: int = 4) -> tuple[Path, Path]:
+        src = tmp_path / 'src'
+        src.mkdir()
+        dst = tmp_path / 'dst'
+        dst.mkdir()
+        for i in range(count):
+            Image.new('RGB', (10, 10), color=(i * 40, 0, 0)).save(str(src / f'IMG_2020010{i + 1}_120000.jpg'))
+        return src, dst
+
+    def test_moves_and_appends_db(self, tmp_path) -> None:
+        src, dst = self._source(tmp_path)
+        handler = PicturesHandler(str(src), str(dst), stream=True)
+        with patch.object(picture_handler, 'METADATA_BATCH_SIZE', 3):
+            handler.handle()
+        assert handler.num_moved == 4
+        assert handler.moved == {}
+        assert list(src.iterdir()) == []
+        db = utils.load_db_files(str(dst))
+        assert sorted(entry['source_name'] for entry in db.values()) == sorted(
+            f'IMG_2020010{i + 1}_120000.jpg' for i in range(4))
+        assert all(list(dst.rglob(name)) for name in db)
+
+    def test_moves_start_before_source_is_scanned(self, tmp_path) -> None:
+        src, dst = self._source(tmp_path)
+        handler = PicturesHandler(str(src), str(dst), stream=True)
+        events = []
+        classify, move_file = handler._classify_source_file, handler._move_file
+        handler._classify_source_file = lambda *args: events.append('classify') or classify(*args)
+        handler._move_file = lambda f: events.append('move') or move_file(f)
+        with patch.object(picture_handler, 'METADATA_BATCH_SIZE', 1):
+            handler.handle()
+        assert events.index('move') < len(events) - 1 - events[::-1].index('classify')
+
+    def test_binary_duplicates_in_source_rejected(self, tmp_path) -> None:
+        src, dst = self._source(tmp_path, 1)
+        (src / 'IMG_20200301_120000.jpg').write_bytes((src / 'IMG_20200101_120000.jpg').read_bytes())
+        handler = PicturesHandler(str(src), str(dst), comparers=['binary'], stream=True)
+        handler.handle()
+        assert handler.num_moved == 1
+        assert len(handler.not_passed_comparison) == 1
+        assert list(src.iterdir()) == []
+
+    def test_source_results_logged_not_kept(self, tmp_path) -> None:
+        src, dst = self._source(tmp_path, 1)
+        (src / 'IMG_20200301_120000.jpg').write_bytes((src / 'IMG_20200101_120000.jpg').read_bytes())
+        (src / 'notes.txt').write_text('x')
+        (src / 'Thumbs.db').write_text('x')
+        handler = PicturesHandler(str(src), str(dst), comparers=['binary'], stream=True, ignore_regexs=['Thumbs'])
+        with patch.object(picture_handler, 'logger') as mock_logger:
+            handler.handle()
+        logged = [call.args[0] for call in mock_logger.info.call_args_list]
+        assert (len(handler.ignored), len(handler.unsupported), len(handler.not_passed_comparison)) == (1, 1, 1)
+        assert list(handler.ignored) == list(handler.unsupported) == list(handler.not_passed_comparison) == []
+        assert any(line.startswith('Not passed compare BINARY') for line in logged)
+        assert handler.rejected_by == {'binary': 1}
+        assert sorted(p.name for p in src.iterdir()) == ['Thumbs.db', 'notes.txt']
+
+    def test_dry_run_output_unchanged(self, tmp_path) -> None:
+        src, dst = self._source(tmp_path)
+        outputs = []
+        for stream in (False, True):
+            handler = PicturesHandler(str(src), str(dst), dry_run=True, stream=stream)
+            with patch.object(picture_handler, 'logger') as mock_logger:
+                handler.handle()
+                handler.output()
+            outputs.append(mock_logger.info.call_args_list)
+        assert outputs[0] == outputs[1]
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import os
+import pstats
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import profiling
+
+
+@profiling.staged('work')
+def _work(files: int) -> int:
+    profiling.count(profiling.FILES, files)
+    return files
+
+
+class TestProfiler:
+
+    def test_nested_stage_time_is_not_counted_twice(self) -> None:
+        profiler = profiling.Profiler()
+        with profiler.stage('outer'):
+            time.sleep(0.02)
+            with profiler.stage('inner'):
+                time.sleep(0.05)
+        profiler.close()
+        assert profiler.stages['inner'].seconds >= 0.05
+        assert 0.02 <= profiler.stages['outer'].seconds < 0.05
+
+    def test_counts_go_to_the_innermost_stage(self) -> None:
+        profiler = profiling.Profiler()
+        with profiler.stage('scan'):
+            profiler.count(profiling.STAT_CALLS, 3)
+            with profiler.stage('read'):
+                profiler.count(profiling.BYTES_READ, 100)
+            profiler.count(profiling.STAT_CALLS)
+        profiler.count(profiling.FILES)
+        profiler.close()
+        assert profiler.stages['scan'].counters[profiling.STAT_CALLS] == 4
+        assert profiler.stages['read'].counters[profiling.BYTES_READ] == 100
+        assert profiler.stages[profiling.OTHER_STAGE].counters[profiling.FILES] == 1
+
+    def test_staged_runs_without_a_profiler(self) -> None:
+        assert _work(5) == 5
+        profiling.count(profiling.FILES)
+
+    def test_start_and_stop(self) -> None:
+        profiling.start()
+        try:
+            _work(5)
+            _work(2)
+        finally:
+            profiler = profiling.stop()
+        assert profiler.stages['work'].calls == 2
+        assert profiler.stages['work'].counters[profiling.FILES] == 7
+        _work(1)
+        assert profiler.stages['work'].calls == 2
+
+    def test_report(self) -> None:
+        profiler = profiling.Profiler()
+        with profiler.stage('scan destination'):
+            profiler.count(profiling.FILES, 10)
+        profiler.close()
+        lines = []
+        profiler.report(lines.append)
+        assert lines[0] == '*****Profile'
+        assert [line.split()[0] for line in lines[2:]] == [profiling.OTHER_STAGE, 'scan', 'total']
+
+    def test_dump(self, tmp_path) -> None:
+        profiler = profiling.Profiler(str(tmp_path / 'prof'))
+        with profiler.stage('scan destination'):
+            sorted(range(1000))
+        profiler.close()
+        paths = profiler.dump()
+        assert sorted(os.path.basename(path) for path in paths) == ['other.prof', 'scan_destination.prof']
+        assert pstats.Stats(str(tmp_path / 'prof' / 'scan_destination.prof')).total_calls > 0
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from run_metrics import MetricsFile
+
+
+class TestMetricsFile:
+
+    def test_gauges(self) -> None:
+        metrics = MetricsFile('test')
+        metrics.gauge('run_duration_seconds', 'Wall time', 1.5, unit='seconds')
+        metrics.gauge('files', 'Files by category', {'moved': 3, 'found': 10}, label='category')
+        assert metrics.text() == (
+            '# TYPE test_run_duration_seconds gauge\n'
+            '# UNIT test_run_duration_seconds seconds\n'
+            '# HELP test_run_duration_seconds Wall time\n'
+            'test_run_duration_seconds 1.5\n'
+            '# TYPE test_files gauge\n'
+            '# HELP test_files Files by category\n'
+            'test_files{category="found"} 10\n'
+            'test_files{category="moved"} 3\n'
+            '# EOF\n')
+
+    def test_label_values_are_escaped(self) -> None:
+        metrics = MetricsFile('test')
+        metrics.gauge('files', 'Files', {'a "b"\\c': 1}, label='category')
+        assert 'test_files{category="a \\"b\\"\\\\c"} 1' in metrics.text()
+
+    def test_write_replaces_file(self, tmp_path) -> None:
+        path = tmp_path / 'ingest.prom'
+        path.write_text('old')
+        metrics = MetricsFile('test')
+        metrics.gauge('run_success', 'Success', 1)
+        metrics.write(path)
+        assert path.read_text() == metrics.text()
+        assert [p.name for p in tmp_path.iterdir()] == ['ingest.prom']
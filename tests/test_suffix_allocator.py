@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from suffix_allocator import SuffixAllocator
+
+
+class TestSuffixAllocator:
+
+    def test_new_key_starts_at_000(self) -> None:
+        allocator = SuffixAllocator()
+        assert allocator.allocate('20200101_120000.jpg') == '000'
+        assert allocator.allocate('20200101_120000.jpg') == '001'
+        assert allocator.allocate('20200101_120001.jpg') == '000'
+
+    def test_seeded_key_continues_after_highest_suffix(self) -> None:
+        allocator = SuffixAllocator()
+        allocator.seed('20200101_120000.jpg', '002')
+        allocator.seed('20200101_120000.jpg', '000')
+        assert allocator.allocate('20200101_120000.jpg') == '003'
+
+    def test_non_numeric_suffix_ignored(self) -> None:
+        allocator = SuffixAllocator()
+        allocator.seed('20200101_120000.jpg', 'abc')
+        assert '20200101_120000.jpg' not in allocator
+        assert allocator.allocate('20200101_120000.jpg') == '000'
+
+    def test_suffix_past_999(self) -> None:
+        allocator = SuffixAllocator()
+        allocator.seed('20200101_120000.jpg', '999')
+        assert allocator.allocate('20200101_120000.jpg') == '1000'
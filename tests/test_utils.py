@@ -5,6 +5,7 @@ import json
 import pytest
 import sys
 from pathlib import Path
+from unittest.mock import patch
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
@@ -52,6 +53,48 @@ class TestSaveDbFiles:
         assert loaded == new_data
 
 
+class TestDbJournal:
+
+    def test_journal_replayed_on_load(self, tmp_path) -> None:
+        utils.save_db_files({'a.jpg': {'source_name': 'A.jpg', 'size': 1},
+                             'b.jpg': {'source_name': 'B.jpg', 'size': 2}}, str(tmp_path))
+        base_text = (tmp_path / 'files.txt').read_text()
+        utils.append_db_journal([
+            {'op': 'add', 'name': 'c.jpg', 'entry': {'source_name': 'C.jpg', 'size': 3}},
+            {'op': 'delete', 'name': 'a.jpg'},
+        ], str(tmp_path))
+        assert (tmp_path / 'files.txt').read_text() == base_text
+        assert utils.load_db_files(str(tmp_path)) == {
+            'b.jpg': {'source_name': 'B.jpg', 'size': 2},
+            'c.jpg': {'source_name': 'C.jpg', 'size': 3},
+        }
+
+    def test_torn_last_record_ignored(self, tmp_path) -> None:
+        utils.append_db_journal([{'op': 'add', 'name': 'a.jpg', 'entry': {'source_name': 'A.jpg', 'size': 1}}],
+                                str(tmp_path))
+        with open(tmp_path / 'files.txt.journal', 'a') as f:
+            f.write('{"op": "add", "na')
+        assert utils.load_db_files(str(tmp_path)) == {'a.jpg': {'source_name': 'A.jpg', 'size': 1}}
+
+    def test_save_folds_and_removes_journal(self, tmp_path) -> None:
+        utils.append_db_journal([{'op': 'add', 'name': 'a.jpg', 'entry': {'source_name': 'A.jpg', 'size': 1}}],
+                                str(tmp_path))
+        utils.save_db_files(utils.load_db_files(str(tmp_path)), str(tmp_path))
+        assert not (tmp_path / 'files.txt.journal').exists()
+        assert json.loads((tmp_path / 'files.txt').read_text()) == {'a.jpg': {'source_name': 'A.jpg', 'size': 1}}
+
+    def test_compaction_only_past_threshold(self, tmp_path, monkeypatch) -> None:
+        monkeypatch.setattr(utils, 'DB_JOURNAL_COMPACT_MIN_SIZE', 200)
+        record = {'op': 'add', 'name': 'a.jpg', 'entry': {'source_name': 'A.jpg', 'size': 1}}
+        utils.append_db_journal([record], str(tmp_path))
+        assert utils.compact_db_journal(str(tmp_path)) is False
+        assert (tmp_path / 'files.txt.journal').exists()
+        utils.append_db_journal([record] * 5, str(tmp_path))
+        assert utils.compact_db_journal(str(tmp_path)) is True
+        assert not (tmp_path / 'files.txt.journal').exists()
+        assert utils.load_db_files(str(tmp_path)) == {'a.jpg': record['entry']}
+
+
 class TestIsOldDbFormat:
 
     def test_old_format_detected(self) -> None:
@@ -430,6 +473,37 @@ class TestFindDuplicates:
         assert all(f.endswith('.jpg') for f in all_files_in_groups)
 
 
+class TestFindDuplicateGroups:
+
+    def test_same_edges_different_middle_not_grouped(self, tmp_path) -> None:
+        edge = b'e' * utils.DUPLICATE_EDGE_SIZE
+        f1 = tmp_path / 'a.jpg'
+        f2 = tmp_path / 'b.jpg'
+        f1.write_bytes(edge + b'middle one' + edge)
+        f2.write_bytes(edge + b'middle two' + edge)
+        groups = utils._find_duplicate_groups([f1, f2], lambda x: None)
+        assert groups == []
+
+    def test_large_identical_files_grouped_after_full_hash(self, tmp_path) -> None:
+        data = b'0123456789' * utils.DUPLICATE_EDGE_SIZE
+        files = [tmp_path / f'{i}.jpg' for i in range(3)]
+        for f in files:
+            f.write_bytes(data)
+        logs: list[str] = []
+        groups = utils._find_duplicate_groups(files, logs.append)
+        assert groups == [files]
+        assert any(f'full hash stage {3 * len(data)}' in log for log in logs)
+
+    def test_unique_sizes_never_read(self, tmp_path) -> None:
+        f1 = tmp_path / 'a.jpg'
+        f2 = tmp_path / 'b.jpg'
+        f1.write_bytes(b'short')
+        f2.write_bytes(b'much longer')
+        logs: list[str] = []
+        assert utils._find_duplicate_groups([f1, f2], logs.append) == []
+        assert any('edge hash stage 0, full hash stage 0' in log for log in logs)
+
+
 class TestKeepStrategies:
 
     def test_folder_priority_keeps_preferred_folder(self, tmp_path) -> None:
@@ -522,6 +596,86 @@ class TestKeepStrategies:
         assert len(groups[0]) == 2
 
 
+class TestFindNearDuplicates:
+
+    @staticmethod
+    def _photo(path: Path, size: tuple[int, int], quality: int, box: tuple[int, ...] = (50, 50, 350, 300)) -> None:
+        from PIL import Image, ImageDraw
+
+        img = Image.new('RGB', (600, 400), 'white')
+        ImageDraw.Draw(img).ellipse(box, fill='red')
+        img.resize(size).save(path, 'JPEG', quality=quality)
+
+    def test_resaved_copy_grouped_largest_first(self, tmp_path) -> None:
+        self._photo(tmp_path / 'original.jpg', (600, 400), 95)
+        self._photo(tmp_path / 'whatsapp.jpg', (300, 200), 30)
+        (tmp_path / 'other.jpg').write_bytes(b'\xff\xd8\xff not an image')
+        logs: list[str] = []
+        assert utils.find_duplicates(str(tmp_path), logger_func=logs.append) == []
+        groups = utils.find_duplicates(str(tmp_path), logger_func=logs.append, near_duplicates=True)
+        assert groups == [[str(tmp_path / 'original.jpg'), str(tmp_path / 'whatsapp.jpg')]]
+        assert any('3 computed, 0 cached, 1 files are not readable images' in log for log in logs)
+        assert (tmp_path / 'phashes.txt').exists()
+
+    def test_rerun_uses_cache_and_keeps_exact_groups(self, tmp_path) -> None:
+        self._photo(tmp_path / 'a.jpg', (600, 400), 95)
+        (tmp_path / 'clip1.mp4').write_bytes(b'same video')
+        (tmp_path / 'clip2.mp4').write_bytes(b'same video')
+        utils.find_duplicates(str(tmp_path), logger_func=lambda x: None, near_duplicates=True)
+        self._photo(tmp_path / 'b.jpg', (600, 400), 95, box=(300, 150, 580, 390))
+        logs: list[str] = []
+        groups = utils.find_duplicates(str(tmp_path), logger_func=logs.append, near_duplicates=True)
+        assert groups == [[str(tmp_path / 'clip1.mp4'), str(tmp_path / 'clip2.mp4')]]
+        assert any('1 computed, 1 cached' in log for log in logs)
+
+    def test_report_shows_distances(self, tmp_path) -> None:
+        self._photo(tmp_path / 'original.jpg', (600, 400), 95)
+        self._photo(tmp_path / 'whatsapp.jpg', (300, 200), 30)
+        (tmp_path / 'notes.txt').write_text('not an image')
+        output = tmp_path / 'report.html'
+        groups = utils.generate_duplicate_report(str(tmp_path), str(output), logger_func=lambda x: None,
+                                                 near_duplicates=True)
+        assert groups == [[str(tmp_path / 'original.jpg'), str(tmp_path / 'whatsapp.jpg')]]
+        html = output.read_text()
+        assert 'pHash distance 0' in html
+        assert html.count('pHash distance') == 2
+        assert utils.generate_duplicate_report(str(tmp_path), str(output), logger_func=lambda x: None) == []
+
+    def test_distance_zero_only_groups_identical_hashes(self, tmp_path) -> None:
+        self._photo(tmp_path / 'original.jpg', (600, 400), 95)
+        self._photo(tmp_path / 'small.jpg', (150, 100), 20)
+        groups = utils.find_duplicates(str(tmp_path), logger_func=lambda x: None, near_duplicates=True,
+                                       max_distance=0)
+        assert len(groups) <= 1
+        groups = utils.find_duplicates(str(tmp_path), logger_func=lambda x: None, near_duplicates=True,
+                                       max_distance=64)
+        assert len(groups) == 1
+
+    def test_files_only_similar_to_a_member_not_deleted(self, tmp_path) -> None:
+        # a~b and b~c are 10 bits apart, a and c 20 bits
+        hashes = {'a.jpg': (0, 0), 'b.jpg': (2 ** 10 - 1, 2 ** 10 - 1), 'c.jpg': (2 ** 20 - 1, 2 ** 20 - 1)}
+        for name in hashes:
+            (tmp_path / name).write_text(name)
+        with patch.object(utils.PerceptualHashCache, 'get', lambda cache, path, stat=None: hashes[Path(path).name]):
+            groups = utils.find_duplicates(str(tmp_path), delete=True, logger_func=lambda x: None,
+                                           near_duplicates=True, max_distance=10)
+        assert groups == [[str(tmp_path / 'a.jpg'), str(tmp_path / 'b.jpg')]]
+        assert (tmp_path / 'a.jpg').exists()
+        assert not (tmp_path / 'b.jpg').exists()
+        assert (tmp_path / 'c.jpg').exists()
+
+    def test_keep_strategy_picks_kept_file(self, tmp_path) -> None:
+        hashes = {'a.jpg': (0, 0), 'b.jpg': (2 ** 10 - 1, 2 ** 10 - 1), 'c.jpg': (2 ** 20 - 1, 2 ** 20 - 1)}
+        (tmp_path / 'sub').mkdir()
+        for name in ['a.jpg', 'c.jpg']:
+            (tmp_path / 'sub' / name).write_text(name)
+        (tmp_path / 'b.jpg').write_text('b.jpg')
+        with patch.object(utils.PerceptualHashCache, 'get', lambda cache, path, stat=None: hashes[Path(path).name]):
+            groups = utils.find_duplicates(str(tmp_path), keep_strategy='shortest_path', logger_func=lambda x: None,
+                                           near_duplicates=True, max_distance=10)
+        assert groups == [[str(tmp_path / 'b.jpg'), str(tmp_path / 'sub' / 'a.jpg'), str(tmp_path / 'sub' / 'c.jpg')]]
+
+
 class TestCompareFolders:
 
     def test_identical_folders(self, tmp_path) -> None:
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import walker
+
+
+def _tree(root) -> None:
+    (root / 'a' / 'b').mkdir(parents=True)
+    (root / 'c').mkdir()
+    (root / 'top.jpg').write_bytes(b'1')
+    (root / 'files.txt').write_text('{}')
+    (root / 'a' / 'one.JPG').write_bytes(b'22')
+    (root / 'a' / 'b' / 'two.mp4').write_bytes(b'333')
+    (root / 'c' / 'notes.txt').write_text('x')
+
+
+class TestScanDir:
+
+    def test_splits_dirs_and_files(self, tmp_path) -> None:
+        _tree(tmp_path)
+        dirs, files = walker.scan_dir(tmp_path)
+        assert sorted(d.name for d in dirs) == ['a', 'c']
+        assert sorted(f.name for f in files) == ['files.txt', 'top.jpg']
+
+    def test_symlinked_dir_not_entered(self, tmp_path) -> None:
+        _tree(tmp_path)
+        os.symlink(tmp_path / 'a', tmp_path / 'link')
+        dirs, _ = walker.scan_dir(tmp_path)
+        assert sorted(d.name for d in dirs) == ['a', 'c']
+
+
+class TestWalk:
+
+    def test_recursive_walk_with_filters(self, tmp_path) -> None:
+        _tree(tmp_path)
+        names = sorted(e.name for e in walker.walk(tmp_path, skip_names={'files.txt'}))
+        assert names == ['notes.txt', 'one.JPG', 'top.jpg', 'two.mp4']
+        names = sorted(e.name for e in walker.walk(tmp_path, extensions={'jpg', 'mp4'}))
+        assert names == ['one.JPG', 'top.jpg', 'two.mp4']
+
+    def test_not_recursive(self, tmp_path) -> None:
+        _tree(tmp_path)
+        assert sorted(e.name for e in walker.walk(tmp_path, recursive=False)) == ['files.txt', 'top.jpg']
+
+    def test_dir_filter(self, tmp_path) -> None:
+        _tree(tmp_path)
+        names = sorted(e.name for e in walker.walk(tmp_path, dir_filter=lambda d: d.name != 'a'))
+        assert names == ['files.txt', 'notes.txt', 'top.jpg']
+
+    def test_entries_carry_path_and_size(self, tmp_path) -> None:
+        _tree(tmp_path)
+        sizes = {os.path.relpath(e.path, tmp_path): e.stat().st_size for e in walker.walk(tmp_path)}
+        assert sizes[os.path.join('a', 'b', 'two.mp4')] == 3
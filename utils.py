@@ -1,32 +1,105 @@
 from __future__ import annotations
 
+import functools
 import os
 from pathlib import Path
 import json
 import shutil
 import re
+import sqlite3
 from collections import defaultdict
-from typing import Callable
+from typing import Any, Callable
 
+import profiling
 from logger import logger
+from dir_snapshot import DIR_SNAPSHOT_NAME
+from hash_index import HASH_INDEX_NAME, hash_file, hash_file_edges
+from ingest_plan import CHECKPOINT_PLAN_NAME, CHECKPOINT_PROGRESS_NAME
+from perceptual_hash import NEAR_DUPLICATE_DISTANCE, PERCEPTUAL_HASH_INDEX_NAME, PerceptualHashCache, \
+    group_near_duplicates, hamming
+from walker import scan_dir, walk
 
 DB_NAME = 'files.txt'
+DB_JOURNAL_SUFFIX = '.journal'
+CATALOG_DB_NAME = 'files.db'
+SERVICE_FILES = frozenset({DB_NAME, f'{DB_NAME}{DB_JOURNAL_SUFFIX}', HASH_INDEX_NAME, DIR_SNAPSHOT_NAME,
+                           CATALOG_DB_NAME, f'{CATALOG_DB_NAME}-journal', CHECKPOINT_PLAN_NAME,
+                           CHECKPOINT_PROGRESS_NAME, PERCEPTUAL_HASH_INDEX_NAME})
+# The journal is folded into the DB once it is larger than both values
+DB_JOURNAL_COMPACT_MIN_SIZE = 1024 * 1024
+DB_JOURNAL_COMPACT_RATIO = 0.25
+DUPLICATE_EDGE_SIZE = 4 * 1024
 
 
 def load_db_files(folder: str, db_name: str = DB_NAME) -> dict[str, dict]:
     db_path = Path(folder) / db_name
-    if not db_path.exists():
-        return {}
-
-    with open(db_path, 'r') as f:
-        files_in_db = json.load(f)
+    files_in_db = {}
+    if db_path.exists():
+        with open(db_path, 'r') as f:
+            files_in_db = json.load(f)
+    _replay_db_journal(files_in_db, _db_journal_path(folder, db_name))
     return files_in_db
 
 
 def save_db_files(files: dict[str, dict], folder: str, db_name: str = DB_NAME) -> None:
+    ''' Full rewrite of the DB, the journal is folded into it and removed '''
     db_path = Path(folder) / db_name
-    with open(db_path, 'w') as f:
+    tmp_path = db_path.with_name(db_path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
         json.dump(files, f, indent=4)
+    os.replace(tmp_path, db_path)
+    _db_journal_path(folder, db_name).unlink(missing_ok=True)
+
+
+def _db_journal_path(folder: str, db_name: str) -> Path:
+    return Path(folder) / f'{db_name}{DB_JOURNAL_SUFFIX}'
+
+
+def _replay_db_journal(files: dict[str, dict], journal_path: Path) -> None:
+    ''' Apply journal records in order. Replay is idempotent and a torn last line is ignored '''
+    if not journal_path.exists():
+        return
+    with open(journal_path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            op = record['op']
+            if op == 'add':
+                files[record['name']] = record['entry']
+            elif op == 'delete':
+                files.pop(record['name'], None)
+            else:
+                raise ValueError(f'Unknown DB journal operation {op} in {journal_path}')
+
+
+def append_db_journal(records: list[dict], folder: str, db_name: str = DB_NAME) -> None:
+    ''' Append add/delete records to the DB journal. Write cost depends only on the records.
+
+    Records: {'op': 'add', 'name', 'entry'}, {'op': 'delete', 'name'}
+    '''
+    if not records:
+        return
+    with open(_db_journal_path(folder, db_name), 'a') as f:
+        f.write(''.join(json.dumps(record) + '\n' for record in records))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def compact_db_journal(folder: str, db_name: str = DB_NAME, force: bool = False) -> bool:
+    ''' Fold the journal into the DB when it passed the compaction threshold. Returns True if compacted '''
+    journal_path = _db_journal_path(folder, db_name)
+    if not journal_path.exists():
+        return False
+    if not force:
+        db_path = Path(folder) / db_name
+        db_size = db_path.stat().st_size if db_path.exists() else 0
+        journal_size = journal_path.stat().st_size
+        if journal_size < max(DB_JOURNAL_COMPACT_MIN_SIZE, db_size * DB_JOURNAL_COMPACT_RATIO):
+            return False
+    save_db_files(load_db_files(folder, db_name), folder, db_name)
+    return True
 
 
 def is_old_db_format(db_files: dict) -> bool:
@@ -36,6 +109,7 @@ def is_old_db_format(db_files: dict) -> bool:
     return isinstance(first_value, str)
 
 
+@profiling.staged('convert DB')
 def convert_db(folder: str, dry_run: bool = True,
                logger_func: Callable[..., None] | None = None) -> dict[str, dict]:
     if not logger_func:
@@ -46,6 +120,10 @@ def convert_db(folder: str, dry_run: bool = True,
         logger_func(f'Folder does not exist: {folder}')
         return {}
 
+    if (folder_path / CATALOG_DB_NAME).exists():
+        logger_func(f'DB is a {CATALOG_DB_NAME} catalog, already in new format')
+        return {}
+
     db_files = load_db_files(folder)
     if not db_files:
         logger_func('DB is empty, nothing to convert')
@@ -63,6 +141,7 @@ def convert_db(folder: str, dry_run: bool = True,
         dst_name = Path(dst_path).name
 
         dst_file = Path(dst_path)
+        profiling.count(profiling.STAT_CALLS)
         if dst_file.exists():
             size = dst_file.stat().st_size
         else:
@@ -79,6 +158,7 @@ def convert_db(folder: str, dry_run: bool = True,
             'size': size
         }
 
+    profiling.count(profiling.FILES, len(new_db))
     logger_func(f'Converted {len(new_db)} entries'
                 f'{f" ({missing_files} files not found)" if missing_files else ""}')
 
@@ -91,27 +171,29 @@ def convert_db(folder: str, dry_run: bool = True,
     return new_db
 
 
+@profiling.staged('sync folder and DB')
 def sync_folder_and_db(folder: str, recursive: bool = True, dry_run: bool = True,
                        logger_func: Callable[..., None] | None = None) -> None:
+    from catalog import open_catalog
+
     if not logger_func:
         logger_func = print
-    files_in_db = load_db_files(folder)
+    files_in_db = open_catalog(folder)
     files_in_folder: defaultdict[str, dict] = defaultdict(dict)
     sizes: defaultdict[int, list[str]] = defaultdict(list)
-    folder_path = Path(folder)
-    for path, subdirs, files in os.walk(folder_path):
-        for name in files:
-            full_path = Path(path) / name
-            size = full_path.stat().st_size
-            files_in_folder[name] = {
-                'path': folder,
-                'size': size
-                }
-            sizes[size].append(str(full_path))
+    for entry in walk(folder, skip_names=SERVICE_FILES):
+        size = entry.stat().st_size
+        files_in_folder[entry.name] = {
+            'path': folder,
+            'size': size
+            }
+        sizes[size].append(entry.path)
+        profiling.count(profiling.STAT_CALLS)
+    profiling.count(profiling.FILES, len(files_in_folder))
     logger_func(f'files in folder: {len(files_in_folder)}, sizes: {len(sizes)}')
     logger_func(f'files in DB: {len(files_in_db)}')
 
-    db_names = set(files_in_db.keys())
+    db_names = files_in_db.names()
     folder_names = set(files_in_folder.keys())
 
     missing_in_folder = sorted(db_names - folder_names)
@@ -129,14 +211,17 @@ def sync_folder_and_db(folder: str, recursive: bool = True, dry_run: bool = True
     output_missing_files()
 
     if dry_run:
+        files_in_db.close()
         return
 
     for name in missing_in_folder:
-        del files_in_db[name]
+        files_in_db.delete(name)
 
-    save_db_files(files_in_db, folder)
+    files_in_db.compact()
+    files_in_db.close()
 
 
+@profiling.staged('organize by year')
 def organize_by_year(folder: str, dry_run: bool = True, by_month: bool = False,
                      logger_func: Callable[..., None] | None = None) -> None:
     import regex_patterns
@@ -153,17 +238,17 @@ def organize_by_year(folder: str, dry_run: bool = True, by_month: bool = False,
 
     # Collect files from root and from existing year (and month) subfolders
     files_to_process: list[Path] = []
-    for f in folder_path.iterdir():
-        if f.is_file() and f.name != DB_NAME:
-            files_to_process.append(f)
+    subdirs, files = scan_dir(folder_path)
+    for f in files:
+        if f.name not in SERVICE_FILES:
+            files_to_process.append(Path(f.path))
     # Also scan existing year subfolders when upgrading to by_month
     if by_month:
-        for year_dir in folder_path.iterdir():
-            if year_dir.is_dir() and re.match(r'^\d{4}$', year_dir.name):
-                for f in year_dir.iterdir():
-                    if f.is_file():
-                        files_to_process.append(f)
+        for year_dir in subdirs:
+            if re.match(r'^\d{4}$', year_dir.name):
+                files_to_process.extend(Path(f.path) for f in scan_dir(year_dir.path)[1])
 
+    profiling.count(profiling.FILES, len(files_to_process))
     try:
         from tqdm import tqdm
         file_iter = tqdm(files_to_process, desc='Organizing files', unit='file')
@@ -171,7 +256,7 @@ def organize_by_year(folder: str, dry_run: bool = True, by_month: bool = False,
         file_iter = files_to_process
 
     for file_path_item in file_iter:
-        match = re.match(regex_patterns.DESTINATION_REGEX, file_path_item.name)
+        match = regex_patterns.match_destination(file_path_item.name)
         if not match:
             continue
 
@@ -190,6 +275,7 @@ def organize_by_year(folder: str, dry_run: bool = True, by_month: bool = False,
 
         if not dry_run:
             target_folder.mkdir(parents=True, exist_ok=True)
+            profiling.count(profiling.STAT_CALLS)
             if new_path.exists():
                 logger_func(f'Skipping {file_path_item.name}, already exists in {target_folder}')
                 skipped_count += 1
@@ -204,11 +290,12 @@ def organize_by_year(folder: str, dry_run: bool = True, by_month: bool = False,
                 f'{skipped_count} skipped')
 
 
+@profiling.staged('duplicate report')
 def generate_duplicate_report(folder: str, output_path: str | None = None,
                               dry_run: bool = True,
-                              logger_func: Callable[..., None] | None = None) -> list[list[str]]:
-    import filecmp
-
+                              logger_func: Callable[..., None] | None = None,
+                              near_duplicates: bool = False,
+                              max_distance: int = NEAR_DUPLICATE_DISTANCE) -> list[list[str]]:
     if not logger_func:
         logger_func = print
     folder_path = Path(folder)
@@ -217,25 +304,52 @@ def generate_duplicate_report(folder: str, output_path: str | None = None,
         return []
 
     logger_func('Scanning for duplicates...')
+    file_list = list(walk(folder_path, skip_names=SERVICE_FILES))
+
+    duplicate_groups = [[str(p) for p in group] for group in _find_duplicate_groups(file_list, logger_func)]
+    hashes = None
+    if near_duplicates:
+        duplicate_groups, hashes = _find_near_duplicate_groups(folder_path, file_list, duplicate_groups,
+                                                               max_distance, logger_func)
+
+    logger_func(f'Found {len(duplicate_groups)} duplicate groups '
+                f'({sum(len(g) - 1 for g in duplicate_groups)} redundant files)')
+
+    if not output_path:
+        output_path = str(Path(folder) / 'duplicate_report.html')
+
+    _write_duplicate_report_html(duplicate_groups, output_path, hashes)
+    logger_func(f'Report written to {output_path}')
+
+    return duplicate_groups
+
+
+def _find_duplicate_groups(files: list[Path | os.DirEntry],
+                           logger_func: Callable[..., None]) -> list[list[Path]]:
+    ''' Staged duplicate detection: size, then a hash of the file edges, then a full hash.
+
+    Each stage only looks at files that still collide after the previous one,
+    so most files are never read beyond their first and last DUPLICATE_EDGE_SIZE bytes.
+    '''
     sizes: defaultdict[int, list[Path]] = defaultdict(list)
-    all_files = list(folder_path.rglob('*'))
-    file_list = [f for f in all_files if f.is_file() and f.name != DB_NAME]
 
     try:
         from tqdm import tqdm
-        file_iter = tqdm(file_list, desc='Indexing files by size', unit='file')
+        file_iter = tqdm(files, desc='Indexing files by size', unit='file')
     except ImportError:
-        file_iter = file_list
+        file_iter = files
 
+    profiling.count(profiling.FILES, len(files))
+    profiling.count(profiling.STAT_CALLS, len(files))
     for file_path_item in file_iter:
         try:
             size = file_path_item.stat().st_size
-            sizes[size].append(file_path_item)
+            sizes[size].append(Path(file_path_item))
         except OSError:
             continue
 
-    duplicate_groups: list[list[str]] = []
     size_groups = [(s, paths) for s, paths in sizes.items() if len(paths) > 1]
+    bytes_read = {'edges': 0, 'full': 0}
 
     try:
         from tqdm import tqdm
@@ -243,37 +357,40 @@ def generate_duplicate_report(folder: str, output_path: str | None = None,
     except ImportError:
         group_iter = size_groups
 
+    duplicate_groups: list[list[Path]] = []
     for size, paths in group_iter:
-        compared: list[list[Path]] = []
-        for path_a in paths:
-            placed = False
-            for group in compared:
+        edge_groups: defaultdict[str, list[Path]] = defaultdict(list)
+        for path in paths:
+            try:
+                edge_groups[hash_file_edges(path, size, DUPLICATE_EDGE_SIZE)].append(path)
+            except OSError:
+                continue
+            bytes_read['edges'] += min(size, 2 * DUPLICATE_EDGE_SIZE)
+
+        for candidates in edge_groups.values():
+            if len(candidates) < 2:
+                continue
+            if size <= 2 * DUPLICATE_EDGE_SIZE:
+                # The edge hash already covered the whole file
+                duplicate_groups.append(candidates)
+                continue
+            full_groups: defaultdict[str, list[Path]] = defaultdict(list)
+            for path in candidates:
                 try:
-                    if filecmp.cmp(str(group[0]), str(path_a), shallow=False):
-                        group.append(path_a)
-                        placed = True
-                        break
+                    full_groups[hash_file(path)].append(path)
                 except OSError:
                     continue
-            if not placed:
-                compared.append([path_a])
-        for group in compared:
-            if len(group) > 1:
-                duplicate_groups.append([str(p) for p in group])
-
-    logger_func(f'Found {len(duplicate_groups)} duplicate groups '
-                f'({sum(len(g) - 1 for g in duplicate_groups)} redundant files)')
-
-    if not output_path:
-        output_path = str(Path(folder) / 'duplicate_report.html')
-
-    _write_duplicate_report_html(duplicate_groups, output_path)
-    logger_func(f'Report written to {output_path}')
+                bytes_read['full'] += size
+            duplicate_groups.extend(group for group in full_groups.values() if len(group) > 1)
 
+    logger_func(f'Bytes read: size stage 0, edge hash stage {bytes_read["edges"]}, '
+                f'full hash stage {bytes_read["full"]}')
     return duplicate_groups
 
 
-def _write_duplicate_report_html(groups: list[list[str]], output_path: str) -> None:
+def _write_duplicate_report_html(groups: list[list[str]], output_path: str,
+                                 hashes: dict[str, tuple[int, int]] | None = None) -> None:
+    ''' hashes: (dHash, pHash) of the images of near duplicate groups, each copy shows its pHash distance '''
     html_parts: list[str] = [
         '<!DOCTYPE html><html><head><meta charset="utf-8">',
         '<title>Duplicate Files Report</title>',
@@ -292,10 +409,11 @@ def _write_duplicate_report_html(groups: list[list[str]], output_path: str) -> N
     total_redundant = sum(len(g) - 1 for g in groups)
     total_wasted = 0
     for g in groups:
-        try:
-            total_wasted += Path(g[0]).stat().st_size * (len(g) - 1)
-        except OSError:
-            pass
+        for dup in g[1:]:
+            try:
+                total_wasted += Path(dup).stat().st_size
+            except OSError:
+                pass
     wasted_mb = total_wasted / (1024 * 1024)
     html_parts.append(f'<div class="summary"><strong>{len(groups)}</strong> duplicate groups, '
                        f'<strong>{total_redundant}</strong> redundant files, '
@@ -307,9 +425,16 @@ def _write_duplicate_report_html(groups: list[list[str]], output_path: str) -> N
             size_str = f'{size / 1024:.1f} KB' if size < 1024 * 1024 else f'{size / (1024 * 1024):.1f} MB'
         except OSError:
             size_str = 'unknown'
-        html_parts.append(f'<div class="group"><h3>Group {i} ({len(group)} files, {size_str} each)</h3>')
+        if hashes is None:
+            html_parts.append(f'<div class="group"><h3>Group {i} ({len(group)} files, {size_str} each)</h3>')
+        else:
+            html_parts.append(f'<div class="group"><h3>Group {i} ({len(group)} files, {size_str} kept)</h3>')
         for f in group:
-            html_parts.append(f'<div class="file">{f}</div>')
+            if hashes is not None and f in hashes and group[0] in hashes:
+                distance = hamming(hashes[group[0]][1], hashes[f][1])
+                html_parts.append(f'<div class="file">{f} <span class="stats">(pHash distance {distance})</span></div>')
+            else:
+                html_parts.append(f'<div class="file">{f}</div>')
         html_parts.append('</div>')
 
     html_parts.append('</body></html>')
@@ -319,21 +444,14 @@ def _write_duplicate_report_html(groups: list[list[str]], output_path: str) -> N
 KEEP_STRATEGIES = ['folder_priority', 'shortest_path', 'oldest']
 
 
-def _apply_keep_strategy(group: list[str], strategy: str | None = None,
-                         keep_folder: str | None = None) -> list[str]:
-    if not strategy or len(group) <= 1:
-        return group
-
+def _keep_key(strategy: str | None = None, keep_folder: str | None = None) -> Callable[[str], Any] | None:
+    ''' Sort key putting the file a keep strategy keeps first, None without a strategy '''
     if strategy == 'folder_priority' and keep_folder:
         keep_path = Path(keep_folder).resolve()
-        in_preferred = [f for f in group if Path(f).resolve().is_relative_to(keep_path)]
-        outside = [f for f in group if f not in in_preferred]
-        if in_preferred:
-            return [in_preferred[0]] + in_preferred[1:] + outside
-        return group
+        return lambda f: not Path(f).resolve().is_relative_to(keep_path)
 
     if strategy == 'shortest_path':
-        return sorted(group, key=lambda f: len(Path(f).parts))
+        return lambda f: len(Path(f).parts)
 
     if strategy == 'oldest':
         def _get_mtime(f: str) -> float:
@@ -341,16 +459,26 @@ def _apply_keep_strategy(group: list[str], strategy: str | None = None,
                 return Path(f).stat().st_mtime
             except OSError:
                 return float('inf')
-        return sorted(group, key=_get_mtime)
+        return _get_mtime
 
-    return group
+    return None
 
 
+def _apply_keep_strategy(group: list[str], strategy: str | None = None,
+                         keep_folder: str | None = None) -> list[str]:
+    key = _keep_key(strategy, keep_folder)
+    if key is None or len(group) <= 1:
+        return group
+    return sorted(group, key=key)
+
+
+@profiling.staged('find duplicates')
 def find_duplicates(folder: str, delete: bool = False,
                     keep_strategy: str | None = None,
                     keep_folder: str | None = None,
-                    logger_func: Callable[..., None] | None = None) -> list[list[str]]:
-    import filecmp
+                    logger_func: Callable[..., None] | None = None,
+                    near_duplicates: bool = False,
+                    max_distance: int = NEAR_DUPLICATE_DISTANCE) -> list[list[str]]:
     import regex_patterns
 
     if not logger_func:
@@ -369,66 +497,29 @@ def find_duplicates(folder: str, delete: bool = False,
         logger_func('--keep-folder is required when using folder_priority strategy')
         return []
 
-    media_extensions = set(regex_patterns.PHOTO_FILE_EXTENSIONS + regex_patterns.VIDEO_FILE_EXTENSIONS)
+    media_extensions = regex_patterns.EXTENSION_SET
 
     strategy_label = f' (strategy: {keep_strategy})' if keep_strategy else ''
     logger_func(f'Scanning for duplicate media files...{strategy_label}')
-    all_files = list(folder_path.rglob('*'))
-    media_files = [f for f in all_files if f.is_file()
-                   and f.suffix.lstrip('.').lower() in media_extensions]
+    media_files = list(walk(folder_path, extensions=media_extensions))
     logger_func(f'Found {len(media_files)} media files')
 
-    sizes: defaultdict[int, list[Path]] = defaultdict(list)
-
-    try:
-        from tqdm import tqdm
-        file_iter = tqdm(media_files, desc='Indexing by size', unit='file')
-    except ImportError:
-        file_iter = media_files
-
-    for file_path_item in file_iter:
-        try:
-            size = file_path_item.stat().st_size
-            sizes[size].append(file_path_item)
-        except OSError:
-            continue
-
-    duplicate_groups: list[list[str]] = []
-    size_groups = [(s, paths) for s, paths in sizes.items() if len(paths) > 1]
-
-    try:
-        from tqdm import tqdm
-        group_iter = tqdm(size_groups, desc='Comparing files', unit='group')
-    except ImportError:
-        group_iter = size_groups
-
-    for size, paths in group_iter:
-        compared: list[list[Path]] = []
-        for path_a in paths:
-            placed = False
-            for group in compared:
-                try:
-                    if filecmp.cmp(str(group[0]), str(path_a), shallow=False):
-                        group.append(path_a)
-                        placed = True
-                        break
-                except OSError:
-                    continue
-            if not placed:
-                compared.append([path_a])
-        for group in compared:
-            if len(group) > 1:
-                raw_group = [str(p) for p in group]
-                ordered = _apply_keep_strategy(raw_group, keep_strategy, keep_folder)
-                duplicate_groups.append(ordered)
+    raw_groups = [[str(p) for p in group] for group in _find_duplicate_groups(media_files, logger_func)]
+    if near_duplicates:
+        # Near duplicates are grouped around the file the strategy keeps
+        duplicate_groups, _ = _find_near_duplicate_groups(folder_path, media_files, raw_groups, max_distance,
+                                                          logger_func, keep_strategy, keep_folder)
+    else:
+        duplicate_groups = [_apply_keep_strategy(raw_group, keep_strategy, keep_folder) for raw_group in raw_groups]
 
     total_redundant = sum(len(g) - 1 for g in duplicate_groups)
     total_wasted = 0
     for g in duplicate_groups:
-        try:
-            total_wasted += Path(g[0]).stat().st_size * (len(g) - 1)
-        except OSError:
-            pass
+        for dup in g[1:]:
+            try:
+                total_wasted += Path(dup).stat().st_size
+            except OSError:
+                pass
     wasted_mb = total_wasted / (1024 * 1024)
 
     logger_func(f'Found {len(duplicate_groups)} duplicate groups '
@@ -457,6 +548,53 @@ def find_duplicates(folder: str, delete: bool = False,
     return duplicate_groups
 
 
+@profiling.staged('near duplicates')
+def _find_near_duplicate_groups(folder_path: Path, files: list[os.DirEntry], groups: list[list[str]],
+                                max_distance: int, logger_func: Callable[..., None],
+                                keep_strategy: str | None = None, keep_folder: str | None = None
+                                ) -> tuple[list[list[str]], dict[str, tuple[int, int]]]:
+    ''' Exact duplicate groups merged with images whose perceptual hashes are within max_distance
+    of the first file of their group, and the (dHash, pHash) of the images.
+
+    The first file is the one the keep strategy keeps, the largest one on a tie or without a strategy.
+    '''
+    import regex_patterns
+
+    cache = PerceptualHashCache(folder_path)
+    cache.load()
+    photo_extensions = regex_patterns.EXTENSION_SET - regex_patterns.VIDEO_EXTENSION_SET
+    images = [entry for entry in files if entry.name.rpartition('.')[2].lower() in photo_extensions]
+    try:
+        from tqdm import tqdm
+        image_iter = tqdm(images, desc='Hashing images', unit='file')
+    except ImportError:
+        image_iter = images
+
+    hashes: dict[str, tuple[int, int]] = {}
+    for entry in image_iter:
+        try:
+            image_hashes = cache.get(entry.path, entry.stat())
+        except OSError:
+            continue
+        if image_hashes is not None:
+            hashes[entry.path] = image_hashes
+    cache.save()
+    logger_func(f'Perceptual hashes: {cache.hashed_files} computed, {cache.cached_files} cached, '
+                f'{len(images) - len(hashes)} files are not readable images')
+
+    strategy_key = _keep_key(keep_strategy, keep_folder)
+
+    def keep_first(path: str) -> tuple:
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            size = 0
+        return (strategy_key(path) if strategy_key else 0), -size, path
+
+    return group_near_duplicates(hashes, max_distance, groups, functools.lru_cache(maxsize=None)(keep_first)), hashes
+
+
+@profiling.staged('compare folders')
 def compare_folders(folder_a: str, folder_b: str, output_file: str | None = None,
                     compare_content: bool = False,
                     logger_func: Callable[..., None] | None = None) -> dict[str, list[str]]:
@@ -472,13 +610,8 @@ def compare_folders(folder_a: str, folder_b: str, output_file: str | None = None
             logger_func(f'{label} does not exist: {p}')
             return {'only_in_a': [], 'only_in_b': [], 'different_content': []}
 
-    def _collect_relative_files(root: Path) -> dict[str, Path]:
-        result: dict[str, Path] = {}
-        for f in root.rglob('*'):
-            if f.is_file() and f.name != DB_NAME:
-                rel = str(f.relative_to(root))
-                result[rel] = f
-        return result
+    def _collect_relative_files(root: Path) -> dict[str, os.DirEntry]:
+        return {os.path.relpath(f.path, root): f for f in walk(root, skip_names=SERVICE_FILES)}
 
     logger_func(f'Scanning folder A: {folder_a}')
     files_a = _collect_relative_files(path_a)
@@ -487,6 +620,7 @@ def compare_folders(folder_a: str, folder_b: str, output_file: str | None = None
 
     keys_a = set(files_a.keys())
     keys_b = set(files_b.keys())
+    profiling.count(profiling.FILES, len(files_a) + len(files_b))
 
     only_in_a = sorted(keys_a - keys_b)
     only_in_b = sorted(keys_b - keys_a)
@@ -503,11 +637,13 @@ def compare_folders(folder_a: str, folder_b: str, output_file: str | None = None
         for rel in common_iter:
             fa = files_a[rel]
             fb = files_b[rel]
+            profiling.count(profiling.STAT_CALLS, 2)
             if fa.stat().st_size != fb.stat().st_size:
                 different_content.append(rel)
             else:
+                profiling.count(profiling.FILECMP_CALLS)
                 try:
-                    if not filecmp.cmp(str(fa), str(fb), shallow=False):
+                    if not filecmp.cmp(fa.path, fb.path, shallow=False):
                         different_content.append(rel)
                 except OSError:
                     different_content.append(rel)
@@ -573,29 +709,28 @@ def _write_compare_report(result: dict[str, list[str]], folder_a: str, folder_b:
     Path(output_path).write_text('\n'.join(lines), encoding='utf-8')
 
 
+@profiling.staged('move files')
 def move_files(folder: str, new_folder: str, regex_pattern: str = r'.*\.\w{2,4}',
                create_subfolder: bool = True, dry_run: bool = True) -> None:
-    db_files = load_db_files(folder)
+    from catalog import open_catalog
+
+    db_files = open_catalog(folder)
     new_folder_db_files: dict[str, dict] = {}
-    old_folder_db_files = dict(db_files)
     folder_path = Path(folder)
     dest_folder = folder_path / new_folder if create_subfolder else Path(new_folder)
     if not dest_folder.exists():
         dest_folder.mkdir(parents=True)
 
     # Build lookup: new_name -> file path on disk
-    file_lookup: dict[str, Path] = {}
-    for f in folder_path.rglob('*'):
-        if f.is_file() and f.name != DB_NAME:
-            file_lookup[f.name] = f
+    file_lookup: dict[str, Path] = {f.name: Path(f.path) for f in walk(folder_path, skip_names=SERVICE_FILES)}
 
     print(regex_pattern)
     regex = re.compile(regex_pattern)
-    for new_name, entry in db_files.items():
+    for new_name, entry in list(db_files.items()):
         source_name = entry['source_name']
         if regex.match(source_name):
             new_folder_db_files[new_name] = entry
-            del old_folder_db_files[new_name]
+            db_files.delete(new_name)
             if not dry_run:
                 current_path = file_lookup.get(new_name)
                 if current_path:
@@ -604,8 +739,12 @@ def move_files(folder: str, new_folder: str, regex_pattern: str = r'.*\.\w{2,4}'
     logger.info(json.dumps(new_folder_db_files, indent=4))
     logger.info(f'handled files names {len(new_folder_db_files)}')
     if not dry_run:
-        save_db_files(old_folder_db_files, folder)
-        save_db_files(new_folder_db_files, str(dest_folder))
+        db_files.compact()
+        new_folder_catalog = open_catalog(dest_folder, db_files.backend)
+        new_folder_catalog.update(new_folder_db_files)
+        new_folder_catalog.compact()
+        new_folder_catalog.close()
+    db_files.close()
 
 
 def _increment_filename_suffix(name: str, existing_names: set[str]) -> str:
@@ -630,9 +769,11 @@ def _increment_filename_suffix(name: str, existing_names: set[str]) -> str:
         candidate_suffix += 1
 
 
+@profiling.staged('merge DBs')
 def merge_dbs(folder: str, db_b_path: str, dry_run: bool = True,
               logger_func: Callable[..., None] | None = None) -> dict[str, dict]:
     import filecmp
+    from catalog import SqliteCatalog, open_catalog
 
     if not logger_func:
         logger_func = print
@@ -648,30 +789,39 @@ def merge_dbs(folder: str, db_b_path: str, dry_run: bool = True,
         logger_func(f'Second DB file does not exist: {db_b_path}')
         return {}
 
-    db_a = load_db_files(folder)
     try:
-        db_b: dict[str, dict] = json.loads(db_b_file.read_text(encoding='utf-8'))
-    except (json.JSONDecodeError, OSError) as e:
+        if db_b_file.suffix == Path(CATALOG_DB_NAME).suffix:
+            catalog_b = SqliteCatalog(db_b_file)
+            db_b: dict[str, dict] = catalog_b.to_dict()
+            catalog_b.close()
+        else:
+            db_b = json.loads(db_b_file.read_text(encoding='utf-8'))
+    except (json.JSONDecodeError, OSError, sqlite3.Error) as e:
         logger_func(f'Error reading second DB: {e}')
         return {}
 
+    db_a = open_catalog(folder)
     if not db_b:
         logger_func('Second DB is empty, nothing to merge')
-        return db_a
+        result = db_a.to_dict()
+        db_a.close()
+        return result
 
     # Build file lookup: filename -> list of paths (handles OS-renamed duplicates)
     file_lookup: dict[str, Path] = {}
     size_lookup: defaultdict[int, list[Path]] = defaultdict(list)
-    for f in folder_path.rglob('*'):
-        if f.is_file() and f.name != DB_NAME:
-            file_lookup[f.name] = f
-            try:
-                size_lookup[f.stat().st_size].append(f)
-            except OSError:
-                pass
+    for entry in walk(folder_path, skip_names=SERVICE_FILES):
+        f = Path(entry.path)
+        file_lookup[f.name] = f
+        profiling.count(profiling.STAT_CALLS)
+        try:
+            size_lookup[entry.stat().st_size].append(f)
+        except OSError:
+            pass
 
+    profiling.count(profiling.FILES, len(file_lookup))
     # Track all known names to avoid collisions when generating new keys
-    all_names: set[str] = set(db_a.keys()) | set(file_lookup.keys())
+    all_names: set[str] = db_a.names() | set(file_lookup.keys())
 
     merged = 0
     duplicates = 0
@@ -679,12 +829,12 @@ def merge_dbs(folder: str, db_b_path: str, dry_run: bool = True,
 
     for key_b, entry_b in db_b.items():
         if key_b not in db_a:
-            db_a[key_b] = entry_b
+            db_a.add(key_b, entry_b)
             all_names.add(key_b)
             merged += 1
             continue
 
-        entry_a = db_a[key_b]
+        entry_a = db_a.get(key_b)
         size_a = entry_a.get('size', -1)
         size_b = entry_b.get('size', -2)
 
@@ -700,6 +850,7 @@ def merge_dbs(folder: str, db_b_path: str, dry_run: bool = True,
             if path_on_disk and path_on_disk.exists():
                 if candidates:
                     for cand in candidates:
+                        profiling.count(profiling.FILECMP_CALLS)
                         try:
                             if filecmp.cmp(str(path_on_disk), str(cand), shallow=False):
                                 is_duplicate = True
@@ -721,7 +872,7 @@ def merge_dbs(folder: str, db_b_path: str, dry_run: bool = True,
                 # Same size but different content — treat as conflict, keep both
                 new_key = _increment_filename_suffix(key_b, all_names)
                 logger_func(f'Conflict: "{key_b}" (same size, different content) — renaming to "{new_key}"')
-                db_a[new_key] = entry_b
+                db_a.add(new_key, entry_b)
                 all_names.add(new_key)
                 renamed += 1
                 if candidates and not dry_run:
@@ -734,7 +885,7 @@ def merge_dbs(folder: str, db_b_path: str, dry_run: bool = True,
             # Different size — definitely different files, keep both
             new_key = _increment_filename_suffix(key_b, all_names)
             logger_func(f'Conflict: "{key_b}" (different size: {size_a} vs {size_b}) — renaming to "{new_key}"')
-            db_a[new_key] = entry_b
+            db_a.add(new_key, entry_b)
             all_names.add(new_key)
             renamed += 1
             # Find B's file on disk by its size among candidates
@@ -753,10 +904,12 @@ def merge_dbs(folder: str, db_b_path: str, dry_run: bool = True,
     logger_func(f'  Conflicts (renamed): {renamed}')
     logger_func(f'  Total entries in merged DB: {len(db_a)}')
 
+    result = db_a.to_dict()
     if dry_run:
         logger_func('[DRY RUN] No changes made')
     else:
-        save_db_files(db_a, folder)
+        db_a.compact()
         logger_func('Merged DB saved')
+    db_a.close()
 
-    return db_a
+    return result
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Callable, Collection, Iterator
+
+
+def scan_dir(folder: str | Path) -> tuple[list[os.DirEntry], list[os.DirEntry]]:
+    ''' (subdirectories, files) of folder from a single scandir.
+
+    File type comes from the directory listing itself, so no entry is stat'ed here.
+    Symlinked directories are not returned as subdirectories, as with os.walk and Path.rglob.
+    '''
+    dirs = []
+    files = []
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry)
+            elif entry.is_file():
+                files.append(entry)
+    return dirs, files
+
+
+def walk(folder: str | Path, recursive: bool = True, extensions: Collection[str] | None = None,
+         skip_names: Collection[str] = (), dir_filter: Callable[[os.DirEntry], bool] | None = None
+         ) -> Iterator[os.DirEntry]:
+    ''' Files under folder, depth first, as DirEntry objects whose stat() result is cached.
+
+    Name and lower case extension filters are applied before any stat call.
+    dir_filter decides which subdirectories are entered.
+    '''
+    stack = [str(folder)]
+    while stack:
+        dirs, files = scan_dir(stack.pop())
+        for entry in files:
+            if entry.name in skip_names:
+                continue
+            if extensions is not None and os.path.splitext(entry.name)[1][1:].lower() not in extensions:
+                continue
+            yield entry
+        if recursive:
+            stack.extend(reversed([d.path for d in dirs if dir_filter is None or dir_filter(d)]))